@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+early_stopping.py
+
+Score-distribution-aware stopping policy for the prompt optimizer.
+
+The old rule ("stop after N rounds without a new best") ignores variance:
+the heuristic aesthetic scorer adds random jitter, so a lucky seed looks
+like progress and a genuinely improving prompt can look stagnant.
+
+StoppingPolicy instead models the next round's variant scores as normal,
+centred on an upper confidence bound of the latest round's mean with the
+pooled within-round spread, and estimates the chance that at least one of
+the next round's renders beats the incumbent by a meaningful margin. Once
+that chance drops below a threshold, more renders are unlikely to pay off.
+"""
+
+import math
+import os
+from typing import Dict, List, Optional
+
+# Stop when P(next round beats the incumbent) falls below this
+STOP_PROBABILITY = float(os.getenv("HEXFORGE_STOP_PROBABILITY", "0.1"))
+
+# "Beating" the incumbent means exceeding it by at least this much
+MIN_IMPROVEMENT = float(os.getenv("HEXFORGE_MIN_IMPROVEMENT", "0.05"))
+
+# z-value for the optimistic bound on the next round's mean (~90% one-sided)
+CONFIDENCE_Z = float(os.getenv("HEXFORGE_STOP_CONFIDENCE_Z", "1.28"))
+
+# Never stop on statistics before this many scored rounds
+MIN_ROUNDS = int(os.getenv("HEXFORGE_STOP_MIN_ROUNDS", "2"))
+
+# Consecutive rounds with no scored renders at all before giving up
+MAX_EMPTY_ROUNDS = int(os.getenv("HEXFORGE_MAX_EMPTY_ROUNDS", "2"))
+
+# The old fixed rule, kept for deployments that set it: also stop after
+# this many consecutive rounds without a new best. Unset or 0 = off.
+MAX_STAGNANT_ROUNDS = int(os.getenv("HEXFORGE_MAX_STAGNANT", "0"))
+
+# Floor for the score spread so one-variant rounds don't look certain
+MIN_STDDEV = 0.05
+
+
+def normal_cdf(x: float) -> float:
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def stop_decision(
+    stop: bool, reason: str, p_improve: Optional[float] = None, **stats
+) -> Dict:
+    """
+    Decision record; also what gets logged and written into the summary.
+    """
+    return {
+        "stop": stop,
+        "reason": reason,
+        "p_improve": None if p_improve is None else round(p_improve, 4),
+        **stats,
+    }
+
+
+class StoppingPolicy:
+    def __init__(
+        self,
+        variants_per_round: int,
+        stop_probability: float = STOP_PROBABILITY,
+        min_improvement: float = MIN_IMPROVEMENT,
+        confidence_z: float = CONFIDENCE_Z,
+        min_rounds: int = MIN_ROUNDS,
+        max_empty_rounds: int = MAX_EMPTY_ROUNDS,
+        max_stagnant_rounds: int = MAX_STAGNANT_ROUNDS,
+    ):
+        self.variants_per_round = max(1, variants_per_round)
+        self.stop_probability = stop_probability
+        self.min_improvement = min_improvement
+        self.confidence_z = confidence_z
+        self.min_rounds = min_rounds
+        self.max_empty_rounds = max(1, max_empty_rounds)
+        self.max_stagnant_rounds = max(0, max_stagnant_rounds)
+
+        self.rounds: List[List[float]] = []
+        self.empty_rounds = 0
+        self.best_seen: Optional[float] = None
+        self.stagnant_rounds = 0
+
+    # ---- observations ------------------------------------------
+    def observe_round(self, scores: List[float]) -> None:
+        """
+        Record one round's variant scores (failed renders left out).
+        """
+        if scores:
+            self.rounds.append(list(scores))
+            self.empty_rounds = 0
+        else:
+            self.empty_rounds += 1
+
+    def pooled_stddev(self) -> float:
+        """
+        Within-round standard deviation pooled over all rounds, i.e. the
+        seed + scorer noise around a fixed prompt.
+        """
+        ss, dof = 0.0, 0
+        for scores in self.rounds:
+            if len(scores) < 2:
+                continue
+            mean = sum(scores) / len(scores)
+            ss += sum((s - mean) ** 2 for s in scores)
+            dof += len(scores) - 1
+        if dof == 0:
+            # No replicates yet: fall back to the spread across everything
+            flat = [s for scores in self.rounds for s in scores]
+            if len(flat) < 2:
+                return MIN_STDDEV
+            mean = sum(flat) / len(flat)
+            ss = sum((s - mean) ** 2 for s in flat)
+            dof = len(flat) - 1
+        return max(MIN_STDDEV, math.sqrt(ss / dof))
+
+    # ---- decision ----------------------------------------------
+    def p_improve(self, incumbent: float) -> float:
+        """
+        Probability that at least one of the next round's renders beats
+        `incumbent` by min_improvement, using an optimistic (upper
+        confidence bound) estimate of the next round's mean.
+        """
+        latest = self.rounds[-1]
+        sigma = self.pooled_stddev()
+        mean = sum(latest) / len(latest)
+        mean_ucb = mean + self.confidence_z * sigma / math.sqrt(len(latest))
+        z = (incumbent + self.min_improvement - mean_ucb) / sigma
+        p_single = 1.0 - normal_cdf(z)
+        return 1.0 - (1.0 - p_single) ** self.variants_per_round
+
+    def decide(self, incumbent: float, target_score: float) -> Dict:
+        """
+        Whether to stop after the round just observed. Call once per round,
+        with the best score so far.
+        """
+        if self.rounds:
+            if self.best_seen is None or incumbent > self.best_seen:
+                self.best_seen = incumbent
+                self.stagnant_rounds = 0
+            else:
+                self.stagnant_rounds += 1
+
+        if self.empty_rounds >= self.max_empty_rounds:
+            return stop_decision(
+                True, f"no scored renders for {self.empty_rounds} consecutive rounds"
+            )
+        if not self.rounds:
+            return stop_decision(False, "no scores yet")
+        if incumbent >= target_score:
+            return stop_decision(
+                True, f"target score reached ({incumbent} >= {target_score})"
+            )
+        if self.max_stagnant_rounds and self.stagnant_rounds >= self.max_stagnant_rounds:
+            return stop_decision(
+                True,
+                f"no new best for {self.stagnant_rounds} consecutive rounds "
+                f"(HEXFORGE_MAX_STAGNANT={self.max_stagnant_rounds})",
+            )
+
+        p = self.p_improve(incumbent)
+        latest = self.rounds[-1]
+        stats = {
+            "incumbent": incumbent,
+            "latest_mean": round(sum(latest) / len(latest), 4),
+            "pooled_stddev": round(self.pooled_stddev(), 4),
+            "rounds_scored": len(self.rounds),
+        }
+
+        if len(self.rounds) < self.min_rounds:
+            return stop_decision(
+                False,
+                f"only {len(self.rounds)}/{self.min_rounds} scored rounds; continuing",
+                p,
+                **stats,
+            )
+        if p < self.stop_probability:
+            return stop_decision(
+                True,
+                f"P(next round beats best by {self.min_improvement}) = {p:.3f} "
+                f"< {self.stop_probability}",
+                p,
+                **stats,
+            )
+        return stop_decision(
+            False,
+            f"P(next round beats best by {self.min_improvement}) = {p:.3f} "
+            f">= {self.stop_probability}; continuing",
+            p,
+            **stats,
+        )
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+job_runners.py
+
+In-process execution of watcher jobs.
+
+Spawning `python3 <runner>` per job (plus another interpreter for the
+optimizer) pays two interpreter startups and fresh imports of requests,
+PIL, etc. on every job. Here the simple and optimizer runners are called
+as plain functions inside children forked from a multiprocessing
+forkserver that already has those modules imported, so each job starts
+warm but still runs in its own process (killable, crash-isolated).
+
+Children write stdout/stderr into a pipe that run() reads line by line,
+so the watcher can stream output into the job log as it happens. Each
+child leads its own process group so JobSupervisor can kill it together
+with anything it started (scorer, etc.) when it overruns or goes silent.
+
+The watcher keeps the old `python3 <runner>` subprocess path as a fallback
+(HEXFORGE_JOB_EXEC=subprocess).
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from multiprocessing import forkserver
+from multiprocessing.connection import Connection
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+# Imported once in the forkserver; every job child inherits them
+PRELOAD_MODULES = [
+    "requests",
+    "PIL.Image",
+    "simple_comfy_runner",
+    "loop_prompt_generator",
+]
+
+
+def optimizer_argv(
+    project: str, part: str, prompt: str, num_images: int, time_budget: float = 0
+) -> List[str]:
+    argv = [
+        "--project", project,
+        "--part", part,
+        "--prompt", prompt,
+        "--num-images", str(num_images),
+    ]
+    if time_budget > 0:
+        argv += ["--time-budget", str(int(time_budget))]
+    return argv
+
+
+def run_job(
+    engine: str, project: str, part: str, prompt: str, num_images: int, time_budget: float = 0
+) -> int:
+    """
+    Run one job in the current process. Returns the runner's exit code.
+    `time_budget` lets the optimizer wind down (and still write its
+    summary) before the supervisor's hard limit.
+    """
+    if engine == "optimizer":
+        import loop_prompt_generator
+
+        return loop_prompt_generator.main(
+            optimizer_argv(project, part, prompt, num_images, time_budget)
+        )
+
+    import simple_comfy_runner
+
+    return simple_comfy_runner.run_simple(project, part, prompt)
+
+
+def _child_main(
+    engine: str,
+    project: str,
+    part: str,
+    prompt: str,
+    num_images: int,
+    time_budget: float,
+    output: Connection,
+) -> None:
+    """
+    Job child entry point: start a new process group, send stdout/stderr
+    (including any subprocesses, e.g. the scorer) into the `output` pipe,
+    run the job, exit with its code.
+    """
+    os.setsid()
+    os.dup2(output.fileno(), 1)
+    os.dup2(output.fileno(), 2)
+    output.close()
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
+    try:
+        code = run_job(engine, project, part, prompt, num_images, time_budget)
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else 1
+    except Exception:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code or 0)
+
+
+def kill_process_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class JobSupervisor:
+    """
+    Watchdog for one running job. The watcher calls beat() for every line
+    of runner output (runners print [heartbeat] lines during long waits);
+    if the job exceeds `budget_s` of wall-clock time, or goes
+    `heartbeat_timeout_s` without a beat, its process group is killed and
+    killed_reason says why.
+    """
+
+    def __init__(self, label: str, budget_s: float, heartbeat_timeout_s: float, check_s: float = 5.0):
+        self.label = label
+        self.budget_s = budget_s
+        self.heartbeat_timeout_s = heartbeat_timeout_s
+        self.check_s = check_s
+
+        self.started = time.monotonic()
+        self.last_beat = self.started
+        self.last_beat_wall = time.time()
+        self.pid: Optional[int] = None
+        self.killed_reason: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name=f"supervisor-{label}", daemon=True)
+
+    def beat(self) -> None:
+        self.last_beat = time.monotonic()
+        self.last_beat_wall = time.time()
+
+    def attach(self, pid: int) -> None:
+        """
+        Supervise the process group led by pid.
+        """
+        self.pid = pid
+        self.beat()
+
+    def start(self) -> "JobSupervisor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.check_s):
+            now = time.monotonic()
+            if self.budget_s > 0 and now - self.started > self.budget_s:
+                reason = f"exceeded wall-clock budget of {self.budget_s:.0f}s"
+            elif self.heartbeat_timeout_s > 0 and now - self.last_beat > self.heartbeat_timeout_s:
+                reason = f"no heartbeat for {now - self.last_beat:.0f}s"
+            else:
+                continue
+            if self.pid is None:
+                continue
+            self.killed_reason = reason
+            print(f"[supervisor] Killing {self.label} (pid {self.pid}): {reason}", flush=True)
+            kill_process_group(self.pid)
+            return
+
+
+class InProcessExecutor:
+    """
+    Runs jobs in children of a pre-warmed forkserver.
+    """
+
+    def __init__(self, preload: List[str] = PRELOAD_MODULES):
+        self.ctx = multiprocessing.get_context("forkserver")
+        self.ctx.set_forkserver_preload(preload)
+
+    def warm_up(self) -> None:
+        """
+        Start the forkserver now (and import PRELOAD_MODULES in it) instead of
+        on the first job.
+        """
+        forkserver.ensure_running()
+
+    def start(
+        self,
+        engine: str,
+        project: str,
+        part: str,
+        prompt: str,
+        num_images: int,
+        time_budget: float = 0,
+    ) -> Tuple[multiprocessing.Process, BinaryIO]:
+        """
+        Start a job child. Returns the process and a binary stream of its
+        combined stdout/stderr (EOF once the child and any subprocesses it
+        started have exited).
+        """
+        reader, writer = self.ctx.Pipe(duplex=False)
+        proc = self.ctx.Process(
+            target=_child_main,
+            args=(engine, project, part, prompt, num_images, time_budget, writer),
+            name=f"hexforge-job-{project}-{part}",
+        )
+        proc.start()
+        # Only the child may hold the write end, or the reader never sees EOF
+        writer.close()
+
+        output = os.fdopen(os.dup(reader.fileno()), "rb")
+        reader.close()
+        return proc, output
+
+    def run(
+        self,
+        engine: str,
+        project: str,
+        part: str,
+        prompt: str,
+        num_images: int,
+        on_line: Callable[[str], None],
+        supervisor: Optional[JobSupervisor] = None,
+        time_budget: float = 0,
+    ) -> int:
+        """
+        Run a job to completion, passing each output line to on_line as it
+        arrives; returns the job's exit code. With a supervisor, the job's
+        process group is handed to it for killing.
+        """
+        proc, output = self.start(engine, project, part, prompt, num_images, time_budget)
+        if supervisor is not None:
+            supervisor.attach(proc.pid)
+        with output:
+            for raw in output:
+                on_line(raw.decode("utf-8", errors="replace").rstrip("\n"))
+        proc.join()
+        return proc.exitcode if proc.exitcode is not None else 1
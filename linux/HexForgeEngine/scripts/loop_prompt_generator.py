@@ -9,18 +9,31 @@ import shutil
 import subprocess
 import time
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Optional, Tuple, List, Dict
 
+from early_stopping import StoppingPolicy
+from prompt_history import warm_start_pairs
+from prompt_memory import PromptMemory
+from prompt_surrogate import PromptSurrogate, load_or_train_surrogate, log_prediction
+
 # ================================================================
 # Paths & config
 # ================================================================
 BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+
+# Stage timings go to the media API's metrics store (stdlib-only module)
+sys.path.insert(0, str(BASE))
+from media_api import metrics  # noqa: E402
+
 ASSETS_BASE = BASE / "assets"
 LOGS_BASE = BASE / "logs" / "comfy-jobs"
 
 COMFY_ROOT = Path("/root/ai-tools/ComfyUI")
 COMFY_OUTPUT_ROOT = COMFY_ROOT / "output"
+# LoadImage nodes resolve filenames relative to this directory
+COMFY_INPUT_ROOT = COMFY_ROOT / "input"
 
 # ComfyUI HTTP prompt endpoint
 COMFY_URL = os.getenv("COMFY_URL", "http://localhost:8188/prompt")
@@ -38,14 +51,95 @@ DEFAULT_NEGATIVE_PROMPT = (
 # Script that scores images (CLIP + aesthetic)
 SCORE_SCRIPT = BASE / "score_image_engine.sh"
 
-# Stagnation control for early stopping
-MAX_STAGNANT_ROUNDS = int(os.getenv("HEXFORGE_MAX_STAGNANT", "2"))
+# Per-stage time limits (seconds)
+COMFY_POST_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_COMFY_POST_TIMEOUT", "120"))
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_IMAGE_TIMEOUT", "300"))
+SCORE_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_SCORE_TIMEOUT", "300"))
+OLLAMA_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_OLLAMA_TIMEOUT", "60"))
+# Total time all Ollama calls in one run may take (0 = unlimited)
+OLLAMA_BUDGET_SECONDS = float(os.getenv("HEXFORGE_OLLAMA_BUDGET", "600"))
+
+# Long waits print a [heartbeat] line this often so the watcher's
+# supervisor can tell a slow job from a hung one
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("HEXFORGE_HEARTBEAT_INTERVAL", "30"))
+
+# Extra refinement attempts when Ollama only returns already-rendered prompts
+MAX_DUPLICATE_RETRIES = int(os.getenv("HEXFORGE_DUP_RETRIES", "2"))
+
+# Refined candidates predicted this far below the incumbent are not rendered
+SURROGATE_REJECT_MARGIN = float(os.getenv("HEXFORGE_SURROGATE_MARGIN", "0.5"))
 
 # Where blog draft JSON lives (for injection)
 BLOG_OUTPUT_DIR = BASE / "linux" / "HexForgeEngine" / "output"
 BLOG_DRAFT_PATH = BLOG_OUTPUT_DIR / "blog-draft.json"
 
 
+# ================================================================
+# Time budgets
+# ================================================================
+class TimeBudget:
+    """
+    Wall-clock allowance shared by several calls of one stage (0 = no
+    limit). Time is charged with `with budget.track(): ...`.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.spent = 0.0
+
+    def remaining(self) -> Optional[float]:
+        if self.seconds <= 0:
+            return None
+        return max(0.0, self.seconds - self.spent)
+
+    def exhausted(self) -> bool:
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, cap: float) -> float:
+        """
+        Per-call timeout: `cap`, or less if the budget is nearly spent.
+        """
+        remaining = self.remaining()
+        return cap if remaining is None else max(1.0, min(cap, remaining))
+
+    @contextmanager
+    def track(self):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.spent += time.time() - start
+
+
+# ================================================================
+# Progress events
+# ================================================================
+class EventLog:
+    """
+    Progress as JSON lines appended to --events-path (HEXFORGE_EVENTS_PATH),
+    one object per event with "event" and "ts" set; /image-loop streams
+    them to clients. Without a path every emit is a no-op.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = Path(path) if path else None
+        self.failed = False
+
+    def emit(self, event: str, **fields) -> None:
+        if self.path is None or self.failed:
+            return
+        line = json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            # Progress reporting must never take the run down with it
+            print(f"[loop] Event log {self.path} unwritable ({e}); no more events.")
+            self.failed = True
+
+
 # ================================================================
 # ComfyUI helpers (base URL + queue control)
 # ================================================================
@@ -85,13 +179,22 @@ def clear_comfy_queue(context: str = "") -> None:
 # ComfyUI graph builder
 # ================================================================
 def build_prompt_json(
-    prompt_text: str, neg_text: str, prefix: str, output_subdir: str
+    prompt_text: str,
+    neg_text: str,
+    prefix: str,
+    output_subdir: str,
+    init_image: Optional[str] = None,
+    denoise: float = 1.0,
 ) -> dict:
     """
     Minimal SD1.5 graph mirroring homelab_hero style workflow.
     Image is saved to COMFY_OUTPUT_ROOT / output_subdir as {prefix}_00001_.png
+
+    With `init_image` (a path relative to COMFY_INPUT_ROOT, see
+    stage_init_image) the empty latent is swapped for LoadImage -> VAEEncode,
+    turning the graph into img2img at the given `denoise` strength.
     """
-    return {
+    graph = {
         "prompt": {
             "0": {
                 "class_type": "CheckpointLoaderSimple",
@@ -140,14 +243,47 @@ def build_prompt_json(
         }
     }
 
+    if init_image:
+        nodes = graph["prompt"]
+        nodes["3"] = {
+            "class_type": "LoadImage",
+            "inputs": {"image": init_image},
+        }
+        nodes["7"] = {
+            "class_type": "VAEEncode",
+            "inputs": {"pixels": ["3", 0], "vae": ["0", 2]},
+        }
+        nodes["4"]["inputs"]["latent_image"] = ["7", 0]
+        nodes["4"]["inputs"]["denoise"] = denoise
+
+    return graph
+
 
+def stage_init_image(img_path: Path, rel_name: str) -> Optional[str]:
+    """
+    Copy an image into ComfyUI's input tree so a LoadImage node can use it.
+    Returns the name to put in the node (relative to COMFY_INPUT_ROOT), or
+    None if the copy failed.
+    """
+    try:
+        dest = COMFY_INPUT_ROOT / rel_name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(img_path, dest)
+        print(f"[loop] Staged img2img init image {img_path} -> {dest}")
+        return rel_name
+    except Exception as e:
+        print(f"[loop] Failed to stage init image {img_path}: {e}")
+        return None
+
+
+@metrics.stage_timer("comfy_post", failed=lambda ok: not ok, engine="optimizer")
 def post_to_comfyui(payload: dict, retries: int = 3) -> bool:
     for attempt in range(1, retries + 1):
         try:
             print(f"[loop] Posting to ComfyUI (attempt {attempt})")
             import requests  # type: ignore
 
-            resp = requests.post(COMFY_URL, json=payload, timeout=120)
+            resp = requests.post(COMFY_URL, json=payload, timeout=COMFY_POST_TIMEOUT_SECONDS)
             if resp.ok:
                 return True
             print(f"[loop] ComfyUI HTTP {resp.status_code}: {resp.text[:200]}")
@@ -161,7 +297,8 @@ def post_to_comfyui(payload: dict, retries: int = 3) -> bool:
 # ================================================================
 # Robust image wait helper
 # ================================================================
-def wait_for_image(prefix: str, timeout: int = 300) -> Optional[Path]:
+@metrics.stage_timer("image_wait", failed=lambda path: path is None, engine="optimizer")
+def wait_for_image(prefix: str, timeout: float = IMAGE_TIMEOUT_SECONDS) -> Optional[Path]:
     """
     Wait for an image whose filename CONTAINS `prefix` to appear
     anywhere under COMFY_OUTPUT_ROOT (recursively).
@@ -187,7 +324,11 @@ def wait_for_image(prefix: str, timeout: int = 300) -> Optional[Path]:
     except Exception as e:
         print(f"[debug] Error listing existing PNGs: {e}")
 
+    last_beat = start
     while time.time() - start < timeout:
+        if time.time() - last_beat >= HEARTBEAT_INTERVAL_SECONDS:
+            last_beat = time.time()
+            print(f"[heartbeat] waiting for '{prefix}' ({last_beat - start:.0f}s/{timeout:.0f}s)")
         try:
             matches: List[Path] = []
             for p in COMFY_OUTPUT_ROOT.rglob("*.png"):
@@ -205,13 +346,14 @@ def wait_for_image(prefix: str, timeout: int = 300) -> Optional[Path]:
 
         time.sleep(2)
 
-    print("[loop] Timed out waiting for image.")
+    print(f"[loop] Timed out after {timeout:.0f}s waiting for image.")
     return None
 
 
 # ================================================================
 # Scoring
 # ================================================================
+@metrics.stage_timer("score", failed=lambda scores: scores == (0.0, 0.0, 0.0), engine="optimizer")
 def score_image(img_path: Path, prompt: str) -> Tuple[float, float, float]:
     """
     Use score_image_engine.sh to compute CLIP + aesthetic scores.
@@ -232,7 +374,9 @@ def score_image(img_path: Path, prompt: str) -> Tuple[float, float, float]:
             "both",
         ]
         print(f"[loop] Scoring image: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(
+            cmd, capture_output=True, text=True, check=True, timeout=SCORE_TIMEOUT_SECONDS
+        )
         data = json.loads(result.stdout)
         clip = float(data.get("clip_score", 0))
         aesth = float(data.get("aesthetic_score", 0))
@@ -243,29 +387,52 @@ def score_image(img_path: Path, prompt: str) -> Tuple[float, float, float]:
         return 0.0, 0.0, 0.0
 
 
+SCORE_COLUMNS = [
+    "round",
+    "variant",
+    "filename",
+    "prompt",
+    "negative_prompt",
+    "score",
+    "clip",
+    "aesthetic",
+    "timestamp",
+    "target_prompt",
+]
+
+
+def _migrate_score_csv(csv_path: Path) -> None:
+    """
+    Add the target_prompt column to a CSV written before it existed. Those
+    rows were scored against their own prompt, so that is their target.
+    """
+    with csv_path.open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    with csv_path.open("w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SCORE_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for old in rows:
+            old.setdefault("target_prompt", old.get("prompt", ""))
+            writer.writerow(old)
+
+
 def log_score(csv_path: Path, row: List):
     """
-    Append a score row to CSV. Fully guarded so logging never kills the run.
+    Append a score row (in SCORE_COLUMNS order) to CSV. Fully guarded so
+    logging never kills the run.
     """
     try:
         csv_path.parent.mkdir(parents=True, exist_ok=True)
         exists = csv_path.exists()
+        if exists:
+            with csv_path.open(newline="") as f:
+                header = next(csv.reader(f), [])
+            if "target_prompt" not in header:
+                _migrate_score_csv(csv_path)
         with csv_path.open("a", newline="") as f:
             writer = csv.writer(f)
             if not exists:
-                writer.writerow(
-                    [
-                        "round",
-                        "variant",
-                        "filename",
-                        "prompt",
-                        "negative_prompt",
-                        "score",
-                        "clip",
-                        "aesthetic",
-                        "timestamp",
-                    ]
-                )
+                writer.writerow(SCORE_COLUMNS)
             writer.writerow(row)
     except Exception as e:
         print(f"[optimizer] Failed to write score log: {e}")
@@ -274,6 +441,7 @@ def log_score(csv_path: Path, row: List):
 # ================================================================
 # Prompt refinement via Ollama (positive + negative)
 # ================================================================
+@metrics.stage_timer("ollama", engine="optimizer")
 def refine_prompts_via_ollama(
     base_positive: str,
     base_negative: str,
@@ -281,15 +449,27 @@ def refine_prompts_via_ollama(
     clip_score: float,
     aesth_score: float,
     round_index: int,
+    avoid: Optional[List[str]] = None,
+    budget: Optional[TimeBudget] = None,
 ) -> Tuple[str, str]:
     """
     Ask the local Ollama model to slightly refine BOTH positive and negative
     prompts based on scores. Returns (new_positive, new_negative).
     If anything fails, the originals are returned unchanged.
+
+    `avoid` lists positive prompts already rendered this run; the model is
+    asked not to return any of them. Each call is limited to
+    OLLAMA_TIMEOUT_SECONDS and charged to `budget` (the run's overall
+    Ollama allowance); once that is spent, the originals are returned.
     """
     if not OLLAMA_URL:
         print("[loop] OLLAMA_URL not set; skipping refinement.")
         return base_positive, base_negative
+    if budget is None:
+        budget = TimeBudget(0)
+    if budget.exhausted():
+        print(f"[loop] Ollama budget ({budget.seconds:.0f}s) spent; keeping prompts.")
+        return base_positive, base_negative
 
     try:
         import requests  # type: ignore
@@ -311,6 +491,12 @@ def refine_prompts_via_ollama(
             "Return ONLY JSON like:\n"
             '{"positive": "...", "negative": "..."}'
         )
+        if avoid:
+            user_msg += (
+                "\n\nThese positive prompts were already tried. Do NOT return any of "
+                "them or a trivial rewording; change the wording meaningfully:\n"
+                + "\n".join(f"- {p}" for p in avoid)
+            )
         payload = {
             "model": OLLAMA_MODEL,
             "messages": [
@@ -320,7 +506,10 @@ def refine_prompts_via_ollama(
             "stream": False,
         }
         print(f"[loop] Calling Ollama at {url} model={OLLAMA_MODEL}")
-        resp = requests.post(url, json=payload, timeout=60)
+        with budget.track():
+            resp = requests.post(
+                url, json=payload, timeout=budget.timeout(OLLAMA_TIMEOUT_SECONDS)
+            )
         resp.raise_for_status()
         data = resp.json()
         msg = data.get("message", {}).get("content") or ""
@@ -346,6 +535,48 @@ def refine_prompts_via_ollama(
         return base_positive, base_negative
 
 
+# ================================================================
+# Surrogate screening of refined candidates
+# ================================================================
+def choose_refined_candidate(
+    candidates: List[Tuple[str, str]],
+    incumbent_score: float,
+    surrogate: Optional[PromptSurrogate],
+    target: Optional[str] = None,
+) -> Optional[Tuple[str, str]]:
+    """
+    Pick which refined (positive, negative) pair to render next.
+
+    With a trusted surrogate, candidates are ranked by predicted score
+    against `target` (the prompt renders are scored against) and
+    anything predicted more than SURROGATE_REJECT_MARGIN below the incumbent
+    is rejected without rendering. Returns None if there are no candidates
+    or every one is rejected. Without a surrogate, the first candidate wins.
+    """
+    if not candidates:
+        return None
+    if surrogate is None or not surrogate.is_trusted:
+        return candidates[0]
+
+    ranked = surrogate.rank_candidates(candidates, target=target)
+    for pred, conf, (pos, _) in ranked:
+        print(
+            f"[surrogate] Candidate predicted={pred:.2f} conf={conf:.2f}: "
+            f"{pos[:80]!r}"
+        )
+
+    for pred, conf, cand in ranked:
+        if pred >= incumbent_score - SURROGATE_REJECT_MARGIN:
+            return cand
+        print(
+            f"[surrogate] Rejected candidate (predicted {pred:.2f} < "
+            f"incumbent {incumbent_score:.2f} - margin {SURROGATE_REJECT_MARGIN})"
+        )
+
+    print("[surrogate] All refined candidates rejected.")
+    return None
+
+
 # ================================================================
 # Grid composite for quick visual comparison
 # ================================================================
@@ -443,7 +674,7 @@ def inject_best_into_blog_draft(
 # ================================================================
 # Main optimization loop
 # ================================================================
-def main() -> int:
+def main(argv: Optional[List[str]] = None) -> int:
     parser = argparse.ArgumentParser(
         description="HexForge prompt optimizer w/ multi-round refinement"
     )
@@ -468,7 +699,47 @@ def main() -> int:
         default=float(os.getenv("HEXFORGE_TARGET_SCORE", "7.5")),
         help="Stop early if best total score >= this value",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--refiner-variants",
+        type=int,
+        default=int(os.getenv("HEXFORGE_REFINER_VARIANTS", "3")),
+        help="Refined prompt candidates to request per round (ranked by the surrogate)",
+    )
+    parser.add_argument(
+        "--no-surrogate",
+        action="store_true",
+        help="Disable surrogate ranking/rejection of refined candidates",
+    )
+    parser.add_argument(
+        "--img2img",
+        action="store_true",
+        default=os.getenv("HEXFORGE_IMG2IMG", "").lower() in ("1", "true", "yes"),
+        help="Rounds after the first start from the previous round's best image",
+    )
+    parser.add_argument(
+        "--denoise",
+        type=float,
+        default=float(os.getenv("HEXFORGE_IMG2IMG_DENOISE", "0.55")),
+        help="img2img denoise strength (lower = stay closer to the init image)",
+    )
+    parser.add_argument(
+        "--warm-start-k",
+        type=int,
+        default=int(os.getenv("HEXFORGE_WARM_START_K", "2")),
+        help="Past winning prompt pairs to seed round 1 with (0 = cold start)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=float(os.getenv("HEXFORGE_RUN_BUDGET", "0")),
+        help="Stop starting new renders after this many seconds (0 = no limit)",
+    )
+    parser.add_argument(
+        "--events-path",
+        default=os.getenv("HEXFORGE_EVENTS_PATH", ""),
+        help="Append progress events (variant scores, round bests, summary) here as JSON lines",
+    )
+    args = parser.parse_args(argv)
 
     project = args.project
     part = args.part
@@ -477,6 +748,16 @@ def main() -> int:
     variants_per_round = max(1, args.num_images)
     max_rounds = max(1, args.max_rounds)
     target_score = args.target_score
+    refiner_variants = max(1, args.refiner_variants)
+    use_img2img = args.img2img
+    denoise = min(1.0, max(0.0, args.denoise))
+
+    run_started = time.time()
+    ollama_budget = TimeBudget(OLLAMA_BUDGET_SECONDS)
+    events = EventLog(args.events_path)
+
+    def out_of_time() -> bool:
+        return args.time_budget > 0 and time.time() - run_started >= args.time_budget
 
     # Final engine assets dir
     assets_dir = ASSETS_BASE / project / part / "images"
@@ -495,8 +776,24 @@ def main() -> int:
     print(f"[loop] Scores CSV = {scores_csv}")
     print(f"[loop] Variants/round = {variants_per_round}")
     print(f"[loop] Max rounds = {max_rounds}, Target score = {target_score}")
+    print(f"[loop] Refined candidates/round = {refiner_variants}")
+    if use_img2img:
+        print(f"[loop] img2img refinement enabled (denoise={denoise})")
+    if args.time_budget > 0:
+        print(f"[loop] Time budget = {args.time_budget:.0f}s")
     print(f"[loop] Starting positive prompt:\n{current_positive}")
     print(f"[loop] Starting negative prompt:\n{current_negative}")
+    events.emit(
+        "start",
+        project=project,
+        part=part,
+        prompt=current_positive,
+        max_rounds=max_rounds,
+        variants_per_round=variants_per_round,
+        target_score=target_score,
+    )
+
+    surrogate = None if args.no_surrogate else load_or_train_surrogate()
 
     # 🔧 Clear ComfyUI queue at start so we don't mix with old jobs
     clear_comfy_queue(context="before optimizer job")
@@ -504,24 +801,49 @@ def main() -> int:
     best_global_score = -1.0
     best_global_image: Optional[Path] = None
     best_global_prompt = current_positive
+    best_global_negative = current_negative
 
-    no_improve_rounds = 0
     manifest_entries: List[Dict] = []
+    memory = PromptMemory()
+    stopper = StoppingPolicy(variants_per_round)
+    stop_decisions: List[Dict] = []
+    stop_reason = f"max rounds reached ({max_rounds})"
+    init_image: Optional[str] = None
+
+    # Round 1: the job prompt plus related past winners; variants are spread
+    # round-robin across these pairs.
+    round_pairs: List[Tuple[str, str]] = [(current_positive, current_negative)]
+    round_pairs += warm_start_pairs(
+        current_positive, current_negative, k=min(args.warm_start_k, variants_per_round - 1)
+    )
 
     for r in range(1, max_rounds + 1):
         print(f"\n[loop] ===== Round {r}/{max_rounds} =====")
         round_best_score = -1.0
         round_best_image: Optional[Path] = None
-
-        prev_best_global = best_global_score
+        round_best_pair = round_pairs[0]
+        round_scores: List[float] = []
 
         # Comfy output subdir for this round
         round_subdir = f"{base_subdir}/r{r}"
         comfy_round_dir = COMFY_OUTPUT_ROOT / round_subdir
         comfy_round_dir.mkdir(parents=True, exist_ok=True)
 
+        predictions: Dict[Tuple[str, str], float] = {}
+        if surrogate is not None:
+            for pair in round_pairs:
+                predictions[pair], conf = surrogate.predict(*pair, target=args.prompt)
+                print(
+                    f"[surrogate] Round {r} predicted score = {predictions[pair]:.2f} "
+                    f"(conf={conf:.2f}) for {pair[0][:60]!r}"
+                )
+
         for i in range(1, variants_per_round + 1):
+            if out_of_time():
+                print("[loop] Time budget spent; skipping remaining variants.")
+                break
             prefix = f"{project}_{part}_r{r}_v{i}"
+            current_positive, current_negative = round_pairs[(i - 1) % len(round_pairs)]
             print(f"\n[loop] --- Variant {i}/{variants_per_round}, prefix={prefix} ---")
 
             payload = build_prompt_json(
@@ -529,19 +851,47 @@ def main() -> int:
                 current_negative,
                 prefix,
                 round_subdir,
+                init_image=init_image,
+                denoise=denoise,
             )
 
             if not post_to_comfyui(payload):
                 print("[loop] Skipping variant due to ComfyUI failure.")
+                events.emit("variant_failed", round=r, variant=i, reason="comfy_post")
                 continue
 
             img_path = wait_for_image(prefix)
             if not img_path:
                 print("[loop] No image produced for this variant.")
+                events.emit("variant_failed", round=r, variant=i, reason="no_image")
                 continue
 
-            total, clip, aesth = score_image(img_path, current_positive)
+            # Always against the job's prompt: warm-start pairs carry other
+            # projects' prompts, and scoring an image against its own prompt
+            # would let an unrelated concept win
+            total, clip, aesth = score_image(img_path, args.prompt)
             print(f"[loop] Score = {total} (CLIP={clip}, Aesthetic={aesth})")
+            events.emit(
+                "variant",
+                round=r,
+                variant=i,
+                image=img_path,
+                prompt=current_positive,
+                score=total,
+                clip=clip,
+                aesthetic=aesth,
+            )
+
+            if surrogate is not None and (total, clip, aesth) != (0.0, 0.0, 0.0):
+                predicted = predictions[(current_positive, current_negative)]
+                log_prediction(project, part, r, i, current_positive, predicted, total)
+                surrogate.add_observation(
+                    current_positive, current_negative, total, target=args.prompt
+                )
+
+            memory.record(current_positive, current_negative, total)
+            if (total, clip, aesth) != (0.0, 0.0, 0.0):
+                round_scores.append(total)
 
             timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
 
@@ -557,6 +907,7 @@ def main() -> int:
                     clip,
                     aesth,
                     timestamp,
+                    args.prompt,
                 ],
             )
 
@@ -571,17 +922,21 @@ def main() -> int:
                     "clip": clip,
                     "aesthetic": aesth,
                     "timestamp": timestamp,
+                    "init_image": init_image,
+                    "denoise": denoise if init_image else 1.0,
                 }
             )
 
             if total > round_best_score:
                 round_best_score = total
                 round_best_image = img_path
+                round_best_pair = (current_positive, current_negative)
 
             if total > best_global_score:
                 best_global_score = total
                 best_global_image = img_path
                 best_global_prompt = current_positive
+                best_global_negative = current_negative
 
         if round_best_image is None:
             print(f"[loop] Round {r}: no successful variants.")
@@ -590,42 +945,119 @@ def main() -> int:
                 f"[loop] Round {r} best = {round_best_image} "
                 f"(score={round_best_score})"
             )
+        events.emit(
+            "round",
+            round=r,
+            best_score=round_best_score if round_best_image else None,
+            best_image=round_best_image,
+            best_prompt=round_best_pair[0] if round_best_image else None,
+            overall_best_score=best_global_score if best_global_image else None,
+        )
 
-        # Early stop if we already hit the target
-        if best_global_score >= target_score:
-            print(
-                f"[loop] Target score reached (best={best_global_score} >= {target_score}); stopping."
-            )
+        if out_of_time():
+            stop_reason = f"time budget exhausted ({args.time_budget:.0f}s)"
             break
 
-        # Check for stagnation (no global improvement this round)
-        if best_global_score <= prev_best_global:
-            no_improve_rounds += 1
-            print(
-                f"[loop] No global improvement this round "
-                f"(stagnant rounds = {no_improve_rounds}/{MAX_STAGNANT_ROUNDS})."
-            )
-            if no_improve_rounds >= MAX_STAGNANT_ROUNDS:
-                print("[loop] Stagnation threshold reached; stopping early.")
-                break
-        else:
-            no_improve_rounds = 0
+        # Stop once another round is unlikely to beat the incumbent
+        stopper.observe_round(round_scores)
+        decision = stopper.decide(best_global_score, target_score)
+        decision["round"] = r
+        stop_decisions.append(decision)
+        print(
+            f"[stop] Round {r}: {'STOP' if decision['stop'] else 'continue'} "
+            f"- {decision['reason']}"
+        )
+        if decision["stop"]:
+            stop_reason = decision["reason"]
+            break
+
+        # Refinement (or a plain re-roll) continues from the round's best pair
+        current_positive, current_negative = round_best_pair
 
         # Prepare next round via Ollama refinement
         if r < max_rounds:
-            if round_best_image is not None and round_best_score > 0:
-                # Get fresh scores for the best round image to drive refinement
-                _, clip_s, aesth_s = score_image(round_best_image, current_positive)
-                current_positive, current_negative = refine_prompts_via_ollama(
-                    current_positive,
-                    current_negative,
-                    best_score=round_best_score,
-                    clip_score=clip_s,
-                    aesth_score=aesth_s,
-                    round_index=r,
+            if ollama_budget.exhausted():
+                print(
+                    f"[loop] Ollama budget ({ollama_budget.seconds:.0f}s) spent; "
+                    "re-rolling the round's best prompts."
                 )
+            elif round_best_image is not None and round_best_score > 0:
+                # Get fresh scores for the best round image to drive refinement
+                _, clip_s, aesth_s = score_image(round_best_image, args.prompt)
+                chosen: Optional[Tuple[str, str]] = None
+                rejected: List[Tuple[str, str]] = []
+                avoid: Optional[List[str]] = None
+                for attempt in range(MAX_DUPLICATE_RETRIES + 1):
+                    candidates: List[Tuple[str, str]] = []
+                    for _ in range(refiner_variants):
+                        cand = refine_prompts_via_ollama(
+                            current_positive,
+                            current_negative,
+                            best_score=round_best_score,
+                            clip_score=clip_s,
+                            aesth_score=aesth_s,
+                            round_index=r,
+                            avoid=avoid,
+                            budget=ollama_budget,
+                        )
+                        dup = memory.find_duplicate(*cand)
+                        if dup is not None:
+                            print(
+                                f"[loop] Refined candidate duplicates a rendered prompt "
+                                f"(recorded score={memory.recorded_score(dup):.2f}); discarding."
+                            )
+                        elif cand not in candidates and cand not in rejected:
+                            candidates.append(cand)
+
+                    chosen = choose_refined_candidate(
+                        candidates,
+                        incumbent_score=best_global_score,
+                        surrogate=surrogate,
+                        target=args.prompt,
+                    )
+                    if chosen is not None:
+                        break
+                    rejected += candidates
+                    if attempt == MAX_DUPLICATE_RETRIES:
+                        break
+                    # Ask for something that is neither rendered nor rejected
+                    avoid = memory.rendered_prompts() + [pos for pos, _ in rejected]
+                    print(
+                        f"[loop] No novel refinement worth rendering; asking again "
+                        f"({attempt + 1}/{MAX_DUPLICATE_RETRIES})."
+                    )
+
+                if chosen is None:
+                    # Rendering the round's best again would only repeat a
+                    # known score, and the surrogate expects every novel
+                    # candidate to lose, so spend no more GPU on this run.
+                    if rejected:
+                        print("[loop] Surrogate rejected every refinement; stopping.")
+                        stop_reason = "surrogate rejected every refined prompt"
+                    else:
+                        print(
+                            "[loop] Refiner keeps returning already-rendered prompts; "
+                            "reusing their recorded scores and stopping."
+                        )
+                        stop_reason = "refiner returned only already-rendered prompts"
+                    break
+
+                current_positive, current_negative = chosen
             else:
                 print("[loop] No good candidate to refine from; keeping current prompts.")
+            round_pairs = [(current_positive, current_negative)]
+
+            # img2img: polish this round's winner instead of resampling from
+            # noise. A round with no image keeps the previous init.
+            if use_img2img and round_best_image is not None:
+                staged = stage_init_image(
+                    round_best_image, f"{base_subdir}/r{r + 1}_init.png"
+                )
+                if staged:
+                    init_image = staged
+
+    print(f"[stop] Run ended: {stop_reason}")
+    events.emit("stop", reason=stop_reason)
 
     # Write manifest for asset browser
     try:
@@ -659,11 +1091,15 @@ def main() -> int:
             "part": part,
             "best_score": best_global_score,
             "best_prompt": best_global_prompt,
+            "best_negative_prompt": best_global_negative,
+            "target_prompt": args.prompt,
             "best_image": str(best_global_image),
             "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
             "target_score": target_score,
             "max_rounds": max_rounds,
             "variants_per_round": variants_per_round,
+            "stop_reason": stop_reason,
+            "stop_decisions": stop_decisions,
         }
         try:
             summary_json.parent.mkdir(parents=True, exist_ok=True)
@@ -689,8 +1125,17 @@ def main() -> int:
             inject_best_into_blog_draft(project, part, summary, BASE)
         except Exception as e:
             print(f"[loop] Blog injection error: {e}")
+        events.emit("summary", **summary)
     else:
         print("[loop] No valid best image found; nothing to copy.")
+        events.emit(
+            "summary",
+            project=project,
+            part=part,
+            best_score=None,
+            best_image=None,
+            stop_reason=stop_reason,
+        )
 
     # 🔧 Clear queue again so Comfy isn't left chewing on anything else
     clear_comfy_queue(context="after optimizer job")
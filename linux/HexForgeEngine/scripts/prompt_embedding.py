@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+prompt_embedding.py
+
+Lightweight prompt text embeddings for the optimizer tooling.
+
+No torch / sentence-transformers here on purpose: prompts are hashed into a
+fixed-size sparse bag of unigrams + bigrams (the "hashing trick") and
+L2-normalised, so cosine similarity works out of the box. Good enough to
+tell "cyberpunk workstation with glowing holograms" apart from "homelab
+rack at night" without loading a model on every job.
+"""
+
+import math
+import re
+import zlib
+from typing import Dict, List, Optional
+
+# Number of hash buckets. Prompts are short, so collisions are rare.
+EMBED_DIM = 4096
+
+# Words that carry no visual meaning for SD prompts
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "in", "on", "with", "at", "to", "for",
+    "by", "from", "into", "over", "under", "is", "are", "very",
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+Embedding = Dict[int, float]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens with stopwords removed.
+    """
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def _bucket(feature: str) -> int:
+    # crc32 is stable across runs (unlike hash()), which matters because
+    # embeddings are compared between jobs.
+    return zlib.crc32(feature.encode("utf-8")) % EMBED_DIM
+
+
+def embed_prompt(positive: str, negative: Optional[str] = None) -> Embedding:
+    """
+    Embed a prompt (and optionally its negative prompt) as a sparse,
+    L2-normalised vector {bucket: weight}.
+
+    Negative tokens live in their own feature namespace and get a lower
+    weight, so two prompts with the same subject but different negatives
+    still come out as close neighbours.
+    """
+    vec: Embedding = {}
+
+    def add(features: List[str], weight: float) -> None:
+        for feat in features:
+            idx = _bucket(feat)
+            vec[idx] = vec.get(idx, 0.0) + weight
+
+    pos_tokens = tokenize(positive)
+    add([f"p:{t}" for t in pos_tokens], 1.0)
+    add([f"p:{a}_{b}" for a, b in zip(pos_tokens, pos_tokens[1:])], 0.5)
+
+    if negative:
+        neg_tokens = tokenize(negative)
+        add([f"n:{t}" for t in neg_tokens], 0.3)
+
+    norm = math.sqrt(sum(w * w for w in vec.values()))
+    if norm == 0:
+        return {}
+    return {k: w / norm for k, w in vec.items()}
+
+
+def cosine(a: Embedding, b: Embedding) -> float:
+    """
+    Cosine similarity of two embeddings from embed_prompt (already unit length).
+    """
+    if not a or not b:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(k, 0.0) for k, w in a.items())
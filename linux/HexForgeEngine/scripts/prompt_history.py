@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+prompt_history.py
+
+Warm-start index over past optimizer runs.
+
+Collects every (positive, negative) pair that earlier jobs rendered, from
+both *_optimizer_summary.json and *_optimizer_scores.csv in logs/comfy-jobs,
+and finds the best-scoring pairs for prompts similar to a new job's prompt.
+loop_prompt_generator.py uses those to seed round 1 instead of starting
+from the raw prompt + DEFAULT_NEGATIVE_PROMPT every time.
+
+Scores are CLIP similarity to the prompt the run was targeting, not to the
+pair that rendered the image, so relatedness is judged on that target
+prompt: a pair that scored well for an unrelated job says nothing about
+this one. Rows from before the target_prompt column existed were scored
+against their own prompt.
+
+Usage:
+  python3 prompt_history.py --query "cyberpunk homelab hero in front of glowing racks"
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from prompt_embedding import cosine, embed_prompt
+from prompt_surrogate import is_failed_score, row_target
+
+# ================================================================
+# Paths & config
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+LOGS_BASE = BASE / "logs" / "comfy-jobs"
+
+# Past prompts at least this similar to the new prompt count as "related"
+WARM_START_MIN_SIMILARITY = float(os.getenv("HEXFORGE_WARM_START_MIN_SIM", "0.35"))
+
+
+class PromptHistoryIndex:
+    """
+    In-memory index of past prompt pairs, keyed by (target, positive,
+    negative) and holding the best score each pair ever reached against
+    that target.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str, str], Dict] = {}
+
+    def add(
+        self,
+        positive: str,
+        negative: str,
+        score: float,
+        source: str,
+        target: str = "",
+    ) -> None:
+        positive = positive.strip()
+        if not positive:
+            return
+        key = ((target or positive).strip(), positive, (negative or "").strip())
+        entry = self.entries.get(key)
+        if entry is None:
+            self.entries[key] = {
+                "target_prompt": key[0],
+                "prompt": key[1],
+                "negative_prompt": key[2],
+                "score": score,
+                "source": source,
+                "embedding": embed_prompt(key[0]),
+            }
+        elif score > entry["score"]:
+            entry["score"] = score
+            entry["source"] = source
+
+    @classmethod
+    def build(cls, logs_dir: Path = LOGS_BASE) -> "PromptHistoryIndex":
+        """
+        Scan logs_dir for score CSVs and summaries. Unreadable files are
+        logged and skipped.
+        """
+        index = cls()
+
+        for csv_path in sorted(logs_dir.glob("*_optimizer_scores.csv")):
+            try:
+                with csv_path.open("r", newline="", encoding="utf-8") as f:
+                    for row in csv.DictReader(f):
+                        if not row.get("prompt") or is_failed_score(row):
+                            continue
+                        index.add(
+                            row["prompt"],
+                            row.get("negative_prompt") or "",
+                            float(row["score"]),
+                            source=csv_path.name,
+                            target=row_target(row),
+                        )
+            except Exception as e:
+                print(f"[history] Skipping {csv_path}: {e}")
+
+        for summary_path in sorted(logs_dir.glob("*_optimizer_summary.json")):
+            try:
+                summary = json.loads(summary_path.read_text(encoding="utf-8"))
+                score = float(summary.get("best_score") or 0)
+                if score <= 0:
+                    continue
+                index.add(
+                    summary.get("best_prompt") or "",
+                    summary.get("best_negative_prompt") or "",
+                    score,
+                    source=summary_path.name,
+                    target=summary.get("target_prompt") or "",
+                )
+            except Exception as e:
+                print(f"[history] Skipping {summary_path}: {e}")
+
+        return index
+
+    def query(
+        self,
+        prompt: str,
+        k: int = 2,
+        min_similarity: float = WARM_START_MIN_SIMILARITY,
+        fallback_negative: str = "",
+    ) -> List[Dict]:
+        """
+        Return up to k past pairs whose target is related to `prompt`, best
+        score first. Pairs recorded without a negative prompt get
+        `fallback_negative`.
+        """
+        if k <= 0:
+            return []
+        emb = embed_prompt(prompt)
+        related = []
+        for entry in self.entries.values():
+            sim = cosine(emb, entry["embedding"])
+            if sim >= min_similarity:
+                related.append((entry["score"], sim, entry))
+        related.sort(key=lambda t: (t[0], t[1]), reverse=True)
+
+        results: List[Dict] = []
+        for score, sim, entry in related[:k]:
+            results.append(
+                {
+                    "target_prompt": entry["target_prompt"],
+                    "prompt": entry["prompt"],
+                    "negative_prompt": entry["negative_prompt"] or fallback_negative,
+                    "score": score,
+                    "similarity": round(sim, 3),
+                    "source": entry["source"],
+                }
+            )
+        return results
+
+
+def warm_start_pairs(
+    prompt: str,
+    negative: str,
+    k: int,
+    min_similarity: float = WARM_START_MIN_SIMILARITY,
+    logs_dir: Path = LOGS_BASE,
+) -> List[Tuple[str, str]]:
+    """
+    Best related (positive, negative) pairs from past runs for seeding
+    round 1. Never raises; returns [] if the index can't be built.
+    """
+    if k <= 0:
+        return []
+    try:
+        index = PromptHistoryIndex.build(logs_dir)
+        hits = index.query(prompt, k, min_similarity, fallback_negative=negative)
+    except Exception as e:
+        print(f"[history] Warm-start lookup failed: {e}")
+        return []
+
+    pairs: List[Tuple[str, str]] = []
+    for hit in hits:
+        print(
+            f"[history] Warm-start from {hit['source']} "
+            f"(score={hit['score']}, sim={hit['similarity']}): {hit['prompt'][:80]!r}"
+        )
+        pair = (hit["prompt"], hit["negative_prompt"])
+        if pair != (prompt, negative) and pair not in pairs:
+            pairs.append(pair)
+    if not pairs:
+        print("[history] No related past winners found; starting cold.")
+    return pairs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Query the HexForge optimizer warm-start index"
+    )
+    parser.add_argument("--query", required=True, help="Prompt to look up")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument(
+        "--min-similarity", type=float, default=WARM_START_MIN_SIMILARITY
+    )
+    args = parser.parse_args()
+
+    index = PromptHistoryIndex.build()
+    print(f"[history] Indexed {len(index.entries)} prompt pairs from {LOGS_BASE}")
+    hits = index.query(args.query, args.k, args.min_similarity)
+    print(json.dumps(hits, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+prompt_memory.py
+
+Per-run memory of rendered prompt pairs for the optimizer.
+
+Ollama regularly hands back a prompt we already rendered (or one that only
+differs by punctuation), and refine_prompts_via_ollama() returns the
+originals on any parse failure. PromptMemory lets loop_prompt_generator.py
+spot those repeats before they reach ComfyUI.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from prompt_embedding import embed_prompt, cosine, tokenize
+
+# Pairs at least this similar (cosine over prompt_embedding vectors) are
+# treated as the same prompt.
+DUPLICATE_SIMILARITY = float(os.getenv("HEXFORGE_DUP_SIMILARITY", "0.92"))
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Case/punctuation/whitespace-insensitive form used for exact matches.
+    """
+    return " ".join(tokenize(text))
+
+
+class PromptMemory:
+    """
+    Remembers every (positive, negative) pair rendered in this run together
+    with the scores it got.
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_SIMILARITY):
+        self.threshold = threshold
+        self.entries: List[Dict] = []
+
+    def _lookup(self, positive: str, negative: str) -> Optional[Dict]:
+        key = (normalize_prompt(positive), normalize_prompt(negative))
+        for entry in self.entries:
+            if entry["key"] == key:
+                return entry
+        return None
+
+    def record(self, positive: str, negative: str, score: float) -> None:
+        entry = self._lookup(positive, negative)
+        if entry is None:
+            entry = {
+                "key": (normalize_prompt(positive), normalize_prompt(negative)),
+                "prompt": positive,
+                "negative_prompt": negative,
+                "embedding": embed_prompt(positive, negative),
+                "scores": [],
+            }
+            self.entries.append(entry)
+        entry["scores"].append(score)
+
+    def find_duplicate(self, positive: str, negative: str) -> Optional[Dict]:
+        """
+        Return the remembered entry this pair duplicates (exactly or within
+        the similarity threshold), or None if it's new.
+        """
+        entry = self._lookup(positive, negative)
+        if entry is not None:
+            return entry
+
+        emb = embed_prompt(positive, negative)
+        best, best_sim = None, 0.0
+        for entry in self.entries:
+            sim = cosine(emb, entry["embedding"])
+            if sim > best_sim:
+                best, best_sim = entry, sim
+        return best if best_sim >= self.threshold else None
+
+    def recorded_score(self, entry: Dict) -> float:
+        """
+        Mean score a remembered pair got across its renders.
+        """
+        scores = entry["scores"]
+        return sum(scores) / len(scores) if scores else 0.0
+
+    def rendered_prompts(self, limit: int = 5) -> List[str]:
+        """
+        Most recent distinct positive prompts, for telling the refiner what
+        not to return.
+        """
+        return [e["prompt"] for e in self.entries[-limit:]]
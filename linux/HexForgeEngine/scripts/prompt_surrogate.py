@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+prompt_surrogate.py
+
+Surrogate score predictor for the prompt optimizer.
+
+Learns "prompt text -> render score" from the *_optimizer_scores.csv files
+the optimizer already writes to logs/comfy-jobs, so loop_prompt_generator.py
+can rank refined candidates (and reject obviously worse ones) before
+spending GPU time on them.
+
+The model is a small kernel-weighted nearest-neighbour regressor over the
+hashed embeddings from prompt_embedding.py: cheap to train, cheap to
+predict, no heavy deps.
+
+A score only means something relative to the prompt the image was scored
+against (CLIP similarity to the job's prompt), which for refined and
+warm-start variants is not the prompt that rendered it. Samples are keyed
+on (target_prompt, prompt, negative_prompt), and a neighbour only counts
+when both its rendered prompt and its target resemble the query's. Rows
+from CSVs written before the target_prompt column was recorded were scored
+against their own prompt, so their target is the prompt itself.
+
+Usage:
+  python3 prompt_surrogate.py --retrain
+  python3 prompt_surrogate.py --predict "cyberpunk workstation with glowing holograms"
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from prompt_embedding import Embedding, cosine, embed_prompt
+
+# ================================================================
+# Paths & config
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+LOGS_BASE = BASE / "logs" / "comfy-jobs"
+
+MODEL_PATH = LOGS_BASE / "prompt_surrogate.json"
+PREDICTIONS_CSV = LOGS_BASE / "surrogate_predictions.csv"
+
+# Nearest neighbours used per prediction
+SURROGATE_K = int(os.getenv("HEXFORGE_SURROGATE_K", "5"))
+
+# Below this many distinct prompts the model is not trusted to reject anything
+SURROGATE_MIN_SAMPLES = int(os.getenv("HEXFORGE_SURROGATE_MIN_SAMPLES", "8"))
+
+# Neighbours less similar than this don't count as evidence
+SURROGATE_MIN_SIMILARITY = float(os.getenv("HEXFORGE_SURROGATE_MIN_SIM", "0.2"))
+
+# Pseudo-weight of the global mean (shrinks predictions with thin evidence)
+PRIOR_WEIGHT = 0.1
+
+
+# ================================================================
+# Training data
+# ================================================================
+def is_failed_score(row: Dict[str, str]) -> bool:
+    """
+    score_image() falls back to (0.0, 0.0, 0.0) when scoring fails. Those rows
+    say nothing about the prompt, so they are kept out of training.
+    """
+    try:
+        return all(float(row.get(k) or 0) == 0.0 for k in ("score", "clip", "aesthetic"))
+    except ValueError:
+        return True
+
+
+def row_target(row: Dict[str, str]) -> str:
+    """
+    The prompt a score row was scored against (see module docstring).
+    """
+    return (row.get("target_prompt") or row["prompt"]).strip()
+
+
+def load_training_rows(logs_dir: Path = LOGS_BASE) -> List[Dict[str, str]]:
+    """
+    Read every *_optimizer_scores.csv under logs_dir. Unreadable files are
+    logged and skipped.
+    """
+    rows: List[Dict[str, str]] = []
+    for csv_path in sorted(logs_dir.glob("*_optimizer_scores.csv")):
+        try:
+            with csv_path.open("r", newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    if row.get("prompt") and not is_failed_score(row):
+                        rows.append(row)
+        except Exception as e:
+            print(f"[surrogate] Skipping {csv_path}: {e}")
+    return rows
+
+
+def aggregate_samples(rows: List[Dict[str, str]]) -> List[Dict]:
+    """
+    Collapse rows to one sample per (target_prompt, prompt, negative_prompt),
+    averaging scores over variants/seeds.
+    """
+    grouped: Dict[Tuple[str, str, str], List[float]] = {}
+    for row in rows:
+        key = (row_target(row), row["prompt"].strip(), (row.get("negative_prompt") or "").strip())
+        grouped.setdefault(key, []).append(float(row["score"]))
+
+    return [
+        {
+            "target_prompt": target,
+            "prompt": pos,
+            "negative_prompt": neg,
+            "score": round(sum(scores) / len(scores), 4),
+            "count": len(scores),
+        }
+        for (target, pos, neg), scores in grouped.items()
+    ]
+
+
+# ================================================================
+# Model
+# ================================================================
+class PromptSurrogate:
+    """
+    Kernel-weighted k-NN regressor: predicted score is the similarity-weighted
+    mean of the k most similar known prompts, shrunk towards the global mean
+    when the neighbours are weak. Similarity is prompt similarity times
+    target similarity.
+    """
+
+    def __init__(self, samples: List[Dict], meta: Optional[Dict] = None):
+        self.samples = list(samples)
+        for s in self.samples:
+            # Models saved before targets were recorded
+            s.setdefault("target_prompt", s["prompt"])
+        self.meta = dict(meta or {})
+        self._embeddings: List[Embedding] = [
+            embed_prompt(s["prompt"], s.get("negative_prompt")) for s in self.samples
+        ]
+        self._targets: List[Embedding] = [embed_prompt(s["target_prompt"]) for s in self.samples]
+
+    # ---- stats -------------------------------------------------
+    @property
+    def mean_score(self) -> float:
+        return self._mean_score()
+
+    def _mean_score(self, exclude: Optional[int] = None) -> float:
+        total = sum(s["score"] * s["count"] for i, s in enumerate(self.samples) if i != exclude)
+        n = sum(s["count"] for i, s in enumerate(self.samples) if i != exclude)
+        return total / n if n else 0.0
+
+    @property
+    def is_trusted(self) -> bool:
+        return len(self.samples) >= SURROGATE_MIN_SAMPLES
+
+    # ---- prediction --------------------------------------------
+    def _predict_embedding(
+        self, emb: Embedding, target: Embedding, exclude: Optional[int] = None
+    ) -> Tuple[float, float]:
+        scored: List[Tuple[float, int]] = []
+        for idx, other in enumerate(self._embeddings):
+            if idx == exclude:
+                continue
+            sim = cosine(emb, other) * cosine(target, self._targets[idx])
+            if sim >= SURROGATE_MIN_SIMILARITY:
+                scored.append((sim, idx))
+
+        # The held-out sample stays out of the prior too, or the LOO error
+        # would be optimistic
+        prior = self._mean_score(exclude)
+        if not scored:
+            return prior, 0.0
+
+        scored.sort(reverse=True)
+        num = PRIOR_WEIGHT * prior
+        den = PRIOR_WEIGHT
+        for sim, idx in scored[: max(1, SURROGATE_K)]:
+            sample = self.samples[idx]
+            # sim^2 sharpens towards near-duplicates; count rewards repeats
+            w = (sim ** 2) * math.sqrt(sample["count"])
+            num += w * sample["score"]
+            den += w
+        return num / den, scored[0][0]
+
+    def predict(
+        self, positive: str, negative: Optional[str] = None, target: Optional[str] = None
+    ) -> Tuple[float, float]:
+        """
+        Returns (predicted_score, confidence) for rendering `positive` and
+        scoring against `target` (default: `positive` itself). Confidence
+        is the similarity of the closest known sample (0 = no evidence).
+        """
+        return self._predict_embedding(
+            embed_prompt(positive, negative), embed_prompt(target or positive)
+        )
+
+    def rank_candidates(
+        self, candidates: List[Tuple[str, str]], target: Optional[str] = None
+    ) -> List[Tuple[float, float, Tuple[str, str]]]:
+        """
+        Score (positive, negative) candidates against `target`, best
+        predicted first.
+        """
+        ranked = []
+        for pos, neg in candidates:
+            pred, conf = self.predict(pos, neg, target)
+            ranked.append((pred, conf, (pos, neg)))
+        ranked.sort(key=lambda t: t[0], reverse=True)
+        return ranked
+
+    def add_observation(
+        self, positive: str, negative: str, score: float, target: Optional[str] = None
+    ) -> None:
+        """
+        Fold a fresh render score (scored against `target`, default
+        `positive`) into the model so later rounds of the same run already
+        benefit from it.
+        """
+        target = (target or positive).strip()
+        key = (target, positive.strip(), (negative or "").strip())
+        for sample in self.samples:
+            if (sample["target_prompt"], sample["prompt"], sample["negative_prompt"]) == key:
+                n = sample["count"]
+                sample["score"] = (sample["score"] * n + score) / (n + 1)
+                sample["count"] = n + 1
+                return
+        self.samples.append(
+            {
+                "target_prompt": key[0],
+                "prompt": key[1],
+                "negative_prompt": key[2],
+                "score": score,
+                "count": 1,
+            }
+        )
+        self._embeddings.append(embed_prompt(key[1], key[2]))
+        self._targets.append(embed_prompt(target))
+
+    # ---- evaluation --------------------------------------------
+    def leave_one_out_error(self) -> Dict[str, float]:
+        """
+        Leave-one-out MAE / RMSE over the training samples.
+        """
+        if len(self.samples) < 2:
+            return {"mae": 0.0, "rmse": 0.0, "n": len(self.samples)}
+        abs_errs = []
+        for idx, sample in enumerate(self.samples):
+            pred, _ = self._predict_embedding(self._embeddings[idx], self._targets[idx], exclude=idx)
+            abs_errs.append(abs(pred - sample["score"]))
+        mae = sum(abs_errs) / len(abs_errs)
+        rmse = math.sqrt(sum(e * e for e in abs_errs) / len(abs_errs))
+        return {"mae": round(mae, 4), "rmse": round(rmse, 4), "n": len(abs_errs)}
+
+    # ---- persistence -------------------------------------------
+    def save(self, path: Path = MODEL_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"meta": self.meta, "samples": self.samples}
+        path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path = MODEL_PATH) -> "PromptSurrogate":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(data.get("samples", []), data.get("meta"))
+
+
+def train_surrogate(logs_dir: Path = LOGS_BASE) -> PromptSurrogate:
+    """
+    Build a fresh model from every score CSV under logs_dir.
+    """
+    rows = load_training_rows(logs_dir)
+    samples = aggregate_samples(rows)
+    model = PromptSurrogate(samples)
+    error = model.leave_one_out_error()
+    model.meta = {
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rows": len(rows),
+        "samples": len(samples),
+        "loo_mae": error["mae"],
+        "loo_rmse": error["rmse"],
+    }
+    return model
+
+
+def load_or_train_surrogate(path: Path = MODEL_PATH) -> Optional[PromptSurrogate]:
+    """
+    Load the saved model, or train one in memory if it hasn't been built
+    yet. Never raises; returns None if nothing usable exists.
+    """
+    try:
+        if path.exists():
+            model = PromptSurrogate.load(path)
+        else:
+            model = train_surrogate(path.parent)
+        print(
+            f"[surrogate] Model ready: {len(model.samples)} prompts "
+            f"(LOO MAE={model.meta.get('loo_mae')}, trusted={model.is_trusted})"
+        )
+        return model
+    except Exception as e:
+        print(f"[surrogate] Could not load surrogate model: {e}")
+        return None
+
+
+# ================================================================
+# Prediction error log
+# ================================================================
+def log_prediction(
+    project: str,
+    part: str,
+    round_index: int,
+    variant: int,
+    prompt: str,
+    predicted: float,
+    actual: float,
+    csv_path: Path = PREDICTIONS_CSV,
+) -> None:
+    """
+    Append predicted-vs-actual to the prediction log. Fully guarded so
+    logging never kills the run.
+    """
+    try:
+        csv_path.parent.mkdir(parents=True, exist_ok=True)
+        exists = csv_path.exists()
+        with csv_path.open("a", newline="") as f:
+            writer = csv.writer(f)
+            if not exists:
+                writer.writerow(
+                    [
+                        "project",
+                        "part",
+                        "round",
+                        "variant",
+                        "prompt",
+                        "predicted",
+                        "actual",
+                        "abs_error",
+                        "timestamp",
+                    ]
+                )
+            writer.writerow(
+                [
+                    project,
+                    part,
+                    round_index,
+                    variant,
+                    prompt,
+                    round(predicted, 3),
+                    actual,
+                    round(abs(predicted - actual), 3),
+                    time.strftime("%Y-%m-%dT%H:%M:%S"),
+                ]
+            )
+    except Exception as e:
+        print(f"[surrogate] Failed to write prediction log: {e}")
+
+
+# ================================================================
+# CLI
+# ================================================================
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Train / query the HexForge prompt score surrogate"
+    )
+    parser.add_argument(
+        "--retrain",
+        action="store_true",
+        help=f"Rebuild the model from all score CSVs and save to {MODEL_PATH}",
+    )
+    parser.add_argument("--predict", help="Predict the score of a positive prompt")
+    parser.add_argument("--negative", default="", help="Negative prompt for --predict")
+    parser.add_argument("--target", help="Prompt the render is scored against (default: --predict)")
+    args = parser.parse_args()
+
+    if not args.retrain and not args.predict:
+        parser.print_help()
+        return 1
+
+    if args.retrain:
+        model = train_surrogate()
+        model.save()
+        meta = model.meta
+        print(
+            f"[surrogate] Trained on {meta['rows']} rows / {meta['samples']} prompts "
+            f"-> LOO MAE={meta['loo_mae']} RMSE={meta['loo_rmse']}"
+        )
+        print(f"[surrogate] Saved model to {MODEL_PATH}")
+    else:
+        model = load_or_train_surrogate()
+        if model is None:
+            return 1
+
+    if args.predict:
+        pred, conf = model.predict(args.predict, args.negative, args.target)
+        print(json.dumps({"predicted_score": round(pred, 3), "confidence": round(conf, 3)}))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+retry_failed_jobs.py
+
+Classify failed image jobs by cause and requeue selected causes in bulk.
+
+Looks at both failed jobs in the queue DB (their last_error plus the tail
+of their run log) and legacy job-*.json files in logs/comfy-jobs/failed
+(payload checks plus the project/part's comfy-last-run.log, since those
+files carry no reason). Causes:
+
+  comfy_unreachable  ComfyUI refused/failed the POST
+  timeout            image never appeared, supervisor kill, expired lease
+  scoring_error      score_image_engine.sh failed
+  bad_payload        unreadable JSON or missing project/part/prompt
+  unknown            nothing matched
+
+Requeued jobs get fresh attempts and are spaced --interval seconds apart
+(via the queue's available_at), so a backlog after an outage drains at a
+steady pace instead of hitting the render node all at once.
+
+Usage:
+  python3 retry_failed_jobs.py                        # report only
+  python3 retry_failed_jobs.py --requeue comfy_unreachable timeout --dry-run
+  python3 retry_failed_jobs.py --requeue comfy_unreachable --interval 120 --limit 20
+"""
+
+import argparse
+import json
+import re
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# ================================================================
+# Paths
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+
+# The job queue lives in the media_api package at the repo root
+sys.path.insert(0, str(BASE))
+from media_api.job_logs import read_tail  # noqa: E402
+from media_api.job_queue import JobQueue, image_job_pool, import_job_file  # noqa: E402
+
+ASSETS = BASE / "assets"
+LOGS_FAILED = BASE / "logs" / "comfy-jobs" / "failed"
+LOGS_RETRIED = BASE / "logs" / "comfy-jobs" / "retried"
+
+# Log lines read per job when looking for a cause
+LOG_TAIL_LINES = 300
+
+# ================================================================
+# Classification
+# ================================================================
+# Checked in order; the first class with a matching pattern wins
+FAILURE_PATTERNS: List[Tuple[str, List[str]]] = [
+    (
+        "bad_payload",
+        [r"is missing '", r"payload is missing", r"JSONDecodeError", r"Expecting value"],
+    ),
+    (
+        "comfy_unreachable",
+        [
+            r"All ComfyUI attempts failed",
+            r"ComfyUI request failed",
+            r"ComfyUI (HTTP|error)",
+            r"Connection refused",
+            r"Max retries exceeded",
+            r"Failed to establish a new connection",
+        ],
+    ),
+    (
+        "timeout",
+        [
+            r"Timed out",
+            r"killed by supervisor",
+            r"lease expired",
+            r"TimeoutExpired",
+        ],
+    ),
+    (
+        "scoring_error",
+        [r"Error scoring image", r"score_image_engine", r"scor(e|ing) failed"],
+    ),
+]
+FAILURE_CLASSES = [name for name, _ in FAILURE_PATTERNS] + ["unknown"]
+
+# Never requeued implicitly: they will fail the same way again
+NON_RETRYABLE = {"bad_payload"}
+
+REQUIRED_FIELDS = ("project", "part", "prompt")
+
+
+def classify_text(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Return (class, matching line) for error/log text.
+    """
+    for name, patterns in FAILURE_PATTERNS:
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                start = text.rfind("\n", 0, match.start()) + 1
+                end = text.find("\n", match.end())
+                return name, text[start : end if end != -1 else None].strip()[:200]
+    return "unknown", None
+
+
+def payload_problem(payload: Dict) -> Optional[str]:
+    missing = [f for f in REQUIRED_FIELDS if not payload.get(f)]
+    return f"payload is missing {', '.join(missing)}" if missing else None
+
+
+def last_run_log(project: str, part: str) -> str:
+    """
+    Text of the latest run in assets/<project>/<part>/images/comfy-last-run.log
+    (older watchers appended runs separated by "=== NEW RUN ===").
+    """
+    path = ASSETS / project / part / "images" / "comfy-last-run.log"
+    try:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ""
+    return text.rsplit("=== NEW RUN ===", 1)[-1]
+
+
+def classify_db_job(job: Dict) -> Dict:
+    problem = payload_problem(job["payload"])
+    if problem:
+        cause, evidence = "bad_payload", problem
+    else:
+        text = job.get("last_error") or ""
+        if job.get("log_path"):
+            text += "\n" + "\n".join(read_tail(Path(job["log_path"]), LOG_TAIL_LINES))
+        cause, evidence = classify_text(text)
+    return {
+        "source": "db",
+        "job_id": job["id"],
+        "project": job["project"],
+        "part": job["part"],
+        "cause": cause,
+        "evidence": evidence or (job.get("last_error") or "")[:200],
+    }
+
+
+def classify_legacy_file(path: Path) -> Dict:
+    entry = {"source": "file", "path": str(path), "project": None, "part": None}
+    try:
+        payload = json.loads(path.read_text(encoding="utf-8"))
+    except Exception as e:
+        return {**entry, "cause": "bad_payload", "evidence": f"unreadable JSON: {e}"}
+
+    entry.update(project=payload.get("project"), part=payload.get("part"))
+    problem = payload_problem(payload)
+    if problem:
+        return {**entry, "cause": "bad_payload", "evidence": problem}
+
+    # Legacy files carry no reason; the project/part's last run log is the
+    # best available hint
+    cause, evidence = classify_text(last_run_log(payload["project"], payload["part"]))
+    return {**entry, "cause": cause, "evidence": evidence}
+
+
+def collect_failures(queue: JobQueue, include_legacy: bool = True) -> List[Dict]:
+    # Oldest first, so a bulk retry replays jobs in their original order
+    failures = [
+        classify_db_job(job)
+        for job in reversed(queue.list_jobs(status="failed", kind="image", limit=100000))
+    ]
+    if include_legacy and LOGS_FAILED.exists():
+        # job-<id>.json files there are records of DB jobs, already covered
+        for path in sorted(LOGS_FAILED.glob("*.json")):
+            try:
+                record = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                record = {}
+            if isinstance(record, dict) and "queue_job_id" in record:
+                continue
+            failures.append(classify_legacy_file(path))
+    return failures
+
+
+# ================================================================
+# Requeue
+# ================================================================
+def requeue(
+    queue: JobQueue, failures: List[Dict], interval_s: float, dry_run: bool
+) -> List[Dict]:
+    """
+    Requeue `failures` spaced interval_s apart, oldest first. Legacy files
+    are imported into the queue and moved to logs/comfy-jobs/retried.
+    """
+    start_at = time.time()
+    done: List[Dict] = []
+    for failure in failures:
+        slot = start_at + len(done) * interval_s
+        when = time.strftime("%H:%M:%S", time.localtime(slot))
+        label = f"job #{failure['job_id']}" if failure["source"] == "db" else failure["path"]
+
+        if dry_run:
+            print(f"[retry] would requeue {label} ({failure['cause']}) at {when}")
+            done.append(failure)
+            continue
+
+        if failure["source"] == "db":
+            job_id = failure["job_id"]
+        else:
+            path = Path(failure["path"])
+            try:
+                with path.open("r", encoding="utf-8") as f:
+                    pool = image_job_pool(json.load(f))
+                # Not claimable before its slot, even before reschedule() runs
+                job = import_job_file(queue, path, kind="image", pool=pool, available_at=slot)
+            except Exception as e:
+                print(f"[retry] Could not import {label}: {e}; left in place")
+                continue
+            LOGS_RETRIED.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(path), LOGS_RETRIED / path.name)
+            if job["deduplicated"]:
+                print(f"[retry] {label}: identical job #{job['id']} is {job['deduplicated']}; skipped")
+                continue
+            job_id = job["id"]
+
+        if queue.reschedule([job_id], start_at=slot):
+            print(f"[retry] requeued {label} ({failure['cause']}) as job #{job_id} at {when}")
+            done.append(failure)
+        else:
+            print(f"[retry] {label} is no longer failed; skipped")
+    return done
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Classify failed HexForge image jobs and requeue them in bulk"
+    )
+    parser.add_argument(
+        "--requeue",
+        nargs="+",
+        choices=FAILURE_CLASSES + ["all"],
+        help="Failure classes to requeue ('all' = every retryable class)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=60.0,
+        help="Seconds between requeued jobs becoming available",
+    )
+    parser.add_argument("--limit", type=int, default=0, help="Requeue at most this many (0 = no limit)")
+    parser.add_argument("--project", help="Only jobs for this project")
+    parser.add_argument("--no-legacy", action="store_true", help="Ignore files in logs/comfy-jobs/failed")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would be requeued")
+    parser.add_argument("--json", action="store_true", help="Print the classification as JSON")
+    args = parser.parse_args()
+
+    queue = JobQueue()
+    failures = collect_failures(queue, include_legacy=not args.no_legacy)
+    if args.project:
+        failures = [f for f in failures if f["project"] == args.project]
+
+    if args.json:
+        print(json.dumps(failures, indent=2))
+    else:
+        by_cause: Dict[str, List[Dict]] = {}
+        for failure in failures:
+            by_cause.setdefault(failure["cause"], []).append(failure)
+        print(f"[retry] {len(failures)} failed job(s)")
+        for cause in FAILURE_CLASSES:
+            items = by_cause.get(cause, [])
+            if not items:
+                continue
+            print(f"\n{cause}: {len(items)}")
+            for f in items:
+                label = f"#{f['job_id']}" if f["source"] == "db" else Path(f["path"]).name
+                print(f"  {label:<32} {f['project']}/{f['part']}  {f['evidence'] or ''}")
+
+    if not args.requeue:
+        return 0
+
+    if "all" in args.requeue:
+        classes = set(FAILURE_CLASSES) - NON_RETRYABLE
+    else:
+        classes = set(args.requeue)
+        if classes & NON_RETRYABLE:
+            print(f"[retry] Warning: requeueing {sorted(classes & NON_RETRYABLE)}; these will likely fail again")
+
+    selected = [f for f in failures if f["cause"] in classes]
+    if args.limit > 0:
+        selected = selected[: args.limit]
+    print(f"\n[retry] Requeueing {len(selected)} job(s), {args.interval:.0f}s apart")
+    requeue(queue, selected, args.interval, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -22,10 +22,19 @@ import random
 BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
 ASSETS_BASE = BASE / "assets"
 
+# Stage timings go to the media API's metrics store (stdlib-only module)
+sys.path.insert(0, str(BASE))
+from media_api import metrics  # noqa: E402
+
 COMFY_ROOT = Path("/root/ai-tools/ComfyUI")
 COMFY_OUTPUT_ROOT = COMFY_ROOT / "output"
 COMFY_URL = os.getenv("COMFY_URL", "http://localhost:8188/prompt")
 
+# Per-stage time limits (seconds) and [heartbeat] interval during waits
+COMFY_POST_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_COMFY_POST_TIMEOUT", "120"))
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_SIMPLE_IMAGE_TIMEOUT", "180"))
+HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("HEXFORGE_HEARTBEAT_INTERVAL", "30"))
+
 # Optimizer script (the loop_prompt_generator you just updated)
 OPTIMIZER_SCRIPT = (
     BASE / "linux" / "HexForgeEngine" / "scripts" / "loop_prompt_generator.py"
@@ -91,13 +100,14 @@ def build_simple_prompt_json(prompt_text: str, neg_text: str, prefix: str, outpu
     }
 
 
+@metrics.stage_timer("comfy_post", failed=lambda ok: not ok, engine="simple")
 def post_to_comfyui(payload: dict, retries: int = 3) -> bool:
     for attempt in range(1, retries + 1):
         try:
             print(f"[runner] Posting to ComfyUI (attempt {attempt})")
             import requests  # local import
 
-            resp = requests.post(COMFY_URL, json=payload, timeout=120)
+            resp = requests.post(COMFY_URL, json=payload, timeout=COMFY_POST_TIMEOUT_SECONDS)
             if resp.ok:
                 return True
             print(f"[runner] ComfyUI error: {resp.status_code} {resp.text[:200]}")
@@ -108,11 +118,18 @@ def post_to_comfyui(payload: dict, retries: int = 3) -> bool:
     return False
 
 
-def wait_for_image(out_dir: Path, prefix: str, timeout: int = 180) -> Path | None:
+@metrics.stage_timer("image_wait", failed=lambda path: path is None, engine="simple")
+def wait_for_image(
+    out_dir: Path, prefix: str, timeout: float = IMAGE_TIMEOUT_SECONDS
+) -> Path | None:
     target = out_dir / f"{prefix}_00001_.png"
     print(f"[runner] Waiting for image: {target}")
     start = time.time()
+    last_beat = start
     while time.time() - start < timeout:
+        if time.time() - last_beat >= HEARTBEAT_INTERVAL_SECONDS:
+            last_beat = time.time()
+            print(f"[heartbeat] waiting for {target.name} ({last_beat - start:.0f}s/{timeout:.0f}s)")
         if target.exists():
             print("[runner] Image found.")
             return target
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+socket_worker.py
+
+Unix-socket plumbing shared by the resident model workers (tts_worker.py,
+stt_worker.py): one JSON request per line in, one JSON response per line
+out, one thread per connection. The service object decides what each
+request does; clients live in media_api/worker_socket.py.
+"""
+
+import json
+import os
+import socketserver
+from pathlib import Path
+from typing import Callable, Dict
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        job_handler = self.server.job_handler
+        for raw in self.rfile:
+            try:
+                response = job_handler(json.loads(raw))
+            except Exception as e:
+                response = {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, job_handler: Callable[[Dict], Dict]):
+        # Not "handle_request": that is BaseServer's own method
+        self.job_handler = job_handler
+        super().__init__(socket_path, RequestHandler)
+
+
+def serve(socket_path: Path, handle_request: Callable[[Dict], Dict], tag: str) -> int:
+    """
+    Serve handle_request on socket_path until interrupted.
+    """
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        socket_path.unlink()
+
+    with WorkerServer(str(socket_path), handle_request) as server:
+        os.chmod(socket_path, 0o660)
+        print(f"[{tag}] Listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+    return 0
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+stt_longform.py
+
+Long-form transcription for hour-plus session recordings.
+
+Run it inside the Whisper venv. The audio is cut into segments of about
+HEXFORGE_STT_SEGMENT_SECONDS, each cut placed in the middle of a silence
+(ffmpeg silencedetect) so no word is split. Segments are transcribed on a
+process pool, each process with its own Whisper model, and merged back
+into one transcript with segment timestamps shifted to the recording's
+timeline. Wall time then scales with the cores given to the pool.
+
+stt_worker.py serves the same thing as its "longform" op; standalone:
+  /root/ai-tools/Whisper/venv/bin/python stt_longform.py --audio session.mkv --project p --part part-1
+
+Transcripts use the stt_worker layout: <name>.txt plus <name>.json with
+the timed segments, under assets/<project>/<part>/transcripts.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# ================================================================
+# Config
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+ASSETS = BASE / "assets"
+
+WHISPER_MODEL = os.getenv("HEXFORGE_WHISPER_MODEL", "base")
+WHISPER_LANGUAGE = os.getenv("HEXFORGE_WHISPER_LANGUAGE", "en")
+WHISPER_FP16 = os.getenv("HEXFORGE_WHISPER_FP16", "").lower() in ("1", "true", "yes")
+
+# whisper.load_audio always resamples to this rate
+SAMPLE_RATE = 16000
+
+# ================================================================
+# Segmenting
+# ================================================================
+# Aim for segments this long; a cut moves to the nearest silence within
+# half a segment either way, or falls exactly on the target without one
+SEGMENT_SECONDS = float(os.getenv("HEXFORGE_STT_SEGMENT_SECONDS", "120"))
+
+# What counts as a silence worth cutting at
+SILENCE_NOISE_DB = os.getenv("HEXFORGE_STT_SILENCE_DB", "-35dB")
+SILENCE_MIN_SECONDS = float(os.getenv("HEXFORGE_STT_SILENCE_MIN", "0.5"))
+
+# Transcription processes (each loads its own model)
+STT_PROCESSES = int(os.getenv("HEXFORGE_STT_PROCESSES", str(max(1, (os.cpu_count() or 2) // 2))))
+
+SILENCE_START_RE = re.compile(r"silence_start:\s*(-?[\d.]+)")
+SILENCE_END_RE = re.compile(r"silence_end:\s*([\d.]+)")
+
+
+def transcript_path(item: Dict) -> Path:
+    """
+    Where an item's transcript goes: its "out", else
+    assets/<project>/<part>/transcripts/<audio name>.txt.
+    """
+    if item.get("out"):
+        return Path(item["out"])
+    project = item.get("project") or "scratch"
+    part = item.get("part") or "part-1"
+    return ASSETS / project / part / "transcripts" / f"{Path(item['audio']).stem}.txt"
+
+
+def write_transcript(out_path: Path, audio: str, model: str, text: str, segments: List[Dict]) -> None:
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(text + "\n", encoding="utf-8")
+    out_path.with_suffix(".json").write_text(
+        json.dumps({"audio": audio, "model": model, "segments": segments}, ensure_ascii=False, indent=2),
+        encoding="utf-8",
+    )
+
+
+def probe_duration(audio: str) -> float:
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.strip())
+
+
+def detect_silences(audio: str) -> List[Tuple[float, float]]:
+    """
+    (start, end) of every silence ffmpeg's silencedetect finds.
+    """
+    proc = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-hide_banner", "-i", audio, "-vn",
+            "-af", f"silencedetect=noise={SILENCE_NOISE_DB}:d={SILENCE_MIN_SECONDS}",
+            "-f", "null", "-",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    silences, start = [], None
+    for line in proc.stderr.splitlines():
+        m = SILENCE_START_RE.search(line)
+        if m:
+            start = max(0.0, float(m.group(1)))
+            continue
+        m = SILENCE_END_RE.search(line)
+        if m and start is not None:
+            silences.append((start, float(m.group(1))))
+            start = None
+    return silences
+
+
+def plan_segments(duration: float, silences: List[Tuple[float, float]],
+                  target: float = SEGMENT_SECONDS) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration] into (start, end) segments of roughly `target`
+    seconds, cutting at silence midpoints where there are any nearby.
+    """
+    cuts = [(s + e) / 2 for s, e in silences]
+    segments, start = [], 0.0
+    while duration - start > target * 1.5:
+        want = start + target
+        nearby = [c for c in cuts if want - target / 2 <= c <= want + target / 2]
+        cut = min(nearby, key=lambda c: abs(c - want)) if nearby else want
+        segments.append((start, cut))
+        start = cut
+    segments.append((start, duration))
+    return segments
+
+
+# ================================================================
+# Pool workers
+# ================================================================
+_model = None
+
+
+def init_worker(model_name: str, threads: int) -> None:
+    global _model
+    import torch  # type: ignore
+    import whisper  # type: ignore
+
+    torch.set_num_threads(max(1, threads))
+    _model = whisper.load_model(model_name)
+
+
+def decode_slice(audio: str, start: float, end: float):
+    """
+    Mono 16 kHz float32 samples of audio[start:end], as whisper.load_audio.
+    """
+    import numpy as np  # type: ignore
+
+    out = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-threads", "0",
+            "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}", "-i", audio,
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-",
+        ],
+        capture_output=True,
+        check=True,
+    ).stdout
+    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+
+
+def transcribe_segment(args: Tuple[str, float, float]) -> Dict:
+    audio, start, end = args
+    t0 = time.time()
+    out = _model.transcribe(decode_slice(audio, start, end), language=WHISPER_LANGUAGE, fp16=WHISPER_FP16)
+    return {
+        "start": start,
+        "end": end,
+        "seconds": round(time.time() - t0, 3),
+        "text": (out.get("text") or "").strip(),
+        "segments": [
+            {
+                "start": round(start + s["start"], 2),
+                "end": round(start + s["end"], 2),
+                "text": s["text"].strip(),
+            }
+            for s in out.get("segments", [])
+        ],
+    }
+
+
+def transcribe_long(item: Dict, processes: int = STT_PROCESSES, model_name: str = WHISPER_MODEL) -> Dict:
+    """
+    Segment, transcribe in parallel and merge one {"audio", "out"?,
+    "project"?, "part"?} item. Never raises.
+    """
+    result = {"id": item.get("id"), "audio": item.get("audio"), "ok": False}
+    start = time.time()
+    try:
+        audio = str(item["audio"])
+        if not Path(audio).exists():
+            raise FileNotFoundError(f"File not found: {audio}")
+
+        duration = probe_duration(audio)
+        segments = plan_segments(duration, detect_silences(audio))
+        workers = max(1, min(processes, len(segments)))
+        print(f"[stt-longform] {audio}: {duration:.0f}s in {len(segments)} segment(s) on {workers} process(es)")
+
+        # spawn, not fork: the resident worker has threads and a model loaded
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(model_name, (os.cpu_count() or workers) // workers),
+        ) as pool:
+            parts = list(pool.map(transcribe_segment, [(audio, s, e) for s, e in segments]))
+
+        text = " ".join(p["text"] for p in parts if p["text"])
+        merged = [s for p in parts for s in p["segments"]]
+        out_path = transcript_path(item)
+        write_transcript(out_path, audio, model_name, text, merged)
+
+        seconds = time.time() - start
+        result.update(
+            ok=True,
+            path=str(out_path),
+            text=text,
+            duration_s=round(duration, 2),
+            seconds=round(seconds, 3),
+            rtf=round(seconds / duration, 4) if duration > 0 else None,
+            segments=len(parts),
+            processes=workers,
+            segment_seconds=[p["seconds"] for p in parts],
+        )
+    except Exception as e:
+        result.update(error=f"{e.__class__.__name__}: {e}", seconds=round(time.time() - start, 3))
+
+    print(
+        f"[stt-longform] {item.get('audio')}: ok={result['ok']} "
+        f"({result.get('seconds')}s, rtf={result.get('rtf')})"
+    )
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="HexForge long-form Whisper transcription")
+    parser.add_argument("--audio", required=True)
+    parser.add_argument("--out", help="Transcript .txt path (default: assets/<project>/<part>/transcripts)")
+    parser.add_argument("--project")
+    parser.add_argument("--part")
+    parser.add_argument("--processes", type=int, default=STT_PROCESSES)
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    args = parser.parse_args()
+
+    item = {"audio": args.audio, "out": args.out, "project": args.project, "part": args.part}
+    result = transcribe_long(item, processes=args.processes, model_name=args.model)
+    print(json.dumps({k: v for k, v in result.items() if k != "text"}, indent=2))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
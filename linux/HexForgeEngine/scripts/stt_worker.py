@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+stt_worker.py
+
+Resident Whisper transcription worker.
+
+Run it inside the Whisper venv. It loads the model once and then either
+serves requests on a unix socket (HEXFORGE_STT_SOCKET; clients use
+media_api/stt_client.py) or transcribes the files given on the command
+line as a single batch:
+
+  /root/ai-tools/Whisper/venv/bin/python stt_worker.py
+  /root/ai-tools/Whisper/venv/bin/python stt_worker.py --batch a.wav b.mp4 --project p --part part-1
+
+Transcripts go to assets/<project>/<part>/transcripts/<name>.txt, with
+a .json next to it holding the timed segments. Within a batch the next
+file's audio is decoded (ffmpeg) while the current one is transcribed.
+Every file reports its real-time factor (processing time / audio length).
+Hour-long recordings can go through the "longform" op instead, which
+segments them at silences and transcribes on a process pool
+(stt_longform.py).
+
+Protocol (one JSON object per line each way):
+  {"op": "transcribe", "audio": "/x.wav", "project": "p", "part": "part-1"}
+      -> {"ok": true, "path": ".../x.txt", "text": "...", "duration_s": 61.2, "seconds": 7.9, "rtf": 0.13}
+  {"op": "batch", "items": [{"id": 1, "audio": ..., "project": ..., "part": ...}, ...]}
+      -> {"ok": true, "items": [...]}
+  {"op": "longform", "audio": "/session.mkv", "out": "/x.txt"}
+      -> {"ok": true, ..., "segments": 31, "processes": 4}
+  {"op": "info"} -> {"ok": true, "model": "base", "served": 3}
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import stt_longform
+from socket_worker import serve
+from stt_longform import (
+    SAMPLE_RATE,
+    WHISPER_FP16,
+    WHISPER_LANGUAGE,
+    WHISPER_MODEL,
+    transcript_path,
+    write_transcript,
+)
+
+# ================================================================
+# Config
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+SOCKET_PATH = Path(os.getenv("HEXFORGE_STT_SOCKET", str(BASE / "state" / "stt.sock")))
+
+
+class STTService:
+    """
+    Holds the loaded Whisper model; transcription is serialized because
+    one model instance shouldn't run two decodes at once.
+    """
+
+    def __init__(self, model_name: str = WHISPER_MODEL):
+        import whisper  # type: ignore
+
+        self.whisper = whisper
+        self.model_name = model_name
+        t0 = time.time()
+        self.model = whisper.load_model(model_name)
+        self.model_load_s = round(time.time() - t0, 3)
+        self.lock = threading.Lock()
+        self.served = 0
+        # Decodes the next file's audio while the current one is transcribed
+        self.decoder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stt-decode")
+        print(f"[stt-worker] Whisper '{model_name}' loaded in {self.model_load_s}s")
+
+    def info(self) -> Dict:
+        return {
+            "ok": True,
+            "model": self.model_name,
+            "model_load_s": self.model_load_s,
+            "served": self.served,
+        }
+
+    def decode(self, item: Dict):
+        return self.whisper.load_audio(str(item["audio"]))
+
+    def transcribe_item(self, item: Dict, audio_future: Optional[Future] = None) -> Dict:
+        """
+        Transcribe one item and write its .txt/.json. Never raises.
+        """
+        result = {"id": item.get("id"), "audio": item.get("audio"), "ok": False}
+        start = time.time()
+        try:
+            if not Path(item["audio"]).exists():
+                raise FileNotFoundError(f"File not found: {item['audio']}")
+            audio = audio_future.result() if audio_future is not None else self.decode(item)
+            duration = len(audio) / SAMPLE_RATE
+
+            with self.lock:
+                out = self.model.transcribe(audio, language=WHISPER_LANGUAGE, fp16=WHISPER_FP16)
+                self.served += 1
+
+            out_path = transcript_path(item)
+            text = (out.get("text") or "").strip()
+            segments = [
+                {"start": round(s["start"], 2), "end": round(s["end"], 2), "text": s["text"].strip()}
+                for s in out.get("segments", [])
+            ]
+            write_transcript(out_path, str(item["audio"]), self.model_name, text, segments)
+
+            seconds = time.time() - start
+            result.update(
+                ok=True,
+                path=str(out_path),
+                text=text,
+                duration_s=round(duration, 2),
+                seconds=round(seconds, 3),
+                rtf=round(seconds / duration, 4) if duration > 0 else None,
+            )
+        except Exception as e:
+            result.update(error=f"{e.__class__.__name__}: {e}", seconds=round(time.time() - start, 3))
+
+        print(
+            f"[stt-worker] {item.get('audio')}: ok={result['ok']} "
+            f"({result.get('seconds')}s, rtf={result.get('rtf')})"
+        )
+        return result
+
+    def transcribe_batch(self, items: List[Dict]) -> List[Dict]:
+        results = []
+        pending = self.decoder.submit(self.decode, items[0]) if items else None
+        for i, item in enumerate(items):
+            current = pending
+            pending = self.decoder.submit(self.decode, items[i + 1]) if i + 1 < len(items) else None
+            results.append(self.transcribe_item(item, current))
+        return results
+
+    def handle(self, request: Dict) -> Dict:
+        op = request.get("op", "transcribe")
+        if op == "info":
+            return self.info()
+        if op == "batch":
+            return {"ok": True, "items": self.transcribe_batch(request["items"])}
+        if op == "transcribe":
+            return self.transcribe_item(request)
+        if op == "longform":
+            # Runs on its own process pool, so the resident model stays free
+            return stt_longform.transcribe_long(request, model_name=self.model_name)
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="HexForge resident Whisper worker")
+    parser.add_argument("--batch", nargs="+", metavar="AUDIO", help="Transcribe these files and exit")
+    parser.add_argument("--project")
+    parser.add_argument("--part")
+    parser.add_argument("--model", default=WHISPER_MODEL)
+    args = parser.parse_args()
+
+    service = STTService(args.model)
+    if not args.batch:
+        return serve(SOCKET_PATH, service.handle, "stt-worker")
+
+    items = [
+        {"id": i, "audio": path, "project": args.project, "part": args.part}
+        for i, path in enumerate(args.batch, 1)
+    ]
+    results = service.transcribe_batch(items)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+tts_batch.py
+
+Synthesize a batch of texts with one TTS model load.
+
+Runs inside the SadTalker venv (watch_incoming_voice.py starts it with
+that interpreter when the resident tts_worker.py isn't running). Loading
+the Coqui model dominates short clips, so it is loaded once per batch
+instead of once per text; items fall back to SadTalker's
+scripts/tts_from_text.py one by one if Coqui isn't available or fails on
+an item. tts_worker.py reuses the same functions with the model loaded
+once for its lifetime.
+
+Usage:
+  python tts_batch.py --manifest batch.json --results results.json
+
+Manifest: [{"id": 12, "text": "...", "out": "/path/voice.wav", "voice": "default"}, ...]
+Results:  {"engine": "coqui", "model_load_s": 4.2,
+           "items": [{"id": 12, "ok": true, "seconds": 1.3, "engine": "coqui"}, ...]}
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# ================================================================
+# Config
+# ================================================================
+SADTALKER_ROOT = Path(os.getenv("HEXFORGE_SADTALKER_ROOT", "/root/ai-tools/SadTalker"))
+FALLBACK_SCRIPT = SADTALKER_ROOT / "scripts" / "tts_from_text.py"
+
+TTS_MODEL = os.getenv("HEXFORGE_TTS_MODEL", "tts_models/en/ljspeech/tacotron2-DDC")
+FALLBACK_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_TTS_FALLBACK_TIMEOUT", "600"))
+
+
+def load_model():
+    """
+    Load the Coqui TTS model, or return None if it can't be loaded.
+    """
+    try:
+        from TTS.api import TTS
+
+        return TTS(model_name=TTS_MODEL, progress_bar=False)
+    except Exception as e:
+        print(f"[tts] Coqui TTS unavailable ({e}); using {FALLBACK_SCRIPT.name} per item")
+        return None
+
+
+def synthesize_coqui(model, text: str, out_path: Path, voice: Optional[str]) -> None:
+    kwargs = {}
+    # Only multi-speaker models accept a speaker; "default" means the model's own
+    if voice and voice != "default" and getattr(model, "is_multi_speaker", False):
+        kwargs["speaker"] = voice
+    model.tts_to_file(text=text, file_path=str(out_path), **kwargs)
+
+
+def synthesize_fallback(text: str, out_path: Path, voice: Optional[str]) -> None:
+    cmd = [sys.executable, str(FALLBACK_SCRIPT), "--text", text, "--out", str(out_path)]
+    if voice and voice != "default":
+        cmd += ["--voice", voice]
+    subprocess.run(cmd, cwd=str(SADTALKER_ROOT), check=True, timeout=FALLBACK_TIMEOUT_SECONDS)
+
+
+def synthesize_item(model, item: Dict) -> Dict:
+    """
+    Synthesize one manifest item with `model` (None = fallback only).
+    Returns its result entry; never raises.
+    """
+    out_path = Path(item["out"])
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    voice = item.get("voice")
+
+    start = time.time()
+    engine, error = None, None
+    if model is not None:
+        try:
+            synthesize_coqui(model, item["text"], out_path, voice)
+            engine = "coqui"
+        except Exception as e:
+            print(f"[tts] Coqui failed for item {item.get('id')}: {e}; trying fallback")
+    if engine is None:
+        try:
+            synthesize_fallback(item["text"], out_path, voice)
+            engine = "fallback"
+        except Exception as e:
+            error = str(e)
+
+    ok = error is None and out_path.exists()
+    return {
+        "id": item.get("id"),
+        "ok": ok,
+        "engine": engine,
+        "seconds": round(time.time() - start, 3),
+        "error": (error or "no audio written") if not ok else None,
+    }
+
+
+def run_batch(items: List[Dict]) -> Dict:
+    t0 = time.time()
+    model = load_model()
+    model_load_s = round(time.time() - t0, 3)
+
+    results = []
+    for item in items:
+        results.append(synthesize_item(model, item))
+        r = results[-1]
+        print(f"[tts] item {r['id']}: ok={r['ok']} engine={r['engine']} ({r['seconds']}s)")
+
+    return {
+        "engine": "coqui" if model is not None else "fallback",
+        "model": TTS_MODEL if model is not None else None,
+        "model_load_s": model_load_s,
+        "items": results,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="HexForge batched TTS")
+    parser.add_argument("--manifest", required=True, help="JSON list of items to synthesize")
+    parser.add_argument("--results", required=True, help="Where to write the results JSON")
+    args = parser.parse_args()
+
+    items = json.loads(Path(args.manifest).read_text(encoding="utf-8"))
+    print(f"[tts] Batch of {len(items)} item(s)")
+    results = run_batch(items)
+    Path(args.results).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0 if all(r["ok"] for r in results["items"]) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+tts_worker.py
+
+Long-lived TTS server with the model kept resident.
+
+Run it inside the SadTalker venv:
+  /root/ai-tools/SadTalker/venv/bin/python tts_worker.py
+
+It loads the Coqui model once (see tts_batch.py) and serves requests over
+a unix socket (HEXFORGE_TTS_SOCKET), so /tts and the voice worker pay only
+inference time per request. Clients use media_api/tts_client.py.
+
+Protocol: one JSON object per line each way.
+  {"op": "synthesize", "text": "...", "out": "/path.wav", "voice": "default"}
+      -> {"ok": true, "seconds": 1.2, "engine": "coqui"}
+  {"op": "batch", "items": [{"id": 1, "text": ..., "out": ..., "voice": ...}, ...]}
+      -> {"ok": true, "items": [{"id": 1, "ok": true, "seconds": ..., ...}, ...]}
+  {"op": "info"} -> {"ok": true, "engine": "coqui", "model": "...", "served": 12}
+"""
+
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+import tts_batch
+from socket_worker import serve
+
+# ================================================================
+# Config
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+SOCKET_PATH = Path(os.getenv("HEXFORGE_TTS_SOCKET", str(BASE / "state" / "tts.sock")))
+
+
+class TTSService:
+    """
+    Holds the loaded model; synthesis is serialized because the model isn't
+    safe to call from several threads at once.
+    """
+
+    def __init__(self):
+        t0 = time.time()
+        self.model = tts_batch.load_model()
+        self.model_load_s = round(time.time() - t0, 3)
+        self.lock = threading.Lock()
+        self.served = 0
+        print(
+            f"[tts-worker] Model ready in {self.model_load_s}s "
+            f"(engine={'coqui' if self.model is not None else 'fallback'})"
+        )
+
+    def info(self) -> Dict:
+        return {
+            "ok": True,
+            "engine": "coqui" if self.model is not None else "fallback",
+            "model": tts_batch.TTS_MODEL if self.model is not None else None,
+            "model_load_s": self.model_load_s,
+            "served": self.served,
+        }
+
+    def synthesize(self, item: Dict) -> Dict:
+        with self.lock:
+            start = time.time()
+            result = tts_batch.synthesize_item(self.model, item)
+            self.served += 1
+        print(f"[tts-worker] {item.get('out')}: ok={result['ok']} ({time.time() - start:.2f}s)")
+        return result
+
+    def handle(self, request: Dict) -> Dict:
+        op = request.get("op", "synthesize")
+        if op == "info":
+            return self.info()
+        if op == "batch":
+            return {"ok": True, "items": [self.synthesize(item) for item in request["items"]]}
+        if op == "synthesize":
+            return self.synthesize(request)
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+
+def main() -> int:
+    service = TTSService()
+    return serve(SOCKET_PATH, service.handle, "tts-worker")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,98 @@
 #!/usr/bin/env python3
 import asyncio
 import json
+import os
 import shutil
+import socket
 import subprocess
+import sys
+import time
 from pathlib import Path
+from typing import Callable, Dict, Iterable, Set
 from watchfiles import awatch, Change
 
+from job_runners import InProcessExecutor, JobSupervisor, kill_process_group, optimizer_argv
+
 # ================================================================
 # Paths
 # ================================================================
 BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+
+# The job queue lives in the media_api package at the repo root
+sys.path.insert(0, str(BASE))
+from media_api import metrics  # noqa: E402
+from media_api.job_queue import (  # noqa: E402
+    DEFAULT_LEASE_SECONDS,
+    PAYLOAD_DEFAULTS,
+    JobQueue,
+    asset_records,
+    image_job_pool,
+    import_job_file,
+)
+from media_api.job_logs import JobLog, job_log_path  # noqa: E402
+
 INCOMING = BASE / "incoming-images"
 ASSETS = BASE / "assets"
 LOGS_PROCESSED = BASE / "logs" / "comfy-jobs" / "processed"
 LOGS_FAILED = BASE / "logs" / "comfy-jobs" / "failed"
+LOGS_IMPORTED = BASE / "logs" / "comfy-jobs" / "imported"
 
 SIMPLE_RUNNER = BASE / "linux/HexForgeEngine/scripts/simple_comfy_runner.py"
 OPTIMIZER_RUNNER = BASE / "linux/HexForgeEngine/scripts/loop_prompt_generator.py"
 
+# ================================================================
+# Worker pools
+# ================================================================
+# Render-bound jobs share the GPU behind ComfyUI, so they get a small pool;
+# CPU-bound jobs can run alongside them.
+POOL_LIMITS = {
+    "render": int(os.getenv("HEXFORGE_RENDER_WORKERS", "1")),
+    "cpu": int(os.getenv("HEXFORGE_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))),
+}
+
+# Idle workers re-check the queue this often (API submissions don't
+# produce filesystem events)
+QUEUE_POLL_SECONDS = float(os.getenv("HEXFORGE_QUEUE_POLL", "2"))
+
+# How often expired leases (dead workers) are swept back into the queue,
+# and leftover drop files (missed events) are re-imported
+REAPER_INTERVAL_SECONDS = 60
+
+# A drop file that doesn't parse yet is assumed to be mid-write until it's
+# this old. The API's own drops (media_jobs.write_job_file, used when the
+# queue DB is unavailable) appear atomically; this covers files copied in
+# by hand or by external scripts.
+DROP_SETTLE_SECONDS = float(os.getenv("HEXFORGE_DROP_SETTLE", "10"))
+
+# ================================================================
+# Supervision
+# ================================================================
+# Hard wall-clock budget per job, by engine (a payload may set "budget_s")
+JOB_BUDGETS = {
+    "simple": float(os.getenv("HEXFORGE_SIMPLE_BUDGET", "900")),
+    "optimizer": float(os.getenv("HEXFORGE_OPTIMIZER_BUDGET", "10800")),
+}
+
+# The optimizer is told to stop this much earlier so it can still write
+# its summary and assets before the hard kill
+OPTIMIZER_GRACE_SECONDS = 120
+
+# A job with no output for this long is considered hung. Runners print
+# [heartbeat] lines while waiting on ComfyUI, so silence means stuck.
+HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_HEARTBEAT_TIMEOUT", "600"))
+
+# Files (under assets/<project>/<part>/images) each engine produces; they
+# are hashed into the job result so identical resubmissions can reuse them
+ENGINE_OUTPUTS = {
+    "simple": ["simple.png"],
+    "optimizer": ["best_prompt_result.png", "preview.png", "grid.png", "image_manifest.json"],
+}
+
+# How jobs run: "inprocess" = runner functions in children of a pre-warmed
+# forkserver; "subprocess" = a fresh `python3 <runner>` per job (isolation
+# fallback). A job file may override with "exec".
+JOB_EXEC = os.getenv("HEXFORGE_JOB_EXEC", "inprocess")
+
 print(f"[watcher] Using SIMPLE_RUNNER = {SIMPLE_RUNNER}")
 print(f"[watcher] Using OPTIMIZER_RUNNER = {OPTIMIZER_RUNNER}")
 print(f"[watcher] Script file = {__file__}")
@@ -31,103 +106,435 @@ def ensure_dirs():
     ASSETS.mkdir(parents=True, exist_ok=True)
     LOGS_PROCESSED.mkdir(parents=True, exist_ok=True)
     LOGS_FAILED.mkdir(parents=True, exist_ok=True)
+    LOGS_IMPORTED.mkdir(parents=True, exist_ok=True)
 
 
 # ================================================================
-# Move job to processed/failed
+# JSON-drop import + finished-job records
 # ================================================================
-def move_to_processed(job_path: Path):
-    LOGS_PROCESSED.mkdir(parents=True, exist_ok=True)
-    shutil.move(str(job_path), LOGS_PROCESSED / job_path.name)
+def is_drop_file(path: Path) -> bool:
+    """
+    Job drop files are *.json; hidden names (e.g. write_job_file's
+    ".job-*.json.tmp" staging files) are still being written.
+    """
+    return path.suffix == ".json" and not path.name.startswith(".")
+
+
+def import_drop_file(queue: JobQueue, job_path: Path):
+    """
+    Import a job-*.json drop file into the queue and move it out of
+    INCOMING. Invalid files go to LOGS_FAILED, except files that don't
+    parse yet and are younger than DROP_SETTLE_SECONDS: those are left for
+    the writer's next event (or the periodic sweep).
+    """
+    try:
+        job = import_job_file(queue, job_path, kind="image", pool=job_pool_for_file(job_path))
+    except FileNotFoundError:
+        # Already imported via an earlier event for the same file
+        return None
+    except json.JSONDecodeError as e:
+        try:
+            age = time.time() - job_path.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        if age < DROP_SETTLE_SECONDS:
+            print(f"[watcher] {job_path} is incomplete ({e}); waiting for the writer")
+            return None
+        print(f"[watcher] Could not import {job_path}: {e}")
+        move_file(job_path, LOGS_FAILED)
+        return None
+    except Exception as e:
+        print(f"[watcher] Could not import {job_path}: {e}")
+        move_file(job_path, LOGS_FAILED)
+        return None
+    move_file(job_path, LOGS_IMPORTED)
+    print(f"[watcher] Imported {job_path} as job #{job['id']} on '{job['pool']}' pool")
+    return job
+
+
+def move_file(job_path: Path, dest_dir: Path):
+    """
+    Move a drop file out of INCOMING, flattening <project>/<part>/ into the
+    name so job-<ts>.json files from different parts don't collide.
+    """
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        name = "__".join(job_path.relative_to(INCOMING).parts)
+    except ValueError:
+        name = job_path.name
+    shutil.move(str(job_path), dest_dir / name)
 
-def move_to_failed(job_path: Path):
-    LOGS_FAILED.mkdir(parents=True, exist_ok=True)
-    shutil.move(str(job_path), LOGS_FAILED / job_path.name)
+
+def write_job_record(job: Dict, dest_dir: Path):
+    """
+    Keep a job-<id>.json copy of finished jobs in processed/ or failed/
+    for eyeballing and retry tooling. Never raises.
+    """
+    try:
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        record = dict(job["payload"])
+        record["queue_job_id"] = job["id"]
+        (dest_dir / f"job-{job['id']}.json").write_text(
+            json.dumps(record, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+    except Exception as e:
+        print(f"[watcher] Failed to write job record for #{job['id']}: {e}")
 
 
 # ================================================================
 # Run a job with either runner
 # ================================================================
-def run_comfy_job(runner_path: Path, project: str, part: str, prompt: str, num_images: int) -> bool:
-    cmd = [
-        "python3",
-        str(runner_path),
-        "--project", project,
-        "--part", part,
-        "--prompt", prompt,
-        "--num-images", str(num_images),
-    ]
+_inprocess_executor = None
+
+
+def get_inprocess_executor() -> InProcessExecutor:
+    global _inprocess_executor
+    if _inprocess_executor is None:
+        _inprocess_executor = InProcessExecutor()
+    return _inprocess_executor
+
+
+def line_sink(job_id: int, job_log: JobLog, supervisor: JobSupervisor) -> Callable[[str], None]:
+    """
+    Per-line callback for runner output: count it as a heartbeat, append to
+    the job log (which keeps the latest lines for progress checks) and echo
+    to the watcher's stdout.
+    """
+    def sink(line: str):
+        line = line.rstrip("\n")
+        supervisor.beat()
+        job_log.write(line)
+        print(f"[job #{job_id}] {line}", flush=True)
+
+    return sink
+
+
+def write_last_run_log(project: str, part: str, job_log: JobLog):
+    """
+    Replace the asset directory's comfy-last-run.log with the tail of the
+    latest run (the full output stays in the rotated per-job log).
+    """
+    asset_dir = ASSETS / project / part / "images"
+    asset_dir.mkdir(parents=True, exist_ok=True)
+    with open(asset_dir / "comfy-last-run.log", "w", encoding="utf-8") as f:
+        f.write(f"[full log: {job_log.path}]\n")
+        f.write("\n".join(job_log.tail()) + "\n")
+
+
+def run_comfy_job_inprocess(
+    sink: Callable[[str], None],
+    supervisor: JobSupervisor,
+    engine: str,
+    project: str,
+    part: str,
+    prompt: str,
+    num_images: int,
+    time_budget: float = 0,
+) -> bool:
+    print(f"[comfy] Running in-process: engine={engine} project={project} part={part}")
+
+    code = get_inprocess_executor().run(
+        engine, project, part, prompt, num_images, sink, supervisor, time_budget
+    )
+    return code == 0
+
+
+def run_comfy_job(
+    sink: Callable[[str], None],
+    supervisor: JobSupervisor,
+    runner_path: Path,
+    project: str,
+    part: str,
+    prompt: str,
+    num_images: int,
+    time_budget: float = 0,
+) -> bool:
+    if runner_path == OPTIMIZER_RUNNER:
+        cmd = ["python3", str(runner_path)]
+        cmd += optimizer_argv(project, part, prompt, num_images, time_budget)
+    else:
+        cmd = [
+            "python3",
+            str(runner_path),
+            "--project", project,
+            "--part", part,
+            "--prompt", prompt,
+            "--num-images", str(num_images),
+        ]
 
     print(f"[comfy] Running: {' '.join(cmd)}")
 
-    proc = subprocess.run(
+    # Stream line by line; unbuffered so output arrives as it's printed.
+    # Own session so the supervisor can kill the runner and its children.
+    with subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         text=True,
-    )
+        errors="replace",
+        bufsize=1,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        start_new_session=True,
+    ) as proc:
+        supervisor.attach(proc.pid)
+        try:
+            for line in proc.stdout:
+                sink(line)
+        except BaseException:
+            kill_process_group(proc.pid)
+            raise
 
-    log_text = f"[JOB META] project={project} part={part} prompt={prompt!r} num_images={num_images}\n\n"
-    log_text += proc.stdout or ""
+    return proc.returncode == 0
 
-    print(log_text)
 
-    # Write a last-run log into the asset directory
-    asset_dir = ASSETS / project / part / "images"
-    asset_dir.mkdir(parents=True, exist_ok=True)
-    with open(asset_dir / "comfy-last-run.log", "a", encoding="utf-8") as f:
-        f.write("\n\n=== NEW RUN ===\n")
-        f.write(log_text)
+# ================================================================
+# Handle a claimed job (SYNC — run from a worker thread)
+# ================================================================
+def job_budget(job: Dict) -> float:
+    payload = job["payload"]
+    engine = payload.get("engine", "simple")
+    return float(payload.get("budget_s") or JOB_BUDGETS.get(engine, JOB_BUDGETS["simple"]))
 
-    return proc.returncode == 0
+
+def handle_job(job: Dict, job_log: JobLog, supervisor: JobSupervisor) -> bool:
+    payload = job["payload"]
+    print(f"[watcher] Running job #{job['id']} (attempt {job['attempts']}/{job['max_attempts']})")
+
+    project = payload["project"]
+    part = payload["part"]
+    prompt = payload["prompt"]
+    num_images = int(payload.get("num_images", PAYLOAD_DEFAULTS["num_images"]))
+    engine = payload.get("engine", "simple")
+
+    exec_mode = payload.get("exec", JOB_EXEC)
+
+    # Soft budget for the optimizer so it finishes cleanly before the kill
+    time_budget = max(0.0, supervisor.budget_s - OPTIMIZER_GRACE_SECONDS) if engine == "optimizer" else 0
+
+    sink = line_sink(job["id"], job_log, supervisor)
+    sink(f"=== attempt {job['attempts']}/{job['max_attempts']} ===")
+    sink(f"[JOB META] project={project} part={part} engine={engine} exec={exec_mode} prompt={prompt!r} num_images={num_images}")
+
+    try:
+        if exec_mode == "subprocess":
+            # Choose runner
+            runner = OPTIMIZER_RUNNER if engine == "optimizer" else SIMPLE_RUNNER
+            return run_comfy_job(
+                sink, supervisor, runner, project, part, prompt, num_images, time_budget
+            )
+        return run_comfy_job_inprocess(
+            sink, supervisor, engine, project, part, prompt, num_images, time_budget
+        )
+    finally:
+        write_last_run_log(project, part, job_log)
+
+
+def job_result(job: Dict) -> Dict:
+    """
+    Result stored with a finished job: the engine outputs this run wrote
+    (skipping stale files left by earlier runs), with content hashes.
+    """
+    payload = job["payload"]
+    engine = payload.get("engine", "simple")
+    images_dir = ASSETS / payload["project"] / payload["part"] / "images"
+    started = job.get("started_at") or 0
+
+    produced = []
+    for name in ENGINE_OUTPUTS.get(engine, []):
+        path = images_dir / name
+        if path.exists() and path.stat().st_mtime >= started:
+            produced.append(path)
+    return {"assets_dir": str(images_dir), "assets": asset_records(produced)}
 
 
 # ================================================================
-# Handle job file (SYNC — no await)
+# Bounded async worker pool
 # ================================================================
-def handle_job(job_path: Path):
-    print(f"[watcher] Detected job: {job_path}")
+def job_pool_for_file(job_path: Path) -> str:
+    """
+    Pick the worker pool for a drop file's payload; unknown pools fall back
+    to render.
+    """
+    with job_path.open("r", encoding="utf-8") as f:
+        pool = image_job_pool(json.load(f))
+    return pool if pool in POOL_LIMITS else "render"
 
-    with job_path.open("r") as f:
-        job = json.load(f)
 
-    project = job["project"]
-    part = job["part"]
-    prompt = job["prompt"]
-    num_images = int(job.get("num_images", 1))
-    engine = job.get("engine", "simple")
+async def keep_lease(queue: JobQueue, job_id: int, worker_id: str, supervisor: JobSupervisor):
+    """
+    Renew the job's lease while it runs so the reaper leaves it alone, and
+    record the job's last heartbeat alongside it.
+    """
+    while True:
+        await asyncio.sleep(DEFAULT_LEASE_SECONDS / 3)
+        await asyncio.to_thread(
+            queue.renew_lease,
+            job_id,
+            worker_id,
+            heartbeat_at=supervisor.last_beat_wall,
+        )
 
-    # Choose runner
-    runner = OPTIMIZER_RUNNER if engine == "optimizer" else SIMPLE_RUNNER
 
-    print(f"[JOB META] project={project} part={part} engine={engine} prompt={prompt!r} num_images={num_images}")
+async def worker(pool: str, n: int, queue: JobQueue, wakeup: asyncio.Event):
+    """
+    Claim jobs for `pool` from the queue and run them in a thread so the
+    event loop (and the other workers) keep going while the runner works.
+    """
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{pool}#{n}"
+    while True:
+        job = await asyncio.to_thread(queue.claim, "image", worker_id, pool)
+        if job is None:
+            try:
+                await asyncio.wait_for(wakeup.wait(), QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
 
-    ok = run_comfy_job(runner, project, part, prompt, num_images)
+        print(
+            f"[watcher] {pool}#{n} claimed job #{job['id']} "
+            f"(project={job['project']} priority={job['priority']} waited {job['wait_s']}s)"
+        )
+        engine = job["payload"].get("engine", "simple")
+        await asyncio.to_thread(
+            metrics.observe, "hexforge_queue_wait_seconds", job["wait_s"], kind="image", engine=engine
+        )
+        job_log = JobLog(job_log_path(job["id"]))
+        await asyncio.to_thread(queue.set_log_path, job["id"], str(job_log.path))
+        supervisor = JobSupervisor(
+            f"job #{job['id']}", job_budget(job), HEARTBEAT_TIMEOUT_SECONDS
+        ).start()
+        lease_task = asyncio.create_task(keep_lease(queue, job["id"], worker_id, supervisor))
+        ok, error = False, "runner exited non-zero"
+        try:
+            ok = await asyncio.to_thread(handle_job, job, job_log, supervisor)
+        except Exception as e:
+            error = f"watcher crashed running job: {e}"
+            print(f"[watcher] {pool}#{n} job #{job['id']} crashed: {e}")
+        finally:
+            supervisor.stop()
+            lease_task.cancel()
+            job_log.close()
+        if supervisor.killed_reason:
+            # Killed jobs go back on the queue (with backoff) while attempts remain
+            ok, error = False, f"killed by supervisor: {supervisor.killed_reason}"
 
-    if ok:
-        print(f"[watcher] Job {job_path.name} -> OK")
-        move_to_processed(job_path)
-    else:
-        print(f"[watcher] Job {job_path.name} -> FAILED")
-        move_to_failed(job_path)
+        if ok:
+            result = await asyncio.to_thread(job_result, job)
+            owned = await asyncio.to_thread(queue.complete, job["id"], worker_id, result)
+            status = "done" if owned else "lost"
+        else:
+            status = await asyncio.to_thread(queue.fail, job["id"], worker_id, error)
+        if status == "lost":
+            # Our lease expired mid-run; the job was requeued and may already
+            # belong to another worker, so its outcome isn't ours to record
+            print(f"[watcher] {pool}#{n} lost the lease on job #{job['id']}; result dropped")
+            continue
+
+        finished = await asyncio.to_thread(queue.get, job["id"])
+        if status in ("done", "failed"):
+            write_job_record(finished, LOGS_PROCESSED if status == "done" else LOGS_FAILED)
+        print(
+            f"[watcher] {pool}#{n} finished job #{job['id']} -> {status} "
+            f"(wait={finished['wait_s']}s run={finished['run_s']}s)"
+        )
+        labels = {"kind": "image", "engine": engine, "status": status}
+        await asyncio.to_thread(metrics.observe, "hexforge_job_run_seconds", finished["run_s"] or 0.0, **labels)
+        await asyncio.to_thread(metrics.inc, "hexforge_jobs_total", **labels)
+
+
+async def reaper(queue: JobQueue):
+    """
+    Periodically put jobs whose worker stopped renewing its lease back on
+    the queue.
+    """
+    while True:
+        ids = await asyncio.to_thread(queue.requeue_expired)
+        if ids:
+            print(f"[watcher] Requeued jobs with expired leases: {ids}")
+        await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+
+
+async def import_drops(queue: JobQueue, paths: Iterable[Path], in_flight: Set[Path]) -> int:
+    """
+    Import drop files off the event loop. `in_flight` holds paths being
+    imported right now, so a file reported twice (added + modified, or by
+    both the watcher and the sweep) is only imported once. Returns the
+    number of jobs imported.
+    """
+    imported = 0
+    for path in paths:
+        if path in in_flight or not is_drop_file(path):
+            continue
+        in_flight.add(path)
+        try:
+            if path.exists() and await asyncio.to_thread(import_drop_file, queue, path):
+                imported += 1
+        finally:
+            in_flight.discard(path)
+    return imported
+
+
+async def sweep_incoming(queue: JobQueue, in_flight: Set[Path], wakeup: asyncio.Event):
+    """
+    Periodically import drop files no event picked up, e.g. ones that were
+    still incomplete when their last event fired.
+    """
+    while True:
+        await asyncio.sleep(REAPER_INTERVAL_SECONDS)
+        if await import_drops(queue, sorted(INCOMING.rglob("*.json")), in_flight):
+            wakeup.set()
+            wakeup.clear()
 
 
 # ================================================================
-# Async file-watching loop (does NOT await handle_job)
+# Async file-watching loop (only imports; workers claim from the queue)
 # ================================================================
 async def watch_loop():
     ensure_dirs()
+    queue = JobQueue()
+    print(f"[watcher] Queue DB = {queue.db_path}")
     print(f"[watcher] Watching {INCOMING} (recursive=True)")
+    print(f"[watcher] Pool limits: {POOL_LIMITS}")
+    print(f"[watcher] Job exec mode: {JOB_EXEC}")
+
+    if JOB_EXEC != "subprocess":
+        # Start the forkserver and import the runners once, up front
+        get_inprocess_executor().warm_up()
+
+    wakeup = asyncio.Event()
+    in_flight: Set[Path] = set()
+    tasks = [
+        asyncio.create_task(reaper(queue)),
+        asyncio.create_task(sweep_incoming(queue, in_flight, wakeup)),
+    ]
+    tasks += [
+        asyncio.create_task(worker(pool, n, queue, wakeup))
+        for pool, limit in POOL_LIMITS.items()
+        for n in range(1, max(1, limit) + 1)
+    ]
 
-    # Process existing jobs first
-    for job in INCOMING.rglob("job-*.json"):
-        handle_job(job)
+    # Import drop files left over from before startup
+    await import_drops(queue, sorted(INCOMING.rglob("*.json")), in_flight)
+    wakeup.set()
+    wakeup.clear()
 
-    # Watch for new jobs
-    async for changes in awatch(INCOMING, recursive=True):
-        for change, path_str in changes:
-            if path_str.endswith(".json") and change in (Change.added, Change.modified):
-                handle_job(Path(path_str))
+    # Watch for new drop files. One batch can report the same file several
+    # times (added, then modified per flush); collapse to one import each.
+    try:
+        async for changes in awatch(INCOMING, recursive=True):
+            paths = sorted(
+                {
+                    Path(path_str)
+                    for change, path_str in changes
+                    if change in (Change.added, Change.modified)
+                }
+            )
+            if await import_drops(queue, paths, in_flight):
+                wakeup.set()
+                wakeup.clear()
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 # ================================================================
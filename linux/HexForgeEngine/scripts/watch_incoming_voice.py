@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+watch_incoming_voice.py
+
+Voice (TTS) worker: the counterpart of watch_incoming_images.py for
+kind='voice' jobs.
+
+Claims queued voice jobs (from /media/queue/voice or job-*.json drops under
+incoming-voice/<project>/<part>/), groups up to VOICE_BATCH_SIZE of them
+into one synthesis run and writes assets/<project>/<part>/audio/voice-<job id>.wav. Each job's
+result records the WAV (with its hash) and timings: batch size, model load
+time and its own synthesis time; wait_s/run_s come from the queue.
+
+Batches go to the resident tts_worker.py when it is running (model already
+loaded); otherwise to a tts_batch.py run in the SadTalker venv (one model
+load per batch).
+"""
+
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+# ================================================================
+# Paths
+# ================================================================
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+
+# The job queue lives in the media_api package at the repo root
+sys.path.insert(0, str(BASE))
+from media_api import metrics, tts_client  # noqa: E402
+from media_api.job_logs import JobLog, job_log_path  # noqa: E402
+from media_api.job_queue import (  # noqa: E402
+    DEFAULT_LEASE_SECONDS,
+    JobQueue,
+    asset_records,
+    import_job_file,
+)
+
+INCOMING = BASE / "incoming-voice"
+ASSETS = BASE / "assets"
+LOGS_BASE = BASE / "logs" / "voice-jobs"
+LOGS_IMPORTED = LOGS_BASE / "imported"
+LOGS_FAILED = LOGS_BASE / "failed"
+LOGS_RUNS = LOGS_BASE / "runs"
+
+SADTALKER_ROOT = Path(os.getenv("HEXFORGE_SADTALKER_ROOT", "/root/ai-tools/SadTalker"))
+SADTALKER_PYTHON = SADTALKER_ROOT / "venv" / "bin" / "python"
+TTS_BATCH_SCRIPT = Path(__file__).resolve().parent / "tts_batch.py"
+
+# ================================================================
+# Batching
+# ================================================================
+# Most texts synthesized per model load
+VOICE_BATCH_SIZE = int(os.getenv("HEXFORGE_VOICE_BATCH", "8"))
+
+# After the first claim, keep collecting jobs for this long before running
+VOICE_BATCH_WAIT_SECONDS = float(os.getenv("HEXFORGE_VOICE_BATCH_WAIT", "2"))
+
+# Idle poll interval (also how often incoming-voice/ is swept for drops)
+QUEUE_POLL_SECONDS = float(os.getenv("HEXFORGE_QUEUE_POLL", "2"))
+
+# How often expired leases (dead workers) are swept back into the queue
+REAPER_INTERVAL_SECONDS = 60
+
+# Drop files that don't parse yet get this long to finish being written
+DROP_SETTLE_SECONDS = float(os.getenv("HEXFORGE_DROP_SETTLE", "10"))
+
+# Whole-batch wall-clock limit for tts_batch.py
+BATCH_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_VOICE_BATCH_TIMEOUT", "1800"))
+
+
+def ensure_dirs():
+    for d in (INCOMING, ASSETS, LOGS_IMPORTED, LOGS_FAILED, LOGS_RUNS):
+        d.mkdir(parents=True, exist_ok=True)
+
+
+# ================================================================
+# JSON-drop import
+# ================================================================
+def move_file(job_path: Path, dest_dir: Path):
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        name = "__".join(job_path.relative_to(INCOMING).parts)
+    except ValueError:
+        name = job_path.name
+    shutil.move(str(job_path), dest_dir / name)
+
+
+def import_drops(queue: JobQueue) -> int:
+    """
+    Import job-*.json drops from INCOMING (hidden/.tmp staging files are
+    skipped; unparseable files get DROP_SETTLE_SECONDS before failing).
+    """
+    imported = 0
+    for job_path in sorted(INCOMING.rglob("*.json")):
+        if job_path.name.startswith("."):
+            continue
+        try:
+            job = import_job_file(queue, job_path, kind="voice", pool="cpu")
+        except FileNotFoundError:
+            continue
+        except json.JSONDecodeError as e:
+            try:
+                age = time.time() - job_path.stat().st_mtime
+            except FileNotFoundError:
+                # The producer removed or renamed it meanwhile
+                continue
+            if age < DROP_SETTLE_SECONDS:
+                continue
+            print(f"[voice] Could not import {job_path}: {e}")
+            move_file(job_path, LOGS_FAILED)
+            continue
+        except Exception as e:
+            print(f"[voice] Could not import {job_path}: {e}")
+            move_file(job_path, LOGS_FAILED)
+            continue
+        move_file(job_path, LOGS_IMPORTED)
+        print(f"[voice] Imported {job_path} as job #{job['id']}")
+        imported += 1
+    return imported
+
+
+# ================================================================
+# Claiming a batch
+# ================================================================
+def claim_batch(queue: JobQueue, worker_id: str) -> List[Dict]:
+    """
+    Claim up to VOICE_BATCH_SIZE voice jobs. Returns [] when idle; after
+    the first job, waits up to VOICE_BATCH_WAIT_SECONDS for more.
+    """
+    first = queue.claim("voice", worker_id)
+    if first is None:
+        return []
+    batch = [first]
+    deadline = time.time() + VOICE_BATCH_WAIT_SECONDS
+    while len(batch) < VOICE_BATCH_SIZE:
+        job = queue.claim("voice", worker_id)
+        if job is not None:
+            batch.append(job)
+            continue
+        if time.time() >= deadline:
+            break
+        time.sleep(0.25)
+    return batch
+
+
+def keep_leases(queue: JobQueue, job_ids: List[int], worker_id: str, stop: threading.Event):
+    """
+    Renew every lease in the batch until `stop` is set.
+    """
+    while not stop.wait(DEFAULT_LEASE_SECONDS / 3):
+        for job_id in job_ids:
+            queue.renew_lease(job_id, worker_id)
+
+
+# ================================================================
+# Running a batch
+# ================================================================
+def voice_output_path(job: Dict) -> Path:
+    payload = job["payload"]
+    return ASSETS / payload["project"] / payload["part"] / "audio" / f"voice-{job['id']}.wav"
+
+
+def run_worker_batch(items: List[Dict], sink: Callable[[str], None]) -> Dict:
+    """
+    Send the batch to the resident TTS worker. Raises
+    tts_client.TTSWorkerUnavailable if it isn't running.
+    """
+    sink(f"[voice] Sending {len(items)} item(s) to TTS worker at {tts_client.SOCKET_PATH}")
+    results = tts_client.synthesize_batch(items)
+    for r in results:
+        sink(f"[voice] item {r['id']}: ok={r['ok']} engine={r['engine']} ({r['seconds']}s)")
+    return {"engine": "worker", "model_load_s": 0.0, "items": results}
+
+
+def run_tts_batch(items: List[Dict], sink: Callable[[str], None]) -> Dict:
+    """
+    Run tts_batch.py on `items` in the SadTalker venv, streaming its output
+    to `sink`. Returns its results JSON ({} if it produced none).
+    """
+    with tempfile.TemporaryDirectory(prefix="hexforge-tts-") as tmp:
+        manifest = Path(tmp) / "manifest.json"
+        results = Path(tmp) / "results.json"
+        manifest.write_text(json.dumps(items, ensure_ascii=False), encoding="utf-8")
+
+        python = str(SADTALKER_PYTHON) if SADTALKER_PYTHON.exists() else "python3"
+        cmd = [python, str(TTS_BATCH_SCRIPT), "--manifest", str(manifest), "--results", str(results)]
+        sink(f"[voice] Running: {' '.join(cmd)}")
+
+        with subprocess.Popen(
+            cmd,
+            cwd=str(SADTALKER_ROOT) if SADTALKER_ROOT.exists() else None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+            bufsize=1,
+            env={**os.environ, "PYTHONUNBUFFERED": "1"},
+        ) as proc:
+            timer = threading.Timer(BATCH_TIMEOUT_SECONDS, proc.kill)
+            timer.start()
+            try:
+                for line in proc.stdout:
+                    sink(line)
+            finally:
+                timer.cancel()
+
+        if not results.exists():
+            sink(f"[voice] tts_batch.py exited {proc.returncode} without results")
+            return {}
+        return json.loads(results.read_text(encoding="utf-8"))
+
+
+def batch_item(job: Dict) -> Dict:
+    """
+    The tts_batch/worker item for a job. Raises ValueError for a payload
+    it can't synthesize.
+    """
+    text = job["payload"].get("text")
+    if not text:
+        raise ValueError("payload is missing 'text'")
+    return {
+        "id": job["id"],
+        "text": text,
+        "voice": job["payload"].get("voice", "default"),
+        "out": str(voice_output_path(job)),
+    }
+
+
+def handle_batch(queue: JobQueue, batch: List[Dict], worker_id: str):
+    # Jobs whose payload can't be synthesized fail on their own (no retry:
+    # they would fail the same way) instead of taking the batch down
+    items = []
+    runnable = []
+    for job in batch:
+        try:
+            items.append(batch_item(job))
+        except (KeyError, ValueError) as e:
+            status = queue.fail(job["id"], worker_id, str(e), retry=False)
+            print(f"[voice] job #{job['id']} -> {status}: {e}")
+            continue
+        runnable.append(job)
+    batch = runnable
+    if not batch:
+        return
+
+    ids = [job["id"] for job in batch]
+    print(f"[voice] Running batch of {len(batch)}: jobs {ids}")
+    for job in batch:
+        metrics.observe("hexforge_queue_wait_seconds", job["wait_s"], kind="voice", engine="tts")
+
+    logs = [JobLog(job_log_path(job["id"], LOGS_RUNS)) for job in batch]
+    for job, job_log in zip(batch, logs):
+        queue.set_log_path(job["id"], str(job_log.path))
+
+    def sink(line: str):
+        line = line.rstrip("\n")
+        for job_log in logs:
+            job_log.write(line)
+        print(line, flush=True)
+
+    stop = threading.Event()
+    lease_thread = threading.Thread(
+        target=keep_leases, args=(queue, ids, worker_id, stop), daemon=True
+    )
+    lease_thread.start()
+    started = time.time()
+    try:
+        try:
+            results = run_worker_batch(items, sink)
+        except tts_client.TTSWorkerUnavailable as e:
+            sink(f"[voice] {e}; loading the model for this batch")
+            results = run_tts_batch(items, sink)
+    except Exception as e:
+        sink(f"[voice] Batch crashed: {e}")
+        results = {}
+    finally:
+        stop.set()
+        for job_log in logs:
+            job_log.close()
+    batch_s = round(time.time() - started, 3)
+
+    by_id = {r["id"]: r for r in results.get("items", [])}
+    for job in batch:
+        item = by_id.get(job["id"])
+        out_path = voice_output_path(job)
+        if item and item["ok"] and out_path.exists():
+            owned = queue.complete(
+                job["id"],
+                worker_id,
+                {
+                    "assets_dir": str(out_path.parent),
+                    "assets": asset_records([out_path]),
+                    "timings": {
+                        "batch_size": len(batch),
+                        "batch_s": batch_s,
+                        "model_load_s": results.get("model_load_s"),
+                        "synth_s": item["seconds"],
+                    },
+                    "engine": item.get("engine"),
+                },
+            )
+            status = "done" if owned else "lost"
+        else:
+            error = (item or {}).get("error") or "no audio produced by tts_batch.py"
+            status = queue.fail(job["id"], worker_id, error)
+        print(f"[voice] job #{job['id']} -> {status}")
+        if status == "lost":
+            # Lease expired mid-batch; the job was requeued and isn't ours anymore
+            continue
+        labels = {"kind": "voice", "engine": (item or {}).get("engine") or "tts", "status": status}
+        # The job's own synthesis time, not the whole batch's wall time
+        run_s = (item or {}).get("seconds")
+        metrics.observe("hexforge_job_run_seconds", run_s if run_s is not None else batch_s / len(batch), **labels)
+        metrics.inc("hexforge_jobs_total", **labels)
+
+
+# ================================================================
+# Main loop
+# ================================================================
+def main():
+    ensure_dirs()
+    queue = JobQueue()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:voice"
+    print(f"[voice] Queue DB = {queue.db_path}")
+    print(f"[voice] Watching {INCOMING}; batch size {VOICE_BATCH_SIZE}")
+    print(f"[voice] TTS python = {SADTALKER_PYTHON}")
+
+    last_reap = 0.0
+    while True:
+        import_drops(queue)
+        if time.time() - last_reap >= REAPER_INTERVAL_SECONDS:
+            ids = queue.requeue_expired()
+            if ids:
+                print(f"[voice] Requeued jobs with expired leases: {ids}")
+            last_reap = time.time()
+
+        batch = claim_batch(queue, worker_id)
+        if not batch:
+            time.sleep(QUEUE_POLL_SECONDS)
+            continue
+        handle_batch(queue, batch, worker_id)
+
+
+if __name__ == "__main__":
+    main()
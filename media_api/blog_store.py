@@ -0,0 +1,168 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/blog_store.py
+"""
+Append-only per-project store for blog parts posted to /blog-json.
+
+Each project gets two files under incoming-blogs/<project>/:
+  parts.jsonl  one compact JSON record per line, never rewritten
+  index.jsonl  one line per record: {"offset", "length", "part", "sha256", "received_at"}
+
+A batch of records is written in one pass. The records go in with a single
+append to parts.jsonl, then their index lines with a single append to
+index.jsonl, all under an exclusive flock so concurrent writers don't
+interleave. The index always trails the data, so an entry in it always
+points at a complete record. The record's offset in parts.jsonl doubles as
+its id.
+
+Readers load the small index and seek straight to the records they need
+instead of scanning directories of per-request files:
+  python -m media_api.blog_store list <project>
+  python -m media_api.blog_store get <project> <part> [--text]
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+STORE_ROOT = BASE / "incoming-blogs"
+
+PARTS_FILE = "parts.jsonl"
+INDEX_FILE = "index.jsonl"
+LOCK_FILE = ".lock"
+
+
+class BlogStore:
+    def __init__(self, root: Path = STORE_ROOT):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def project_dir(self, project: str) -> Path:
+        """
+        incoming-blogs/<project>. Raises ValueError for names that aren't a
+        single path component ("a/b" is rejected, not read as "b").
+        """
+        if not project or project in (".", "..") or any(c in project for c in "/\\\0"):
+            raise ValueError(f"Invalid project name: {project!r}")
+        return self.root / project
+
+    @contextmanager
+    def _locked(self, project_dir: Path):
+        project_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock, (project_dir / LOCK_FILE).open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append_many(self, project: str, records: list[dict]) -> list[dict]:
+        """
+        Append records (each with at least "part" and "text") and return
+        their index entries, in order.
+        """
+        project_dir = self.project_dir(project)
+        received_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+        lines = []
+        for record in records:
+            record = {**record, "project": project, "received_at": received_at}
+            lines.append((json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+
+        with self._locked(project_dir):
+            with (project_dir / PARTS_FILE).open("ab") as parts:
+                offset = parts.seek(0, 2)
+                parts.write(b"".join(lines))
+                parts.flush()
+
+            entries = []
+            for record, line in zip(records, lines):
+                entries.append({
+                    "offset": offset,
+                    "length": len(line),
+                    "part": record.get("part"),
+                    "sha256": hashlib.sha256(line).hexdigest(),
+                    "received_at": received_at,
+                })
+                offset += len(line)
+            with (project_dir / INDEX_FILE).open("a", encoding="utf-8") as index:
+                index.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries))
+        return entries
+
+    def index(self, project: str) -> list[dict]:
+        path = self.project_dir(project) / INDEX_FILE
+        if not path.exists():
+            return []
+        entries = []
+        for line in path.read_text(encoding="utf-8").splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crashed writer; its record isn't indexed
+                continue
+        return entries
+
+    def latest(self, project: str) -> dict[str, dict]:
+        """
+        {part: index entry} for the newest record of each part.
+        """
+        return {e["part"]: e for e in self.index(project)}
+
+    def read(self, project: str, entry: dict) -> dict:
+        with (self.project_dir(project) / PARTS_FILE).open("rb") as parts:
+            parts.seek(entry["offset"])
+            return json.loads(parts.read(entry["length"]))
+
+    def get(self, project: str, part: str) -> dict | None:
+        entry = self.latest(project).get(part)
+        return None if entry is None else self.read(project, entry)
+
+    def projects(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / INDEX_FILE).exists())
+
+
+_store: BlogStore | None = None
+
+
+def get_store() -> BlogStore:
+    global _store
+    if _store is None:
+        _store = BlogStore()
+    return _store
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Read the HexForge blog-part store")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    list_cmd = sub.add_parser("list", help="Newest entry of each part (or projects, without one)")
+    list_cmd.add_argument("project", nargs="?")
+    get_cmd = sub.add_parser("get", help="Newest record of a part")
+    get_cmd.add_argument("project")
+    get_cmd.add_argument("part")
+    get_cmd.add_argument("--text", action="store_true", help="Print only the record's text")
+    args = parser.parse_args(argv)
+
+    store = get_store()
+    if args.cmd == "list":
+        out = store.latest(args.project) if args.project else store.projects()
+        print(json.dumps(out, indent=2, ensure_ascii=False))
+        return 0
+
+    record = store.get(args.project, args.part)
+    if record is None:
+        print(f"No part {args.part!r} in project {args.project!r}", file=sys.stderr)
+        return 1
+    print(record.get("text", "") if args.text else json.dumps(record, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/image_loop.py
+"""
+Background /image-loop runs and their progress stream.
+
+A run executes ComfyUI's run-generator.sh on the task pool with
+HEXFORGE_EVENTS_PATH pointing at logs/image-loop/<run_id>.events.jsonl.
+loop_prompt_generator.py appends a JSON line there for every scored
+variant, every round's best and the final summary. When the process exits,
+run_image_loop appends an "end" event itself, so readers always know when
+to stop. Output goes to <run_id>.log next to it.
+
+stream_events() turns that file into Server-Sent Events for
+GET /image-loop/runs/{run_id}/events.
+"""
+import asyncio
+import json
+import os
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+CONTENT_ROOT = Path("/mnt/hdd-storage/hexforge-content-engine")
+COMFY_ROOT = Path("/root/ai-tools/ComfyUI")
+LOOP_LOGS = CONTENT_ROOT / "logs" / "image-loop"
+
+# How often the SSE stream checks the events file for new lines
+EVENT_POLL_SECONDS = 1.0
+
+# Comment line sent on a quiet stream so proxies don't drop it
+KEEPALIVE_SECONDS = 15.0
+
+# A stream with no new event for this long ends (e.g. the API restarted
+# mid-run and nothing will write the "end" event)
+STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_SSE_IDLE_TIMEOUT", "1800"))
+
+
+def new_run_id(project: str, part: str) -> str:
+    return f"{project}_{part}_{uuid.uuid4().hex[:12]}".replace("/", "_")
+
+
+def events_path(run_id: str) -> Path:
+    return LOOP_LOGS / f"{run_id}.events.jsonl"
+
+
+def log_path(run_id: str) -> Path:
+    return LOOP_LOGS / f"{run_id}.log"
+
+
+def append_event(run_id: str, event: str, **fields) -> None:
+    line = json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str)
+    with events_path(run_id).open("a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def read_events(run_id: str) -> list[dict]:
+    path = events_path(run_id)
+    if not path.exists():
+        return []
+    events = []
+    for line in path.read_text(encoding="utf-8", errors="replace").splitlines():
+        try:
+            events.append(json.loads(line))
+        except ValueError:
+            continue
+    return events
+
+
+def prepare_run(run_id: str) -> None:
+    """
+    Create the run's events file up front so its stream can be opened
+    while the task is still queued.
+    """
+    LOOP_LOGS.mkdir(parents=True, exist_ok=True)
+    events_path(run_id).touch()
+    append_event(run_id, "queued")
+
+
+def run_image_loop(run_id: str, project: str, part: str, min_score: float) -> dict:
+    """
+    Run the optimizer and return {"assets_dir", "run_id", "summary", ...};
+    raises RuntimeError if it fails.
+    """
+    assets_dir = CONTENT_ROOT / "assets" / project / part
+    assets_dir.mkdir(parents=True, exist_ok=True)
+
+    env = dict(os.environ)
+    env["HEXFORGE_EVENTS_PATH"] = str(events_path(run_id))
+    cmd = (
+        f"cd {COMFY_ROOT} && "
+        f"source venv/bin/activate && "
+        f"./run-generator.sh "
+        f"--min_score {min_score} "
+        f"--final_variant_mode best_prompt"
+    )
+
+    start = time.time()
+    try:
+        with log_path(run_id).open("w", encoding="utf-8") as log:
+            proc = subprocess.run(
+                ["bash", "-lc", cmd],
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        returncode, error = proc.returncode, None
+    except OSError as e:
+        returncode, error = None, str(e)
+
+    summary = next((e for e in reversed(read_events(run_id)) if e.get("event") == "summary"), None)
+    ok = returncode == 0
+    append_event(
+        run_id,
+        "end",
+        status="done" if ok else "failed",
+        returncode=returncode,
+        seconds=round(time.time() - start, 2),
+        error=error,
+    )
+    if not ok:
+        raise RuntimeError(f"Image loop failed: {error or f'exit code {returncode}'} (see {log_path(run_id)})")
+
+    return {
+        "assets_dir": str(assets_dir),
+        "run_id": run_id,
+        "summary": summary,
+        "events_path": str(events_path(run_id)),
+        "log_path": str(log_path(run_id)),
+    }
+
+
+def sse(event: dict) -> str:
+    return f"event: {event.get('event', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def stream_events(run_id: str) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for a run: everything written so far, then new
+    events as they are appended, ending after the "end" event.
+    """
+    path = events_path(run_id)
+    offset, partial = 0, ""
+    last_event = last_send = time.time()
+
+    while True:
+        with path.open("r", encoding="utf-8", errors="replace") as f:
+            f.seek(offset)
+            chunk = f.read()
+            offset = f.tell()
+
+        lines = (partial + chunk).split("\n")
+        # A line without its newline yet is still being written
+        partial = lines.pop()
+        for line in lines:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            yield sse(event)
+            last_event = last_send = time.time()
+            if event.get("event") == "end":
+                return
+
+        now = time.time()
+        if now - last_event >= STREAM_IDLE_TIMEOUT_SECONDS:
+            yield sse({"event": "end", "status": "unknown", "error": "no events; giving up"})
+            return
+        if now - last_send >= KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_send = now
+        await asyncio.sleep(EVENT_POLL_SECONDS)
@@ -0,0 +1,120 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/job_logs.py
+"""
+Per-job runner logs with size-based rotation.
+
+The watcher streams each runner's output line by line into
+logs/comfy-jobs/runs/job-<id>.log (rotated to .1, .2, ... past
+MAX_LOG_BYTES) while keeping only the last TAIL_LINES lines in memory.
+read_tail() gives the API the same "latest lines" view from the file.
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import os
+import threading
+from collections import deque
+from pathlib import Path
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+JOB_LOGS_DIR = BASE / "logs" / "comfy-jobs" / "runs"
+
+MAX_LOG_BYTES = int(os.getenv("HEXFORGE_JOB_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("HEXFORGE_JOB_LOG_BACKUPS", "3"))
+TAIL_LINES = int(os.getenv("HEXFORGE_JOB_LOG_TAIL", "50"))
+
+
+def job_log_path(job_id: int, logs_dir: Path = JOB_LOGS_DIR) -> Path:
+    return logs_dir / f"job-{job_id}.log"
+
+
+class JobLog:
+    """
+    Append-only log for one job run. Thread-safe; write() may be called
+    from the thread reading the runner's output while tail() is called
+    from elsewhere.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = MAX_LOG_BYTES,
+        backups: int = LOG_BACKUPS,
+        tail_lines: int = TAIL_LINES,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = max(0, backups)
+        self.lines: deque = deque(maxlen=tail_lines)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self) -> None:
+        self._file.close()
+        if self.backups:
+            for i in range(self.backups - 1, 0, -1):
+                src = self.path.with_name(f"{self.path.name}.{i}")
+                if src.exists():
+                    os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, line: str) -> None:
+        line = line.rstrip("\n")
+        with self._lock:
+            self.lines.append(line)
+            if self._file.tell() >= self.max_bytes:
+                self._rotate()
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def tail(self, n: int | None = None) -> list[str]:
+        with self._lock:
+            lines = list(self.lines)
+        return lines if n is None else lines[-n:]
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "JobLog":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _file_tail(path: Path, n: int, block_size: int = 8192) -> list[str]:
+    """
+    Last n lines of a file, reading backwards in blocks so large logs
+    aren't loaded whole.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.decode("utf-8", errors="replace").splitlines()[-n:]
+
+
+def read_tail(path: Path, n: int = TAIL_LINES) -> list[str]:
+    """
+    Last n lines of a job log, reaching into the newest rotated file when
+    the live one was just rotated. Missing logs give [].
+    """
+    path = Path(path)
+    lines: list[str] = []
+    for candidate in (path, path.with_name(f"{path.name}.1")):
+        if len(lines) >= n:
+            break
+        try:
+            lines = _file_tail(candidate, n - len(lines)) + lines
+        except FileNotFoundError:
+            continue
+    return lines[-n:]
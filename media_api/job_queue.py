@@ -0,0 +1,579 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/job_queue.py
+"""
+Transactional media job queue backed by a local SQLite file.
+
+Replaces loose job-<timestamp>.json files as the source of truth:
+  - enqueue() inserts a job row (the API and the JSON-drop importer both use it)
+  - claim() atomically hands the next ready job to one worker under a lease,
+    ordered by priority, job cost (cheap `simple` renders before optimizer
+    runs) and per-project fair share
+  - complete()/fail() finish it; failures are retried with exponential backoff
+  - requeue_expired() recovers jobs whose worker died mid-lease
+  - identical submissions (same idempotency key) attach to the in-flight
+    job or reuse a completed job's assets instead of rendering again
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+DB_PATH = Path(os.getenv("HEXFORGE_QUEUE_DB", str(BASE / "state" / "jobs.sqlite3")))
+
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("HEXFORGE_QUEUE_MAX_ATTEMPTS", "3"))
+DEFAULT_LEASE_SECONDS = float(os.getenv("HEXFORGE_QUEUE_LEASE", "300"))
+BACKOFF_BASE_SECONDS = float(os.getenv("HEXFORGE_QUEUE_BACKOFF", "30"))
+BACKOFF_MAX_SECONDS = 3600.0
+
+# Fair share: projects that started fewer jobs within this window go first
+FAIR_SHARE_WINDOW_SECONDS = float(os.getenv("HEXFORGE_FAIR_SHARE_WINDOW", "3600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id               INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind             TEXT    NOT NULL,
+    pool             TEXT    NOT NULL DEFAULT 'render',
+    project          TEXT    NOT NULL,
+    part             TEXT    NOT NULL,
+    payload          TEXT    NOT NULL,
+    status           TEXT    NOT NULL DEFAULT 'queued',
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    max_attempts     INTEGER NOT NULL DEFAULT 3,
+    available_at     REAL    NOT NULL,
+    lease_owner      TEXT,
+    lease_expires_at REAL,
+    created_at       REAL    NOT NULL,
+    started_at       REAL,
+    finished_at      REAL,
+    updated_at       REAL    NOT NULL,
+    source           TEXT,
+    last_error       TEXT,
+    result           TEXT,
+    idem_key         TEXT,
+    priority         INTEGER NOT NULL DEFAULT 0,
+    cost             INTEGER NOT NULL DEFAULT 0,
+    log_path         TEXT,
+    heartbeat_at     REAL
+);
+"""
+
+# Columns added after the first release; older DB files get them via ALTER
+MIGRATED_COLUMNS = {
+    "idem_key": "TEXT",
+    "priority": "INTEGER NOT NULL DEFAULT 0",
+    "cost": "INTEGER NOT NULL DEFAULT 0",
+    "log_path": "TEXT",
+    "heartbeat_at": "REAL",
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_jobs_idem    ON jobs (idem_key, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready   ON jobs (status, kind, pool, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_project ON jobs (project, part, status);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease   ON jobs (status, lease_expires_at);
+"""
+
+STATUSES = ("queued", "running", "done", "failed")
+
+# Payload fields that make two jobs "the same request"
+IDEMPOTENCY_FIELDS = {
+    "image": ("project", "part", "prompt", "engine", "num_images", "workflow"),
+    "voice": ("project", "part", "text", "voice"),
+}
+# Payload fields a drop file must set to be imported
+REQUIRED_FIELDS = {
+    "image": ("project", "part"),
+    "voice": ("project", "part", "text"),
+}
+# Workers fill omitted fields from here too, so a drop file that leaves one
+# out renders the same thing as an API request that sets the default
+PAYLOAD_DEFAULTS = {
+    "engine": "simple",
+    "num_images": 4,
+    "workflow": "hexforge-default",
+    "voice": "default",
+}
+
+
+def idempotency_key(kind: str, payload: dict) -> str:
+    """
+    Content-derived key: sha256 over the kind and the fields in
+    IDEMPOTENCY_FIELDS (with defaults filled in so omitted == default).
+    """
+    fields = IDEMPOTENCY_FIELDS.get(kind, tuple(sorted(payload)))
+    material = {f: payload.get(f, PAYLOAD_DEFAULTS.get(f)) for f in fields}
+    blob = json.dumps([kind, material], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def asset_records(paths: list[Path]) -> list[dict]:
+    """
+    {"path", "sha256"} entries for a job result's "assets" list.
+    """
+    return [{"path": str(p), "sha256": file_sha256(p)} for p in paths]
+
+
+def assets_still_valid(result: dict | None) -> bool:
+    """
+    A completed job's recorded assets are reusable only if every file is
+    still there with the same content (a later job for the same
+    project/part may have overwritten them).
+    """
+    assets = (result or {}).get("assets") or []
+    if not assets:
+        return False
+    try:
+        return all(file_sha256(Path(a["path"])) == a["sha256"] for a in assets)
+    except (OSError, KeyError):
+        return False
+
+
+# Worker pool per image engine; a payload may override with "pool"
+ENGINE_POOLS = {
+    "simple": "render",
+    "optimizer": "render",
+}
+
+
+# Relative cost per image engine; cheaper jobs are claimed first at equal
+# priority so a one-shot render isn't stuck behind a long optimizer run
+ENGINE_COSTS = {
+    "simple": 1,
+    "optimizer": 10,
+}
+
+
+def image_job_pool(payload: dict) -> str:
+    return payload.get("pool") or ENGINE_POOLS.get(payload.get("engine", "simple"), "cpu")
+
+
+def job_cost(kind: str, payload: dict) -> int:
+    if kind == "image":
+        return ENGINE_COSTS.get(payload.get("engine", "simple"), 5)
+    return 1
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"]) if job.get("payload") else {}
+    job["result"] = json.loads(job["result"]) if job.get("result") else None
+
+    # How long the job sat in the queue and how long it ran (so far)
+    now = time.time()
+    if job.get("started_at"):
+        job["wait_s"] = round(job["started_at"] - job["created_at"], 2)
+        job["run_s"] = round((job.get("finished_at") or now) - job["started_at"], 2)
+    else:
+        job["wait_s"] = round(now - job["created_at"], 2)
+        job["run_s"] = None
+    return job
+
+
+class JobQueue:
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, decl in MIGRATED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {decl}")
+            conn.executescript(INDEXES)
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit mode; multi-statement updates use explicit BEGIN IMMEDIATE
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    # -----------------------
+    #  Producers
+    # -----------------------
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        pool: str = "render",
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        source: str | None = None,
+        dedupe: bool = True,
+        priority: int = 0,
+        available_at: float | None = None,
+    ) -> dict:
+        """
+        Insert a job, unless an identical request (same idempotency key) is
+        already queued/running -- then that job is returned with
+        deduplicated="in_flight" (and its priority raised to `priority` if
+        higher) -- or already done with its assets intact -- then it is
+        returned with deduplicated="cached".
+
+        Higher `priority` jobs are claimed first. A new job can't be claimed
+        before `available_at` (default: now).
+        """
+        now = time.time()
+        idem_key = idempotency_key(kind, payload)
+        # Hashing assets can take a while; do it before taking the write
+        # lock and only re-check the row inside the transaction
+        cached = self._find_cached(idem_key) if dedupe else None
+        with self._transaction() as conn:
+            if dedupe:
+                row = conn.execute(
+                    """
+                    SELECT * FROM jobs
+                     WHERE idem_key = ? AND status IN ('queued', 'running')
+                     ORDER BY id DESC LIMIT 1
+                    """,
+                    (idem_key,),
+                ).fetchone()
+                if row is not None:
+                    job = _row_to_job(row)
+                    if priority > job["priority"]:
+                        conn.execute(
+                            "UPDATE jobs SET priority = ?, updated_at = ? WHERE id = ?",
+                            (priority, now, job["id"]),
+                        )
+                        job["priority"] = priority
+                    job["deduplicated"] = "in_flight"
+                    return job
+                if cached is not None:
+                    row = conn.execute(
+                        "SELECT * FROM jobs WHERE id = ? AND status = 'done' AND updated_at = ?",
+                        (cached["id"], cached["updated_at"]),
+                    ).fetchone()
+                    if row is not None:
+                        job = _row_to_job(row)
+                        job["deduplicated"] = "cached"
+                        return job
+
+            cur = conn.execute(
+                """
+                INSERT INTO jobs (kind, pool, project, part, payload, status,
+                                  max_attempts, available_at, created_at, updated_at,
+                                  source, idem_key, priority, cost)
+                VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    kind,
+                    pool,
+                    payload["project"],
+                    payload["part"],
+                    json.dumps(payload, ensure_ascii=False),
+                    max_attempts,
+                    now if available_at is None else available_at,
+                    now,
+                    now,
+                    source,
+                    idem_key,
+                    priority,
+                    job_cost(kind, payload),
+                ),
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (cur.lastrowid,)).fetchone()
+        job = _row_to_job(row)
+        job["deduplicated"] = None
+        return job
+
+    def _find_cached(self, idem_key: str) -> dict | None:
+        """
+        Newest finished job for idem_key whose assets are still intact.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE idem_key = ? AND status = 'done' ORDER BY id DESC",
+                (idem_key,),
+            ).fetchall()
+        for row in rows:
+            job = _row_to_job(row)
+            if assets_still_valid(job["result"]):
+                return job
+        return None
+
+    # -----------------------
+    #  Consumers
+    # -----------------------
+    def claim(
+        self,
+        kind: str,
+        worker_id: str,
+        pool: str | None = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    ) -> dict | None:
+        """
+        Atomically move the next ready job of `kind` (and `pool`) to
+        'running' under a lease owned by worker_id. Returns None if idle.
+
+        Among ready jobs the order is: highest priority, cheapest job,
+        project with the fewest running jobs, project that started the
+        fewest jobs within FAIR_SHARE_WINDOW_SECONDS, then oldest.
+        """
+        now = time.time()
+        window_start = now - FAIR_SHARE_WINDOW_SECONDS
+        sql = """
+            SELECT j.id FROM jobs j
+              LEFT JOIN (
+                    SELECT project,
+                           SUM(status = 'running') AS running,
+                           SUM(started_at >= ?) AS recent
+                      FROM jobs
+                     WHERE status = 'running' OR started_at >= ?
+                     GROUP BY project
+                   ) usage ON usage.project = j.project
+             WHERE j.status = 'queued' AND j.kind = ? AND j.available_at <= ?
+        """
+        params: list = [window_start, window_start, kind, now]
+        if pool is not None:
+            sql += " AND j.pool = ?"
+            params.append(pool)
+        sql += """
+             ORDER BY j.priority DESC, j.cost,
+                      COALESCE(usage.running, 0), COALESCE(usage.recent, 0),
+                      j.available_at, j.id
+             LIMIT 1
+        """
+
+        with self._transaction() as conn:
+            row = conn.execute(sql, params).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                """
+                UPDATE jobs
+                   SET status = 'running', attempts = attempts + 1,
+                       lease_owner = ?, lease_expires_at = ?,
+                       started_at = ?, finished_at = NULL, updated_at = ?
+                 WHERE id = ?
+                """,
+                (worker_id, now + lease_seconds, now, now, row["id"]),
+            )
+            job = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+        return _row_to_job(job)
+
+    def renew_lease(
+        self,
+        job_id: int,
+        worker_id: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        heartbeat_at: float | None = None,
+    ) -> bool:
+        """
+        Extend a running job's lease, optionally recording when the job last
+        showed signs of life. False if the worker no longer owns it.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs SET lease_expires_at = ?, updated_at = ?,
+                                heartbeat_at = COALESCE(?, heartbeat_at)
+                 WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """,
+                (now + lease_seconds, now, heartbeat_at, job_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def set_log_path(self, job_id: int, log_path: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET log_path = ?, updated_at = ? WHERE id = ?",
+                (log_path, time.time(), job_id),
+            )
+
+    def complete(self, job_id: int, worker_id: str, result: dict | None = None) -> bool:
+        """
+        Mark a running job done. False if worker_id no longer owns it (its
+        lease expired and the job was requeued or claimed by another worker).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                """
+                UPDATE jobs
+                   SET status = 'done', finished_at = ?, updated_at = ?,
+                       lease_owner = NULL, lease_expires_at = NULL, result = ?
+                 WHERE id = ? AND status = 'running' AND lease_owner = ?
+                """,
+                (now, now, json.dumps(result) if result is not None else None, job_id, worker_id),
+            )
+        return cur.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str, retry: bool = True) -> str:
+        """
+        Record a failure. The job goes back to 'queued' with exponential
+        backoff while attempts remain (and retry is True), otherwise to
+        'failed'. Returns the new status, or "lost" if worker_id no longer
+        owns the job (it is left as it is).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, attempts, max_attempts FROM jobs "
+                "WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (job_id, worker_id),
+            ).fetchone()
+            if row is None:
+                return "lost"
+            return self._record_failure(conn, row, error, retry, now)
+
+    @staticmethod
+    def _record_failure(conn: sqlite3.Connection, row: sqlite3.Row, error: str,
+                        retry: bool, now: float) -> str:
+        """
+        Requeue (with backoff) or fail the running job in `row`, inside the
+        caller's transaction. Returns the new status.
+        """
+        if retry and row["attempts"] < row["max_attempts"]:
+            delay = min(
+                BACKOFF_MAX_SECONDS,
+                BACKOFF_BASE_SECONDS * (2 ** max(0, row["attempts"] - 1)),
+            )
+            status, available_at, finished_at = "queued", now + delay, None
+        else:
+            status, available_at, finished_at = "failed", now, now
+        conn.execute(
+            """
+            UPDATE jobs
+               SET status = ?, available_at = ?, finished_at = ?, updated_at = ?,
+                   lease_owner = NULL, lease_expires_at = NULL, last_error = ?
+             WHERE id = ? AND status = 'running'
+            """,
+            (status, available_at, finished_at, now, error[:2000], row["id"]),
+        )
+        return status
+
+    def reschedule(
+        self, job_ids: list[int], interval_s: float = 0, start_at: float | None = None
+    ) -> list[int]:
+        """
+        Put failed (or still queued) jobs back in the queue with a fresh set
+        of attempts, making the i-th one available at start_at + i *
+        interval_s so a bulk retry drains gradually. Returns the ids that
+        were rescheduled (running/done jobs are left alone).
+        """
+        now = time.time()
+        start_at = now if start_at is None else start_at
+        rescheduled = []
+        with self._transaction() as conn:
+            for job_id in job_ids:
+                cur = conn.execute(
+                    """
+                    UPDATE jobs
+                       SET status = 'queued', attempts = 0, available_at = ?,
+                           finished_at = NULL, lease_owner = NULL,
+                           lease_expires_at = NULL, updated_at = ?
+                     WHERE id = ? AND status IN ('failed', 'queued')
+                    """,
+                    (start_at + len(rescheduled) * interval_s, now, job_id),
+                )
+                if cur.rowcount == 1:
+                    rescheduled.append(job_id)
+        return rescheduled
+
+    def requeue_expired(self) -> list[int]:
+        """
+        Fail (and so retry) running jobs whose lease ran out, e.g. because
+        the watcher that claimed them died. Returns the affected job ids.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT id, attempts, max_attempts FROM jobs "
+                "WHERE status = 'running' AND lease_expires_at < ?",
+                (now,),
+            ).fetchall()
+            for row in rows:
+                self._record_failure(conn, row, "lease expired (worker stopped heartbeating)", True, now)
+        return [row["id"] for row in rows]
+
+    # -----------------------
+    #  Queries
+    # -----------------------
+    def get(self, job_id: int) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_jobs(
+        self,
+        status: str | None = None,
+        kind: str | None = None,
+        project: str | None = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        sql = "SELECT * FROM jobs WHERE 1 = 1"
+        params: list = []
+        for column, value in (("status", status), ("kind", kind), ("project", project)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [_row_to_job(row) for row in rows]
+
+    def counts(self) -> dict:
+        """
+        {kind: {status: n}} for queue depth checks.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT kind, status, COUNT(*) AS n FROM jobs GROUP BY kind, status"
+            ).fetchall()
+        out: dict = {}
+        for row in rows:
+            out.setdefault(row["kind"], {})[row["status"]] = row["n"]
+        return out
+
+
+# -----------------------
+#  JSON-drop import adapter
+# -----------------------
+def import_job_file(queue: JobQueue, job_path: Path, kind: str, pool: str = "render",
+                    available_at: float | None = None) -> dict:
+    """
+    Enqueue a legacy job-*.json drop file. Raises on unreadable/invalid
+    files; the caller decides where the file goes afterwards.
+    """
+    with job_path.open("r", encoding="utf-8") as f:
+        payload = json.load(f)
+    for key in REQUIRED_FIELDS.get(kind, ("project", "part")):
+        if not payload.get(key):
+            raise ValueError(f"job file {job_path} is missing '{key}'")
+    return queue.enqueue(
+        kind,
+        payload,
+        pool=pool,
+        source=str(job_path),
+        priority=int(payload.get("priority", 0)),
+        available_at=available_at,
+    )
@@ -1,30 +1,32 @@
-import shlex
+from itertools import chain
 from pathlib import Path
-from datetime import datetime
-import subprocess
-import json
 import os
+import uuid
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from .media_jobs import queue_image_job, queue_voice_job
-import uuid
+from . import image_loop as image_loop_runs
+from . import metrics, speech
+from .blog_store import PARTS_FILE
+from .blog_store import get_store as get_blog_store
+from .job_logs import read_tail
+from .media_jobs import get_queue, queue_image_job, queue_voice_job
+from .result_cache import known_digest
+from .tasks import get_registry
+from .tts_stream import split_sentences, stream_sentences
+from .uploads import save_stream, upload_dir
 
 
 
 app = FastAPI(title="HexForge Media API")
 
 CONTENT_ROOT = Path("/mnt/hdd-storage/hexforge-content-engine")
-SADTALKER_ROOT = Path("/root/ai-tools/SadTalker")
-WHISPER_ROOT = Path("/root/ai-tools/Whisper")
 COMFY_ROOT = Path("/root/ai-tools/ComfyUI")
 
 
-def sh_quote(s: str) -> str:
-    return shlex.quote(str(s))
-
-
 class TTSRequest(BaseModel):
     text: str
     project: str | None = None
@@ -36,6 +38,8 @@ class STTRequest(BaseModel):
     audio_path: str
     project: str | None = None
     part: str | None = None
+    # Segment at silences and transcribe in parallel (hour-long sessions)
+    long_form: bool = False
 
 
 class ImageRequest(BaseModel):
@@ -50,11 +54,18 @@ class BlogJsonRequest(BaseModel):
     part: str | None = None
 
 
+class BulkBlogJsonRequest(BaseModel):
+    items: list[BlogJsonRequest]
+
+
 class QueueImageJobRequest(BaseModel):
     project: str
     part: str
     prompt: str
     num_images: int = 4
+    engine: str = "simple"
+    workflow: str = "hexforge-default"
+    priority: int = 0
 
 
 class QueueVoiceJobRequest(BaseModel):
@@ -62,6 +73,7 @@ class QueueVoiceJobRequest(BaseModel):
     part: str
     text: str
     voice: str | None = "default"
+    priority: int = 0
 
 
 @app.get("/health")
@@ -69,6 +81,17 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """
+    Prometheus text exposition: job/stage/cache counters and latency
+    histograms recorded by the API, the watchers and the optimizer, plus
+    current queue depths.
+    """
+    body = metrics.get_store().render(metrics.queue_gauges(get_queue().counts()))
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @app.post("/blog-json")
 async def blog_json(req: BlogJsonRequest):
     """
@@ -76,49 +99,119 @@ async def blog_json(req: BlogJsonRequest):
     save it into the content-engine tree so the pipeline can
     pick it up later.
     """
-    base_dir = CONTENT_ROOT / "incoming-blogs" / req.project
-    base_dir.mkdir(parents=True, exist_ok=True)
-
-    ts = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
     part = req.part or "part"
-    out_path = base_dir / f"{part}-{ts}.json"
-
-    payload = req.model_dump()
-    with out_path.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    record = {**req.model_dump(), "part": part}
+    try:
+        entry = (await run_in_threadpool(get_blog_store().append_many, req.project, [record]))[0]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         "status": "ok",
-        "saved": str(out_path),
+        "saved": str(get_blog_store().project_dir(req.project) / PARTS_FILE),
+        "offset": entry["offset"],
         "project": req.project,
         "part": part,
     }
 
 
+@app.post("/blog-json/bulk")
+async def blog_json_bulk(req: BulkBlogJsonRequest):
+    """
+    Accept many blog parts at once. Each project's parts are appended to its
+    store in a single write (see blog_store.py), off the event loop.
+    """
+    by_project: dict[str, list[dict]] = {}
+    for item in req.items:
+        by_project.setdefault(item.project, []).append({**item.model_dump(), "part": item.part or "part"})
+
+    store = get_blog_store()
+    # Reject the whole request before any project is written
+    try:
+        for project in by_project:
+            store.project_dir(project)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def write_all() -> dict[str, list[dict]]:
+        return {project: store.append_many(project, records) for project, records in by_project.items()}
+
+    written = await run_in_threadpool(write_all)
+    return {
+        "status": "ok",
+        "count": sum(len(entries) for entries in written.values()),
+        "projects": {
+            project: [{"part": e["part"], "offset": e["offset"]} for e in entries]
+            for project, entries in written.items()
+        },
+    }
+
+
+@app.get("/blog-json/{project}")
+def blog_json_index(project: str, part: str | None = None):
+    """
+    Newest entry of each stored part, or with `part` that part's record.
+    """
+    store = get_blog_store()
+    try:
+        if part is None:
+            return {"project": project, "parts": store.latest(project)}
+        record = store.get(project, part)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"No part {part!r} in project {project!r}")
+    return record
+
+
 # -----------------------
 #  Media job queue APIs
 # -----------------------
 
+def queued_job_response(job: dict) -> dict:
+    """
+    Response for a queue submission. `deduplicated` is "in_flight" when the
+    request attached to an identical queued/running job and "cached" when an
+    identical finished job's assets were reused (no new render). A job
+    handed off as a drop file (queue DB unavailable) has no job_id yet;
+    "drop_file" says where it went.
+    """
+    resp = {
+        "ok": True,
+        "job_id": job["id"],
+        "status": job["status"],
+        "deduplicated": job.get("deduplicated"),
+        "project": job["project"],
+        "part": job["part"],
+    }
+    if job.get("deduplicated") == "cached":
+        resp["result"] = job["result"]
+    if job.get("drop_file"):
+        resp["drop_file"] = job["drop_file"]
+    return resp
+
+
 @app.post("/media/queue/image")
 def media_queue_image(req: QueueImageJobRequest):
     """
     Queue an image-generation job for the ComfyUI watcher.
 
-    Writes a job-*.json file under:
-      /mnt/hdd-storage/hexforge-content-engine/incoming-images/<project>/<part>/
+    Inserts a row into the SQLite job queue (state/jobs.sqlite3); the
+    watcher claims it from there. Identical resubmissions attach to the
+    existing job or return its cached assets. Higher `priority` jobs are
+    claimed first; at equal priority cheap `simple` jobs go before optimizer
+    runs and projects share the render pool fairly.
     """
-    job_path = queue_image_job(
+    job = queue_image_job(
         project=req.project,
         part=req.part,
         prompt=req.prompt,
         num_images=req.num_images,
+        engine=req.engine,
+        workflow=req.workflow,
+        priority=req.priority,
     )
-    return {
-        "ok": True,
-        "job_path": job_path,
-        "project": req.project,
-        "part": req.part,
-    }
+    return queued_job_response(job)
 
 
 @app.post("/media/queue/voice")
@@ -126,20 +219,45 @@ def media_queue_voice(req: QueueVoiceJobRequest):
     """
     Queue a voice-generation job (TTS) for the watcher pipeline.
 
-    Writes a job-*.json file under:
-      /mnt/hdd-storage/hexforge-content-engine/incoming-voice/<project>/<part>/
+    Inserts a 'voice' row into the SQLite job queue; watch_incoming_voice.py
+    claims voice jobs in batches and writes assets/<project>/<part>/audio.
     """
-    job_path = queue_voice_job(
+    job = queue_voice_job(
         project=req.project,
         part=req.part,
         text=req.text,
         voice=req.voice or "default",
+        priority=req.priority,
     )
+    return queued_job_response(job)
+
+
+@app.get("/media/jobs/{job_id}")
+def media_job_status(job_id: int, tail: int = 50):
+    """
+    Status of a queued job, including how long it waited (wait_s) and ran
+    (run_s), plus the last `tail` lines of its runner log for checking on
+    progress while it runs.
+    """
+    job = get_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job["log_tail"] = []
+    if job.get("log_path") and tail > 0:
+        job["log_tail"] = read_tail(Path(job["log_path"]), tail)
+    return job
+
+
+@app.get("/media/jobs")
+def media_jobs_list(
+    status: str | None = None,
+    kind: str | None = None,
+    project: str | None = None,
+    limit: int = 100,
+):
     return {
-        "ok": True,
-        "job_path": job_path,
-        "project": req.project,
-        "part": req.part,
+        "jobs": get_queue().list_jobs(status=status, kind=kind, project=project, limit=limit),
+        "counts": get_queue().counts(),
     }
 
 
@@ -147,103 +265,209 @@ def media_queue_voice(req: QueueVoiceJobRequest):
 #  Direct TTS / STT APIs
 # -----------------------
 
+def task_response(task: dict, wait: bool, legacy_keys: tuple[str, ...]) -> dict:
+    """
+    Without wait: {"ok", "task_id", "status"} right away. With wait: the
+    endpoint's old blocking response, i.e. the result's legacy_keys or
+    {"ok": False, "error"}.
+    """
+    if not wait:
+        return {"ok": True, "task_id": task["id"], "status": task["status"]}
+
+    task = get_registry().wait(task["id"])
+    if task["status"] != "done":
+        return {"ok": False, "task_id": task["id"], "error": task["error"]}
+    return {"ok": True, "task_id": task["id"], **{k: task["result"][k] for k in legacy_keys}}
+
+
+def cached_response(result: dict, legacy_keys: tuple[str, ...]) -> dict:
+    """
+    Response for a request served straight from the result cache: already
+    done, so there is no task to poll.
+    """
+    return {
+        "ok": True,
+        "task_id": None,
+        "status": "done",
+        "cached": True,
+        **{k: result[k] for k in legacy_keys},
+    }
+
+
 @app.post("/tts")
-def tts(req: TTSRequest):
-    project = req.project or "scratch"
-    part = req.part or "part-1"
-
-    out_dir = CONTENT_ROOT / "assets" / project / part / "audio"
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    out_path = out_dir / f"tts-{uuid.uuid4().hex}.wav"
-
-    cmd = [
-        "bash",
-        "-lc",
-        (
-            f"cd {SADTALKER_ROOT} && "
-            f"source venv/bin/activate && "
-            f"python scripts/tts_from_text.py "
-            f"--text {sh_quote(req.text)} "
-            f"--out {sh_quote(str(out_path))}"
-        ),
-    ]
-    if req.voice:
-        cmd[-1] += f" --voice {sh_quote(req.voice)}"
+def tts(req: TTSRequest, wait: bool = False):
+    """
+    Queue text-to-speech on the API's task pool and return a task_id to
+    poll via /media/tasks/{task_id}. `wait=true` blocks until the WAV
+    exists and returns {"ok", "path"} as before. Text already synthesized
+    with this voice returns right away, with the cached WAV linked into
+    assets/<project>/<part>/audio.
+    """
+    cached = speech.cached_tts(req.text, req.voice, req.project, req.part)
+    if cached is not None:
+        return cached_response(cached, ("path",))
+
+    task = get_registry().submit(
+        "tts", speech.synthesize, req.text, req.project, req.part, req.voice, check_cache=False
+    )
+    return task_response(task, wait, ("path",))
 
-    try:
-        subprocess.check_call(" ".join(cmd), shell=True, executable="/bin/bash")
-    except subprocess.CalledProcessError as e:
-        return {"ok": False, "error": f"TTS failed: {e}"}
 
-    return {"ok": True, "path": str(out_path)}
+@app.post("/tts/stream")
+def tts_stream(req: TTSRequest):
+    """
+    Synthesize sentence by sentence, in parallel across the TTS workers,
+    and stream the WAV back in order as sentences finish. The complete
+    file is also saved; its path is in the X-Audio-Path header.
+
+    The first sentence is synthesized before the response starts, so a
+    worker that can't synthesize at all gets a 502. A sentence that fails
+    after that can't change the status any more: the error is logged, the
+    saved file is removed and the connection is dropped before the final
+    chunk, which HTTP clients report as an incomplete read.
+    """
+    sentences = split_sentences(req.text)
+    if not sentences:
+        raise HTTPException(status_code=400, detail="No text to synthesize")
+
+    out_path = speech.assets_dir(req.project, req.part, "audio") / f"tts-{uuid.uuid4().hex}.wav"
+    chunks = stream_sentences(sentences, out_path, req.voice)
+    try:
+        header = next(chunks)
+    except speech.SpeechError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    return StreamingResponse(
+        chain([header], chunks),
+        media_type="audio/wav",
+        headers={"X-Audio-Path": str(out_path), "X-Sentences": str(len(sentences))},
+    )
 
 
 @app.post("/stt")
-def stt(req: STTRequest):
+def stt(req: STTRequest, wait: bool = False):
+    """
+    Queue a transcription on the API's task pool and return a task_id to
+    poll via /media/tasks/{task_id}. `wait=true` blocks and returns
+    {"ok", "path", "transcript"} as before.
+
+    The recording is hashed for the transcript cache inside the task, not
+    here, so a large file doesn't hold up the response. Only a file this
+    process has already hashed (same path, size and mtime) can be answered
+    from the cache right away.
+    """
     audio_path = Path(req.audio_path)
     if not audio_path.exists():
         return {"ok": False, "error": f"File not found: {audio_path}"}
 
-    project = req.project or "scratch"
-    part = req.part or "part-1"
-    out_dir = CONTENT_ROOT / "assets" / project / part / "transcripts"
-    out_dir.mkdir(parents=True, exist_ok=True)
+    audio_sha256 = known_digest(audio_path)
+    if audio_sha256 is not None:
+        cached = speech.cached_stt(audio_sha256, req.long_form, req.project, req.part)
+        if cached is not None:
+            return cached_response(cached, ("path", "transcript"))
 
-    out_file = out_dir / f"transcript-{uuid.uuid4().hex}.txt"
+    task = get_registry().submit(
+        "stt", speech.transcribe, str(audio_path), req.project, req.part, req.long_form, audio_sha256,
+        check_cache=audio_sha256 is None,
+    )
+    return task_response(task, wait, ("path", "transcript"))
+
+
+@app.post("/stt/upload")
+async def stt_upload(
+    request: Request,
+    filename: str | None = None,
+    project: str | None = None,
+    part: str | None = None,
+    long_form: bool = False,
+    wait: bool = False,
+):
+    """
+    Upload a recording as the raw request body and transcribe it, e.g.
+    `curl --data-binary @session.mkv '.../stt/upload?filename=session.mkv&project=p'`.
 
-    cmd = [
-        "bash",
-        "-lc",
-        (
-            f"cd {WHISPER_ROOT} && "
-            f"source venv/bin/activate && "
-            f"./transcribe-audio.sh {sh_quote(str(audio_path))} "
-            f"> {sh_quote(str(out_file))}"
-        ),
-    ]
+    The body is streamed to uploads/<project>/<part>/ in fixed-size chunks
+    with its sha256 computed on the way; the transcription task is queued
+    as soon as the last chunk is on disk. Responds like /stt, plus
+    {"upload": {"path", "sha256", "bytes"}}.
+    """
+    upload = await save_stream(request.stream(), upload_dir(project, part), filename)
 
-    try:
-        subprocess.check_call(" ".join(cmd), shell=True, executable="/bin/bash")
-    except subprocess.CalledProcessError as e:
-        return {"ok": False, "error": f"STT failed: {e}"}
+    cached = await run_in_threadpool(speech.cached_stt, upload["sha256"], long_form, project, part)
+    if cached is not None:
+        return {**cached_response(cached, ("path", "transcript")), "upload": upload}
+
+    task = get_registry().submit(
+        "stt", speech.transcribe, upload["path"], project, part, long_form, upload["sha256"],
+        check_cache=False,
+    )
+    resp = await run_in_threadpool(task_response, task, wait, ("path", "transcript"))
+    return {**resp, "upload": upload}
+
+
+@app.get("/media/tasks/{task_id}")
+def media_task_status(task_id: str):
+    """
+    Status of a /tts or /stt task: queued, running, done or failed, with
+    wait_s/run_s and, once finished, its result or error.
+    """
+    task = get_registry().get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    return task
 
-    try:
-        text = out_file.read_text(encoding="utf-8", errors="replace")
-    except Exception as e:
-        return {"ok": False, "error": f"Failed to read transcript: {e}"}
 
-    return {"ok": True, "path": str(out_file), "transcript": text}
+@app.get("/media/tasks/{task_id}/result")
+def media_task_result(task_id: str):
+    """
+    Result of a finished task; 409 while it is still queued or running.
+    """
+    task = get_registry().get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+    if task["status"] in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Task {task_id} is {task['status']}")
+    if task["status"] == "failed":
+        return {"ok": False, "task_id": task_id, "error": task["error"]}
+    return {"ok": True, "task_id": task_id, **task["result"]}
 
 
 # -----------------------
-#  Legacy image-loop API
+#  Image-loop API
 # -----------------------
 
 @app.post("/image-loop")
-def image_loop(req: ImageRequest):
-    project = req.project
-    part = req.part
-    min_score = req.min_score or 7.5
-
-    assets_dir = CONTENT_ROOT / "assets" / project / part
-    assets_dir.mkdir(parents=True, exist_ok=True)
-
-    cmd = [
-        "bash",
-        "-lc",
-        (
-            f"cd {COMFY_ROOT} && "
-            f"source venv/bin/activate && "
-            f"./run-generator.sh "
-            f"--min_score {min_score} "
-            f"--final_variant_mode best_prompt"
-        ),
-    ]
+def image_loop(req: ImageRequest, wait: bool = False):
+    """
+    Start the prompt optimizer in the background and return its task_id
+    and run_id right away. Progress (each variant's score, each round's
+    best, the final summary) streams from events_url as Server-Sent
+    Events. `wait=true` blocks and returns {"ok", "assets_dir"} as before.
+    """
+    run_id = image_loop_runs.new_run_id(req.project, req.part)
+    image_loop_runs.prepare_run(run_id)
+    task = get_registry().submit(
+        "image-loop",
+        image_loop_runs.run_image_loop,
+        run_id,
+        req.project,
+        req.part,
+        req.min_score or 7.5,
+    )
+    resp = task_response(task, wait, ("assets_dir",))
+    return {**resp, "run_id": run_id, "events_url": f"/image-loop/runs/{run_id}/events"}
 
-    try:
-        subprocess.check_call(" ".join(cmd), shell=True, executable="/bin/bash")
-    except subprocess.CalledProcessError as e:
-        return {"ok": False, "error": f"Image loop failed: {e}"}
 
-    return {"ok": True, "assets_dir": str(assets_dir)}
+@app.get("/image-loop/runs/{run_id}/events")
+def image_loop_events(run_id: str):
+    """
+    Server-Sent Events for an /image-loop run: queued, start, variant,
+    variant_failed, round, stop, summary, then end. Reconnecting replays
+    the run from its first event.
+    """
+    if "/" in run_id or not image_loop_runs.events_path(run_id).exists():
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+    return StreamingResponse(
+        image_loop_runs.stream_events(run_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
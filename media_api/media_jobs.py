@@ -1,37 +1,114 @@
 # /mnt/hdd-storage/hexforge-content-engine/media_api/media_jobs.py
-from pathlib import Path
-from datetime import datetime
 import json
+import os
+import sqlite3
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from .job_queue import JobQueue, image_job_pool
 
 BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+INCOMING_IMAGES = BASE / "incoming-images"
+INCOMING_VOICE = BASE / "incoming-voice"
 
-def queue_image_job(project: str, part: str, prompt: str, num_images: int = 4):
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    folder = BASE / "incoming-images" / project / part
-    folder.mkdir(parents=True, exist_ok=True)
-    job_path = folder / f"job-{ts}.json"
+_queue: JobQueue | None = None
+
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def queue_image_job(
+    project: str,
+    part: str,
+    prompt: str,
+    num_images: int = 4,
+    engine: str = "simple",
+    workflow: str = "hexforge-default",
+    priority: int = 0,
+):
+    """
+    Enqueue an image job. An identical request (see job_queue.idempotency_key)
+    that is still queued/running, or finished with its assets intact, is
+    returned instead of a new job; job["deduplicated"] says which.
+    Higher `priority` jobs are claimed first.
+    """
     payload = {
         "project": project,
         "part": part,
         "prompt": prompt,
+        "engine": engine,
         "num_images": num_images,
-        "workflow": "hexforge-default",
+        "workflow": workflow,
     }
-    with open(job_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    return str(job_path)
+    return submit("image", payload, image_job_pool(payload), priority, INCOMING_IMAGES)
 
-def queue_voice_job(project: str, part: str, text: str, voice: str = "default"):
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    folder = BASE / "incoming-voice" / project / part
-    folder.mkdir(parents=True, exist_ok=True)
-    job_path = folder / f"job-{ts}.json"
+
+def queue_voice_job(
+    project: str, part: str, text: str, voice: str = "default", priority: int = 0
+):
     payload = {
         "project": project,
         "part": part,
         "text": text,
         "voice": voice,
     }
-    with open(job_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-    return str(job_path)
+    return submit("voice", payload, "cpu", priority, INCOMING_VOICE)
+
+
+def submit(kind: str, payload: dict, pool: str, priority: int, incoming: Path) -> dict:
+    """
+    Enqueue, or hand the job to the watcher as a drop file (write_job_file)
+    when the queue DB can't be reached, e.g. it stayed locked past the
+    timeout. The watcher imports the drop into the queue later; such a job
+    has no id yet, status "dropped" and "drop_file" set.
+    """
+    try:
+        return get_queue().enqueue(kind, payload, pool=pool, source="api", priority=priority)
+    except (sqlite3.Error, OSError) as e:
+        job_path = write_job_file({**payload, "priority": priority}, incoming)
+        print(f"[media_jobs] Queue DB unavailable ({e}); wrote {job_path} for the watcher")
+        return {
+            "id": None,
+            "status": "dropped",
+            "deduplicated": None,
+            "project": payload["project"],
+            "part": payload["part"],
+            "drop_file": str(job_path),
+        }
+
+
+# -----------------------
+#  JSON-drop hand-off
+# -----------------------
+def write_job_file(payload: dict, incoming: Path = INCOMING_IMAGES) -> Path:
+    """
+    Hand a job to a watcher as a JSON drop file under
+    <incoming>/<project>/<part>/, for producers that can't reach the queue DB.
+
+    The file is written and fsynced under a hidden ".job-*.json.tmp" name
+    (which the watcher ignores) and then renamed into place with
+    os.replace(), so the watcher only ever sees complete files and gets a
+    single "added" event. Names carry a random suffix so two submissions in
+    the same second don't overwrite each other.
+    """
+    folder = incoming / payload["project"] / payload["part"]
+    folder.mkdir(parents=True, exist_ok=True)
+
+    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
+    job_path = folder / f"job-{ts}-{uuid.uuid4().hex[:8]}.json"
+    tmp_path = folder / f".{job_path.name}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, job_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return job_path
@@ -0,0 +1,263 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/metrics.py
+"""
+Counters and latency histograms shared by the API, the watchers and the
+optimizer, rendered by GET /metrics in Prometheus text format.
+
+Observations come from several processes (the API, watch_incoming_*.py,
+loop_prompt_generator.py under the watcher), so they accumulate in a small
+SQLite file (HEXFORGE_METRICS_DB, default state/metrics.sqlite3) and not in
+process memory. Each observation is one short upsert. Recording never
+raises: a metrics problem is printed once and otherwise ignored, so it
+can't fail a render or a transcription. HEXFORGE_METRICS=0 turns recording
+off.
+
+Histograms store one row per (series, bucket), holding the count of
+observations whose smallest fitting bucket is that one. They are made
+cumulative when rendered.
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import functools
+import json
+import math
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+DB_PATH = Path(os.getenv("HEXFORGE_METRICS_DB", str(BASE / "state" / "metrics.sqlite3")))
+ENABLED = os.getenv("HEXFORGE_METRICS", "1").lower() not in ("0", "false", "no")
+
+# Seconds; spans a score call through an hour-long transcription
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, math.inf)
+
+# name -> (type, help). Names not listed still render, as untyped.
+METRICS = {
+    "hexforge_jobs_total": ("counter", "Queue jobs finished, by kind, engine and status"),
+    "hexforge_queue_wait_seconds": ("histogram", "Time a job waited in the queue before a worker claimed it"),
+    "hexforge_job_run_seconds": ("histogram", "Wall time of a claimed job, by kind, engine and status"),
+    "hexforge_stage_seconds": (
+        "histogram",
+        "Wall time per pipeline stage (comfy_post, image_wait, score, ollama, tts, stt)",
+    ),
+    "hexforge_stage_failures_total": ("counter", "Pipeline stage calls that failed or timed out"),
+    "hexforge_cache_requests_total": ("counter", "TTS/STT result cache lookups, by cache and hit/miss"),
+    "hexforge_queue_jobs": ("gauge", "Jobs in the queue right now, by kind and status"),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (
+    name   TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value  REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels)
+);
+CREATE TABLE IF NOT EXISTS histogram_buckets (
+    name   TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le     REAL NOT NULL,
+    count  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels, le)
+);
+CREATE TABLE IF NOT EXISTS histogram_sums (
+    name   TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    sum    REAL NOT NULL DEFAULT 0,
+    count  INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, labels)
+);
+"""
+
+
+def label_key(labels: dict) -> str:
+    return json.dumps({k: str(v) for k, v in sorted(labels.items()) if v is not None}, sort_keys=True)
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(key: str, extra: dict | None = None) -> str:
+    labels = {**json.loads(key), **(extra or {})}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{escape_label_value(v)}"' for k, v in labels.items()) + "}"
+
+
+def format_le(le: float) -> str:
+    return "+Inf" if math.isinf(le) else repr(float(le))
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class MetricsStore:
+    def __init__(self, db_path: Path = DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=5, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def inc(self, name: str, value: float = 1.0, labels: dict | None = None) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO counters (name, labels, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+                (name, label_key(labels or {}), value),
+            )
+
+    def observe(self, name: str, value: float, labels: dict | None = None,
+                buckets: tuple = DEFAULT_BUCKETS) -> None:
+        key = label_key(labels or {})
+        le = next((b for b in buckets if value <= b), math.inf)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO histogram_buckets (name, labels, le, count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (name, labels, le) DO UPDATE SET count = count + 1",
+                (name, key, le),
+            )
+            conn.execute(
+                "INSERT INTO histogram_sums (name, labels, sum, count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (name, labels) DO UPDATE SET sum = sum + excluded.sum, count = count + 1",
+                (name, key, value),
+            )
+            conn.execute("COMMIT")
+
+    def render(self, gauges: dict[str, dict[str, float]] | None = None,
+               buckets: tuple = DEFAULT_BUCKETS) -> str:
+        """
+        Prometheus text exposition of everything recorded, plus `gauges`
+        ({name: {label_key: value}}) computed by the caller at scrape time.
+        """
+        with self._connect() as conn:
+            counters = conn.execute("SELECT name, labels, value FROM counters ORDER BY name, labels").fetchall()
+            hist_rows = conn.execute(
+                "SELECT name, labels, le, count FROM histogram_buckets ORDER BY name, labels, le"
+            ).fetchall()
+            sums = conn.execute(
+                "SELECT name, labels, sum, count FROM histogram_sums ORDER BY name, labels"
+            ).fetchall()
+
+        series: dict[str, list[str]] = {}
+        for row in counters:
+            series.setdefault(row["name"], []).append(
+                f"{row['name']}{format_labels(row['labels'])} {format_value(row['value'])}"
+            )
+
+        per_bucket: dict[tuple, dict[float, int]] = {}
+        for row in hist_rows:
+            per_bucket.setdefault((row["name"], row["labels"]), {})[row["le"]] = row["count"]
+        for row in sums:
+            name, key = row["name"], row["labels"]
+            counts = per_bucket.get((name, key), {})
+            lines = series.setdefault(name, [])
+            running = 0
+            for le in sorted(set(buckets) | set(counts)):
+                running += counts.get(le, 0)
+                lines.append(f"{name}_bucket{format_labels(key, {'le': format_le(le)})} {running}")
+            lines.append(f"{name}_sum{format_labels(key)} {format_value(row['sum'])}")
+            lines.append(f"{name}_count{format_labels(key)} {row['count']}")
+
+        for name, values in (gauges or {}).items():
+            series[name] = [f"{name}{format_labels(key)} {format_value(value)}" for key, value in values.items()]
+
+        out = []
+        for name in sorted(series):
+            kind, help_text = METRICS.get(name, ("untyped", name))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(series[name])
+        return "\n".join(out) + "\n"
+
+
+_store: MetricsStore | None = None
+_warned = False
+
+
+def get_store() -> MetricsStore:
+    global _store
+    if _store is None:
+        _store = MetricsStore()
+    return _store
+
+
+def _record(method: str, *args) -> None:
+    global _warned
+    if not ENABLED:
+        return
+    try:
+        getattr(get_store(), method)(*args)
+    except (OSError, sqlite3.Error) as e:
+        if not _warned:
+            print(f"[metrics] Recording disabled for this process: {e}")
+            _warned = True
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    _record("inc", name, value, labels)
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    _record("observe", name, seconds, labels)
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """
+    Observe the block's wall time under `name`, whether or not it raises.
+    """
+    start = time.time()
+    try:
+        yield
+    finally:
+        observe(name, time.time() - start, **labels)
+
+
+def stage_timer(stage: str, failed=None, **labels):
+    """
+    Decorator: observe each call's wall time as hexforge_stage_seconds
+    {stage=...}, and count it in hexforge_stage_failures_total when it
+    raises or `failed(return value)` is true.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.time()
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = failed is None or not failed(result)
+                return result
+            finally:
+                observe("hexforge_stage_seconds", time.time() - start, stage=stage, **labels)
+                if not ok:
+                    inc("hexforge_stage_failures_total", stage=stage, **labels)
+        return wrapper
+    return decorate
+
+
+def queue_gauges(counts: dict) -> dict[str, dict[str, float]]:
+    """
+    hexforge_queue_jobs series from JobQueue.counts().
+    """
+    return {
+        "hexforge_queue_jobs": {
+            label_key({"kind": kind, "status": status}): n
+            for kind, statuses in counts.items()
+            for status, n in statuses.items()
+        }
+    }
@@ -0,0 +1,216 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/result_cache.py
+"""
+Content-addressed caches for TTS audio and STT transcripts.
+
+TTS results are keyed by hash(text, voice, engine version) and STT results
+by hash(audio bytes, model, language, long-form mode). Repeating a request
+links (or copies) the stored artifact into the caller's assets dir instead
+of running SadTalker or Whisper again.
+
+Each entry is an artifact file (hard-linked from where the result was
+written, or copied when a link isn't possible) plus a small .json with the
+result fields, under cache/<kind>/<key[:2]>/<key>.*. Hits touch the entry's
+mtime, and once a cache grows past its byte budget the least recently used
+entries are deleted. mtime lives on disk, so the API and the scripts share
+the same recency.
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from . import metrics
+from .job_queue import file_sha256
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+CACHE_ROOT = BASE / "cache"
+
+TTS_CACHE_BYTES = int(os.getenv("HEXFORGE_TTS_CACHE_BYTES", str(5 * 1024**3)))
+STT_CACHE_BYTES = int(os.getenv("HEXFORGE_STT_CACHE_BYTES", str(1024**3)))
+
+# Bump HEXFORGE_TTS_CACHE_VERSION (or change the model) to stop reusing
+# audio made by an older engine
+TTS_ENGINE_VERSION = os.getenv(
+    "HEXFORGE_TTS_CACHE_VERSION",
+    os.getenv("HEXFORGE_TTS_MODEL", "tts_models/en/ljspeech/tacotron2-DDC"),
+)
+STT_MODEL = os.getenv("HEXFORGE_WHISPER_MODEL", "base")
+STT_LANGUAGE = os.getenv("HEXFORGE_WHISPER_LANGUAGE", "en")
+
+# Eviction trims down to this fraction of the budget, so a full cache
+# isn't rescanned on every put
+EVICT_TO_FRACTION = 0.9
+
+
+def content_key(*parts: str) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def tts_key(text: str, voice: str | None, version: str = TTS_ENGINE_VERSION) -> str:
+    return content_key("tts", text, voice or "default", version)
+
+
+def stt_key(audio_sha256: str, model: str = STT_MODEL, language: str = STT_LANGUAGE,
+            long_form: bool = False) -> str:
+    # Long-form transcripts are segmented and come back with segment
+    # timings, so they don't share entries with plain ones. Plain keys keep
+    # their original form so existing entries stay valid.
+    extra = ("long_form",) if long_form else ()
+    return content_key("stt", audio_sha256, model, language, *extra)
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    """
+    Hard-link src to dest, or copy it when a link isn't possible (e.g.
+    across filesystems).
+    """
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+_digests: dict[tuple, str] = {}
+
+
+def _file_ident(path: Path) -> tuple:
+    st = path.stat()
+    return (str(path), st.st_size, st.st_mtime_ns)
+
+
+def audio_digest(path: Path) -> str:
+    """
+    sha256 of the file, remembered per (path, size, mtime) so a recording
+    asked about twice in one process is only read once.
+    """
+    ident = _file_ident(path)
+    if ident not in _digests:
+        _digests[ident] = file_sha256(path)
+    return _digests[ident]
+
+
+def known_digest(path: Path) -> str | None:
+    """
+    audio_digest(path) if it is already remembered for the file as it is
+    now, else None. Only stats the file, so it is safe in a request handler.
+    """
+    try:
+        return _digests.get(_file_ident(path))
+    except OSError:
+        return None
+
+
+class ResultCache:
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def meta_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> dict | None:
+        """
+        The stored result for key (with "path" pointing at the cached
+        artifact), or None. Marks the entry recently used.
+        """
+        meta_path = self.meta_path(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            metrics.inc("hexforge_cache_requests_total", cache=self.root.name, result="miss")
+            return None
+        artifact = Path(meta["path"])
+        if not artifact.exists():
+            meta_path.unlink(missing_ok=True)
+            metrics.inc("hexforge_cache_requests_total", cache=self.root.name, result="miss")
+            return None
+        metrics.inc("hexforge_cache_requests_total", cache=self.root.name, result="hit")
+        now = time.time()
+        for p in (meta_path, artifact):
+            try:
+                os.utime(p, (now, now))
+            except OSError:
+                pass
+        return meta
+
+    def put(self, key: str, artifact: Path, meta: dict) -> dict:
+        """
+        Store artifact (linked, or copied across filesystems) under key with
+        its result fields; returns the stored meta.
+        """
+        entry_dir = self.root / key[:2]
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        dest = entry_dir / f"{key}{artifact.suffix}"
+        tmp = entry_dir / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        link_or_copy(artifact, tmp)
+        os.replace(tmp, dest)
+
+        meta = {**meta, "path": str(dest), "key": key, "cached_at": time.time()}
+        meta_tmp = tmp.with_suffix(".json.tmp")
+        meta_tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(meta_tmp, self.meta_path(key))
+
+        self.evict()
+        return meta
+
+    def evict(self) -> int:
+        """
+        Delete least recently used entries until the cache is back under
+        its budget. Returns how many were removed.
+        """
+        with self._lock:
+            entries = {}
+            for meta_path in self.root.glob("*/*.json"):
+                key = meta_path.stem
+                files = [p for p in meta_path.parent.glob(f"{key}*") if p.is_file()]
+                try:
+                    entries[key] = (
+                        meta_path.stat().st_mtime,
+                        sum(p.stat().st_size for p in files),
+                        files,
+                    )
+                except OSError:
+                    continue
+
+            total = sum(size for _, size, _ in entries.values())
+            if total <= self.max_bytes:
+                return 0
+
+            removed = 0
+            target = self.max_bytes * EVICT_TO_FRACTION
+            for _, size, files in sorted(entries.values(), key=lambda e: e[0]):
+                if total <= target:
+                    break
+                for p in files:
+                    p.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            return removed
+
+
+_tts_cache: ResultCache | None = None
+_stt_cache: ResultCache | None = None
+
+
+def get_tts_cache() -> ResultCache:
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = ResultCache(CACHE_ROOT / "tts", TTS_CACHE_BYTES)
+    return _tts_cache
+
+
+def get_stt_cache() -> ResultCache:
+    global _stt_cache
+    if _stt_cache is None:
+        _stt_cache = ResultCache(CACHE_ROOT / "stt", STT_CACHE_BYTES)
+    return _stt_cache
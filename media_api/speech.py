@@ -0,0 +1,262 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/speech.py
+"""
+TTS and STT calls behind /tts and /stt.
+
+TTS and STT go to the resident workers (tts_client, stt_client) when they
+are running, so only inference time is paid per request. Otherwise the
+tool's venv interpreter/script runs directly (with the venv's bin/ first on PATH)
+instead of going through `bash -lc "source venv/bin/activate && ..."`.
+Finished results go into the content-addressed caches (result_cache), and
+a repeated text/voice or recording gets the cached file linked into its
+own assets dir instead.
+Failures raise SpeechError.
+"""
+import os
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+from . import metrics, stt_client, tts_client
+from .result_cache import (
+    audio_digest,
+    get_stt_cache,
+    get_tts_cache,
+    link_or_copy,
+    stt_key,
+    tts_key,
+)
+
+CONTENT_ROOT = Path("/mnt/hdd-storage/hexforge-content-engine")
+SADTALKER_ROOT = Path("/root/ai-tools/SadTalker")
+WHISPER_ROOT = Path("/root/ai-tools/Whisper")
+
+TTS_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_TTS_TIMEOUT", "900"))
+STT_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_STT_TIMEOUT", "7200"))
+
+
+class SpeechError(RuntimeError):
+    pass
+
+
+def venv_env(root: Path) -> dict:
+    """
+    Environment equivalent to `source <root>/venv/bin/activate`.
+    """
+    venv = root / "venv"
+    env = dict(os.environ)
+    env["VIRTUAL_ENV"] = str(venv)
+    env["PATH"] = f"{venv / 'bin'}:{env.get('PATH', '')}"
+    env.pop("PYTHONHOME", None)
+    return env
+
+
+def assets_dir(project: str | None, part: str | None, kind: str) -> Path:
+    out_dir = CONTENT_ROOT / "assets" / (project or "scratch") / (part or "part-1") / kind
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return out_dir
+
+
+def synthesize(text: str, project: str | None = None, part: str | None = None, voice: str | None = None,
+               check_cache: bool = True) -> dict:
+    """
+    Synthesize text to a new WAV under assets/<project>/<part>/audio.
+    Returns {"path": <wav>, "engine": ..., "cached": False}, or the cached
+    WAV's entry with "cached": True if this text and voice were done before
+    (check_cache=False when the caller has just looked).
+    """
+    cached = cached_tts(text, voice, project, part) if check_cache else None
+    if cached is not None:
+        return cached
+
+    out_path = assets_dir(project, part, "audio") / f"tts-{uuid.uuid4().hex}.wav"
+    result = synthesize_to(text, out_path, voice)
+    try:
+        get_tts_cache().put(tts_key(text, voice), out_path, {"engine": result["engine"]})
+    except OSError as e:
+        print(f"[speech] Could not cache {out_path.name}: {e}")
+    return {**result, "cached": False}
+
+
+def cached_tts(text: str, voice: str | None = None, project: str | None = None,
+               part: str | None = None) -> dict | None:
+    """
+    The cached WAV for text/voice, linked to a new file under
+    assets/<project>/<part>/audio like a fresh synthesis, or None.
+    """
+    meta = get_tts_cache().get(tts_key(text, voice))
+    if meta is None:
+        return None
+    out_path = assets_dir(project, part, "audio") / f"tts-{uuid.uuid4().hex}.wav"
+    try:
+        link_or_copy(Path(meta["path"]), out_path)
+    except OSError as e:
+        # Evicted since the lookup: treat as a miss
+        print(f"[speech] Could not reuse cached {Path(meta['path']).name}: {e}")
+        return None
+    return {"path": str(out_path), "engine": meta.get("engine"), "cached": True}
+
+
+def synthesize_to(text: str, out_path: Path, voice: str | None = None,
+                  socket_path: Path = tts_client.SOCKET_PATH) -> dict:
+    """
+    Synthesize text to out_path on the worker at socket_path, or with the
+    per-call script if that worker isn't running.
+    """
+    start = time.time()
+    try:
+        result = tts_client.synthesize(
+            text, str(out_path), voice, timeout=TTS_TIMEOUT_SECONDS, socket_path=socket_path
+        )
+    except tts_client.TTSWorkerUnavailable:
+        return synthesize_subprocess(text, out_path, voice)
+    except OSError as e:
+        metrics.inc("hexforge_stage_failures_total", stage="tts", engine="worker")
+        raise SpeechError(f"TTS worker request failed: {e}") from e
+    if not result.get("ok"):
+        metrics.inc("hexforge_stage_failures_total", stage="tts", engine="worker")
+        raise SpeechError(f"TTS failed: {result.get('error')}")
+    metrics.observe("hexforge_stage_seconds", time.time() - start, stage="tts", engine="worker")
+    return {"path": str(out_path), "engine": f"worker:{result.get('engine')}"}
+
+
+def synthesize_subprocess(text: str, out_path: Path, voice: str | None = None) -> dict:
+    """
+    Run SadTalker's scripts/tts_from_text.py (loads the model per call).
+    """
+    cmd = [
+        str(SADTALKER_ROOT / "venv" / "bin" / "python"),
+        "scripts/tts_from_text.py",
+        "--text", text,
+        "--out", str(out_path),
+    ]
+    if voice:
+        cmd += ["--voice", voice]
+
+    try:
+        with metrics.timed("hexforge_stage_seconds", stage="tts", engine="subprocess"):
+            subprocess.run(
+                cmd,
+                cwd=str(SADTALKER_ROOT),
+                env=venv_env(SADTALKER_ROOT),
+                check=True,
+                timeout=TTS_TIMEOUT_SECONDS,
+            )
+    except (OSError, subprocess.SubprocessError) as e:
+        metrics.inc("hexforge_stage_failures_total", stage="tts", engine="subprocess")
+        raise SpeechError(f"TTS failed: {e}") from e
+
+    return {"path": str(out_path), "engine": "tts_from_text"}
+
+
+def transcribe(audio_path: str, project: str | None = None, part: str | None = None,
+               long_form: bool = False, audio_sha256: str | None = None,
+               check_cache: bool = True) -> dict:
+    """
+    Transcribe audio_path into assets/<project>/<part>/transcripts. Returns
+    {"path": <transcript file>, "transcript": <text>, "engine": ...,
+    "cached": False}; the resident worker also reports duration_s and rtf
+    (real-time factor). A recording with the same bytes (audio_sha256, if
+    the caller already has it) returns the cached transcript instead
+    (check_cache=False when the caller has just looked).
+
+    long_form has the worker split the recording at silences and transcribe
+    the segments in parallel; without the worker it runs serially like any
+    other file.
+    """
+    audio = Path(audio_path)
+    if not audio.exists():
+        raise SpeechError(f"File not found: {audio}")
+
+    audio_sha256 = audio_sha256 or audio_digest(audio)
+    cached = cached_stt(audio_sha256, long_form, project, part) if check_cache else None
+    if cached is not None:
+        return cached
+
+    out_file = assets_dir(project, part, "transcripts") / f"transcript-{uuid.uuid4().hex}.txt"
+    result = transcribe_file(audio, out_file, long_form)
+    try:
+        get_stt_cache().put(
+            stt_key(audio_sha256, long_form=long_form),
+            out_file,
+            {k: v for k, v in result.items() if k not in ("path", "transcript")},
+        )
+    except OSError as e:
+        print(f"[speech] Could not cache {out_file.name}: {e}")
+    return {**result, "cached": False}
+
+
+def cached_stt(audio_sha256: str, long_form: bool = False, project: str | None = None,
+               part: str | None = None) -> dict | None:
+    """
+    The cached transcript for these audio bytes and mode, linked to a new
+    file under assets/<project>/<part>/transcripts, or None.
+    """
+    meta = get_stt_cache().get(stt_key(audio_sha256, long_form=long_form))
+    if meta is None:
+        return None
+    out_file = assets_dir(project, part, "transcripts") / f"transcript-{uuid.uuid4().hex}.txt"
+    try:
+        link_or_copy(Path(meta["path"]), out_file)
+        text = out_file.read_text(encoding="utf-8", errors="replace")
+    except OSError as e:
+        print(f"[speech] Could not reuse cached {Path(meta['path']).name}: {e}")
+        return None
+    fields = {k: v for k, v in meta.items() if k not in ("key", "cached_at")}
+    return {**fields, "path": str(out_file), "transcript": text, "cached": True}
+
+
+def transcribe_file(audio: Path, out_file: Path, long_form: bool = False) -> dict:
+    """
+    Transcribe audio into out_file on the resident worker, or with
+    transcribe-audio.sh if it isn't running.
+    """
+    call = stt_client.transcribe_long if long_form else stt_client.transcribe
+    engine = "worker-longform" if long_form else "worker"
+    start = time.time()
+    try:
+        result = call(str(audio), str(out_file), timeout=STT_TIMEOUT_SECONDS)
+    except stt_client.STTWorkerUnavailable:
+        return transcribe_subprocess(audio, out_file)
+    except OSError as e:
+        metrics.inc("hexforge_stage_failures_total", stage="stt", engine=engine)
+        raise SpeechError(f"STT worker request failed: {e}") from e
+    if not result.get("ok"):
+        metrics.inc("hexforge_stage_failures_total", stage="stt", engine=engine)
+        raise SpeechError(f"STT failed: {result.get('error')}")
+    metrics.observe("hexforge_stage_seconds", time.time() - start, stage="stt", engine=engine)
+    return {
+        "path": str(out_file),
+        "transcript": result.get("text", ""),
+        "engine": "worker:whisper-longform" if long_form else "worker:whisper",
+        "duration_s": result.get("duration_s"),
+        "rtf": result.get("rtf"),
+        "segments": result.get("segments") if long_form else None,
+    }
+
+
+def transcribe_subprocess(audio: Path, out_file: Path) -> dict:
+    """
+    Run Whisper's transcribe-audio.sh (loads the model per call).
+    """
+    try:
+        with out_file.open("w", encoding="utf-8") as out, \
+                metrics.timed("hexforge_stage_seconds", stage="stt", engine="subprocess"):
+            subprocess.run(
+                [str(WHISPER_ROOT / "transcribe-audio.sh"), str(audio)],
+                cwd=str(WHISPER_ROOT),
+                env=venv_env(WHISPER_ROOT),
+                stdout=out,
+                check=True,
+                timeout=STT_TIMEOUT_SECONDS,
+            )
+    except (OSError, subprocess.SubprocessError) as e:
+        metrics.inc("hexforge_stage_failures_total", stage="stt", engine="subprocess")
+        raise SpeechError(f"STT failed: {e}") from e
+
+    try:
+        text = out_file.read_text(encoding="utf-8", errors="replace")
+    except Exception as e:
+        raise SpeechError(f"Failed to read transcript: {e}") from e
+
+    return {"path": str(out_file), "transcript": text, "engine": "transcribe-audio.sh"}
@@ -0,0 +1,70 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/stt_client.py
+"""
+Client for the resident Whisper worker (linux/HexForgeEngine/scripts/stt_worker.py).
+
+Same socket protocol as tts_client: one JSON line per request and per
+response. Callers fall back to transcribe-audio.sh when the worker isn't
+running (STTWorkerUnavailable).
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import os
+from pathlib import Path
+
+from .worker_socket import WorkerUnavailable
+from .worker_socket import request as worker_request
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+SOCKET_PATH = Path(os.getenv("HEXFORGE_STT_SOCKET", str(BASE / "state" / "stt.sock")))
+
+# Long recordings transcribe for a good while even with the model loaded
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_STT_WORKER_TIMEOUT", "7200"))
+
+STTWorkerUnavailable = WorkerUnavailable
+
+
+def request(payload: dict, timeout: float = REQUEST_TIMEOUT_SECONDS, socket_path: Path = SOCKET_PATH) -> dict:
+    """
+    Send one request to the worker and return its response. Raises
+    STTWorkerUnavailable if the worker can't be reached.
+    """
+    return worker_request(socket_path, payload, timeout)
+
+
+def transcribe(audio_path: str, out_path: str | None = None, project: str | None = None,
+               part: str | None = None, timeout: float = REQUEST_TIMEOUT_SECONDS) -> dict:
+    """
+    {"ok", "path", "text", "duration_s", "seconds", "rtf", "error"} for one
+    file. Without out_path the worker writes under
+    assets/<project>/<part>/transcripts.
+    """
+    return request(
+        {"op": "transcribe", "audio": str(audio_path), "out": out_path, "project": project, "part": part},
+        timeout=timeout,
+    )
+
+
+def transcribe_long(audio_path: str, out_path: str | None = None, project: str | None = None,
+                    part: str | None = None, timeout: float = REQUEST_TIMEOUT_SECONDS) -> dict:
+    """
+    Like transcribe, but segmented at silences and transcribed on the
+    worker's process pool (stt_longform.py); adds "segments"/"processes".
+    """
+    return request(
+        {"op": "longform", "audio": str(audio_path), "out": out_path, "project": project, "part": part},
+        timeout=timeout,
+    )
+
+
+def transcribe_batch(items: list[dict], timeout: float = REQUEST_TIMEOUT_SECONDS) -> list[dict]:
+    """
+    Per-item results for [{"id", "audio", "out"?, "project"?, "part"?}, ...].
+    """
+    response = request({"op": "batch", "items": items}, timeout=timeout * max(1, len(items)))
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error") or "STT worker batch failed")
+    return response["items"]
+
+
+def info(timeout: float = 5.0) -> dict:
+    return request({"op": "info"}, timeout=timeout)
@@ -0,0 +1,127 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/tasks.py
+"""
+In-process background tasks for request-scoped work (TTS, STT).
+
+The SQLite job queue (job_queue.py) is for work the watchers pick up. Direct
+API calls like /tts and /stt instead run here, on a bounded thread pool, so
+a burst of requests queues up behind HEXFORGE_API_TASK_WORKERS threads
+rather than tying up the server's request threads (and /health with them).
+
+Long kinds (the /image-loop optimizer) get a pool of their own, so one
+multi-minute run can't hold a TTS/STT thread.
+
+Task records live in memory: they don't survive an API restart, and only
+the most recent MAX_FINISHED_TASKS finished ones are kept.
+"""
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+TASK_WORKERS = int(os.getenv("HEXFORGE_API_TASK_WORKERS", "2"))
+MAX_FINISHED_TASKS = 500
+
+# Task kinds with their own worker count instead of sharing TASK_WORKERS
+KIND_WORKERS = {
+    "image-loop": int(os.getenv("HEXFORGE_IMAGE_LOOP_WORKERS", "1")),
+}
+
+
+class TaskRegistry:
+    def __init__(self, max_workers: int = TASK_WORKERS, max_finished: int = MAX_FINISHED_TASKS,
+                 kind_workers: dict[str, int] = KIND_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media-task")
+        self.kind_executors = {
+            kind: ThreadPoolExecutor(max_workers=max(1, n), thread_name_prefix=f"{kind}-task")
+            for kind, n in kind_workers.items()
+        }
+        self.max_finished = max_finished
+        self._tasks: OrderedDict[str, dict] = OrderedDict()
+        self._futures: dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Any], *args, **kwargs) -> dict:
+        """
+        Queue fn(*args, **kwargs) and return its task record. The task's
+        "result" is fn's return value; an exception marks it failed with
+        "error" set to the exception message.
+        """
+        task_id = f"{kind}-{uuid.uuid4().hex[:12]}"
+        task = {
+            "id": task_id,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        executor = self.kind_executors.get(kind, self.executor)
+        # Held across submit so a task that finishes at once can't pop its
+        # future before it is stored (it would then never be removed)
+        with self._lock:
+            self._tasks[task_id] = task
+            self._futures[task_id] = executor.submit(self._run, task, fn, args, kwargs)
+        return dict(task)
+
+    def _run(self, task: dict, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        task["status"] = "running"
+        task["started_at"] = time.time()
+        try:
+            task["result"] = fn(*args, **kwargs)
+            task["status"] = "done"
+        except Exception as e:
+            task["error"] = str(e) or e.__class__.__name__
+            task["status"] = "failed"
+            traceback.print_exc()
+        finally:
+            task["finished_at"] = time.time()
+            with self._lock:
+                self._futures.pop(task["id"], None)
+            self._prune()
+
+    def _prune(self) -> None:
+        with self._lock:
+            finished = [tid for tid, t in self._tasks.items() if t["finished_at"] is not None]
+            for tid in finished[: max(0, len(finished) - self.max_finished)]:
+                del self._tasks[tid]
+
+    def get(self, task_id: str) -> dict | None:
+        with self._lock:
+            task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        task = dict(task)
+        now = time.time()
+        start = task["started_at"]
+        task["wait_s"] = round((start or now) - task["created_at"], 2)
+        task["run_s"] = round((task["finished_at"] or now) - start, 2) if start else None
+        return task
+
+    def wait(self, task_id: str, timeout: float | None = None) -> dict | None:
+        """
+        Block until the task finishes (or timeout), then return its record.
+        """
+        with self._lock:
+            future = self._futures.get(task_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.get(task_id)
+
+
+_registry: TaskRegistry | None = None
+
+
+def get_registry() -> TaskRegistry:
+    global _registry
+    if _registry is None:
+        _registry = TaskRegistry()
+    return _registry
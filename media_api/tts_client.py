@@ -0,0 +1,74 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/tts_client.py
+"""
+Client for the resident TTS worker (linux/HexForgeEngine/scripts/tts_worker.py).
+
+The worker keeps the TTS model loaded and listens on a unix socket; each
+request is one JSON line and gets one JSON line back. Callers fall back to
+their per-request path when the worker isn't running
+(TTSWorkerUnavailable).
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import os
+from pathlib import Path
+
+from .worker_socket import WorkerUnavailable
+from .worker_socket import request as worker_request
+
+BASE = Path("/mnt/hdd-storage/hexforge-content-engine")
+SOCKET_PATH = Path(os.getenv("HEXFORGE_TTS_SOCKET", str(BASE / "state" / "tts.sock")))
+
+# Every resident worker, for callers that spread work across several
+# (start each tts_worker.py with its own HEXFORGE_TTS_SOCKET)
+SOCKET_PATHS = [Path(p) for p in os.getenv("HEXFORGE_TTS_SOCKETS", "").split(",") if p.strip()] or [SOCKET_PATH]
+
+# Inference on a long text can take minutes
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("HEXFORGE_TTS_WORKER_TIMEOUT", "900"))
+
+# Kept as a name of its own for callers that only deal with TTS
+TTSWorkerUnavailable = WorkerUnavailable
+
+
+def worker_available(socket_path: Path = SOCKET_PATH) -> bool:
+    return socket_path.exists()
+
+
+def live_sockets() -> list[Path]:
+    """
+    SOCKET_PATHS whose worker socket exists.
+    """
+    return [p for p in SOCKET_PATHS if worker_available(p)]
+
+
+def request(payload: dict, timeout: float = REQUEST_TIMEOUT_SECONDS, socket_path: Path = SOCKET_PATH) -> dict:
+    """
+    Send one request to the worker and return its response. Raises
+    TTSWorkerUnavailable if the worker can't be reached.
+    """
+    return worker_request(socket_path, payload, timeout)
+
+
+def synthesize(text: str, out_path: str, voice: str | None = None, timeout: float = REQUEST_TIMEOUT_SECONDS,
+               socket_path: Path = SOCKET_PATH) -> dict:
+    """
+    {"ok", "seconds", "engine", "error"} for one text written to out_path.
+    """
+    return request(
+        {"op": "synthesize", "text": text, "out": str(out_path), "voice": voice},
+        timeout=timeout,
+        socket_path=socket_path,
+    )
+
+
+def synthesize_batch(items: list[dict], timeout: float = REQUEST_TIMEOUT_SECONDS) -> list[dict]:
+    """
+    Per-item results for [{"id", "text", "out", "voice"}, ...].
+    """
+    response = request({"op": "batch", "items": items}, timeout=timeout * max(1, len(items)))
+    if not response.get("ok"):
+        raise RuntimeError(response.get("error") or "TTS worker batch failed")
+    return response["items"]
+
+
+def info(timeout: float = 5.0) -> dict:
+    return request({"op": "info"}, timeout=timeout)
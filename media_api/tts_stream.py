@@ -0,0 +1,153 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/tts_stream.py
+"""
+Sentence-parallel TTS for /tts/stream.
+
+Long narrations are split into sentences. The sentences are synthesized
+concurrently, one per resident TTS worker (tts_client.SOCKET_PATHS) or
+HEXFORGE_TTS_STREAM_FALLBACK per-call scripts when no worker is running,
+and streamed back in order as one WAV. The header says "unknown length",
+so playback can start once the first sentence is done instead of after
+the whole article.
+
+A complete copy of the streamed WAV, with real sizes in its header, is
+written next to the other /tts output.
+
+Nothing is yielded until the first sentence is done, so callers can pull
+the header before committing to a response. A later failure is logged,
+removes the saved copy and re-raises mid-stream.
+"""
+import os
+import queue
+import re
+import struct
+import tempfile
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+from . import speech, tts_client
+
+# Per-call synthesis scripts run at once when no resident worker is up
+FALLBACK_CONCURRENCY = int(os.getenv("HEXFORGE_TTS_STREAM_FALLBACK", "2"))
+
+# Pause inserted between sentences
+SENTENCE_GAP_SECONDS = float(os.getenv("HEXFORGE_TTS_SENTENCE_GAP", "0.15"))
+
+# Sentences shorter than this ride along with the next one; longer than
+# MAX_SENTENCE_CHARS are split at clause or word boundaries
+MIN_SENTENCE_CHARS = 24
+MAX_SENTENCE_CHARS = 400
+
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+|\s+")
+
+# Data size written into the streamed header: as large as RIFF allows,
+# which players read as "until the stream ends"
+STREAM_DATA_BYTES = 0xFFFFFFFF - 36
+
+
+def split_long(sentence: str, max_chars: int = MAX_SENTENCE_CHARS) -> list[str]:
+    pieces, current = [], ""
+    for word in CLAUSE_BREAK.split(sentence):
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text: str) -> list[str]:
+    sentences, pending = [], ""
+    for raw in SENTENCE_BREAK.split(text):
+        raw = " ".join(raw.split())
+        if not raw:
+            continue
+        pending = f"{pending} {raw}" if pending else raw
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.extend(split_long(pending))
+            pending = ""
+    if pending:
+        if sentences and len(sentences[-1]) + len(pending) < MAX_SENTENCE_CHARS:
+            sentences[-1] = f"{sentences[-1]} {pending}"
+        else:
+            sentences.append(pending)
+    return sentences
+
+
+def wav_header(channels: int, sampwidth: int, rate: int, data_bytes: int = STREAM_DATA_BYTES) -> bytes:
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_bytes, b"WAVE",
+        b"fmt ", 16, 1, channels, rate, rate * channels * sampwidth, channels * sampwidth, sampwidth * 8,
+        b"data", data_bytes,
+    )
+
+
+def stream_sentences(sentences: list[str], out_path: Path, voice: str | None = None) -> Iterator[bytes]:
+    """
+    Yield one WAV (header first, then each sentence's PCM in order) while
+    the sentences synthesize in parallel; out_path gets the finished file.
+    """
+    sockets = tts_client.live_sockets()
+    slots: queue.Queue = queue.Queue()
+    for slot in sockets or [None] * max(1, FALLBACK_CONCURRENCY):
+        slots.put(slot)
+
+    tmp = tempfile.TemporaryDirectory(prefix="tts-stream-")
+
+    def synthesize(index: int, sentence: str) -> Path:
+        path = Path(tmp.name) / f"{index:05d}.wav"
+        slot = slots.get()
+        try:
+            if slot is None:
+                speech.synthesize_subprocess(sentence, path, voice)
+            else:
+                speech.synthesize_to(sentence, path, voice, socket_path=slot)
+        finally:
+            slots.put(slot)
+        return path
+
+    executor = ThreadPoolExecutor(max_workers=slots.qsize(), thread_name_prefix="tts-sentence")
+    futures = [executor.submit(synthesize, i, s) for i, s in enumerate(sentences)]
+    fmt, data_bytes = None, 0
+    try:
+        with out_path.open("wb") as saved:
+            for i, future in enumerate(futures):
+                with wave.open(str(future.result()), "rb") as w:
+                    params = (w.getnchannels(), w.getsampwidth(), w.getframerate())
+                    frames = w.readframes(w.getnframes())
+
+                if fmt is None:
+                    fmt = params
+                    header = wav_header(*fmt)
+                    saved.write(header)
+                    yield header
+                elif params != fmt:
+                    raise speech.SpeechError(f"Sentence {i} came back as {params}, expected {fmt}")
+
+                if i and SENTENCE_GAP_SECONDS > 0:
+                    channels, sampwidth, rate = fmt
+                    # 8-bit PCM is unsigned, so its silence is 0x80
+                    frames = (b"\x80" if sampwidth == 1 else b"\x00") * (
+                        int(rate * SENTENCE_GAP_SECONDS) * channels * sampwidth
+                    ) + frames
+                saved.write(frames)
+                data_bytes += len(frames)
+                yield frames
+
+            if fmt is not None:
+                saved.seek(0)
+                saved.write(wav_header(*fmt, data_bytes=data_bytes))
+    except BaseException as e:
+        if not isinstance(e, GeneratorExit):
+            print(f"[tts-stream] {out_path.name} failed: {e}")
+        out_path.unlink(missing_ok=True)
+        raise
+    finally:
+        # Sentences already synthesizing finish before their directory goes
+        executor.shutdown(wait=True, cancel_futures=True)
+        tmp.cleanup()
@@ -0,0 +1,100 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/uploads.py
+"""
+Streaming uploads for /stt/upload.
+
+The request body is copied to disk as it arrives: network chunks are
+gathered into UPLOAD_CHUNK_BYTES blocks, hashed (sha256) and written from
+the threadpool, so a multi-gigabyte recording never sits in memory and the
+event loop never blocks on disk. The file lands under a temporary name and
+is renamed into place only once the body is complete, so nothing picks up
+a half-written upload.
+"""
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+CONTENT_ROOT = Path("/mnt/hdd-storage/hexforge-content-engine")
+UPLOADS_ROOT = CONTENT_ROOT / "uploads"
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("HEXFORGE_UPLOAD_CHUNK_BYTES", str(4 * 1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("HEXFORGE_UPLOAD_MAX_BYTES", str(32 * 1024**3)))
+
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def safe_filename(name: str | None) -> str:
+    name = UNSAFE_NAME_CHARS.sub("_", Path(name or "").name).strip("._")
+    return name or "upload.bin"
+
+
+def upload_dir(project: str | None, part: str | None) -> Path:
+    """
+    Where an upload for project/part goes; save_stream() creates it.
+    """
+    return UPLOADS_ROOT / safe_filename(project or "scratch") / safe_filename(part or "part-1")
+
+
+def write_block(f, path: Path, digest, data: bytes):
+    """
+    Hash and write one block; runs in the threadpool. The first call (f is
+    None) creates path's directory and opens it. Returns the open file.
+    """
+    if f is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        f = path.open("wb")
+    digest.update(data)
+    f.write(data)
+    return f
+
+
+async def save_stream(
+    stream: AsyncIterator[bytes],
+    dest_dir: Path,
+    filename: str | None,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+) -> dict:
+    """
+    Write `stream` to dest_dir/<sha256 prefix>-<filename>, creating
+    dest_dir if needed. Returns {"path", "sha256", "bytes"}; raises
+    HTTPException(413) past max_bytes.
+    """
+    name = safe_filename(filename)
+    tmp_path = dest_dir / f".upload-{uuid.uuid4().hex}.part"
+    digest = hashlib.sha256()
+    size = 0
+    block = bytearray()
+
+    f = None
+    try:
+        async for chunk in stream:
+            size += len(chunk)
+            if size > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+            block += chunk
+            if len(block) >= UPLOAD_CHUNK_BYTES:
+                data = bytes(block)
+                block.clear()
+                f = await run_in_threadpool(write_block, f, tmp_path, digest, data)
+        if block:
+            f = await run_in_threadpool(write_block, f, tmp_path, digest, bytes(block))
+        if f is not None:
+            await run_in_threadpool(f.close)
+    except BaseException:
+        if f is not None:
+            f.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty upload")
+
+    sha256 = digest.hexdigest()
+    final_path = dest_dir / f"{sha256[:16]}-{name}"
+    os.replace(tmp_path, final_path)
+    return {"path": str(final_path), "sha256": sha256, "bytes": size}
@@ -0,0 +1,48 @@
+# /mnt/hdd-storage/hexforge-content-engine/media_api/worker_socket.py
+"""
+Client side of the resident model workers' unix-socket protocol (see
+linux/HexForgeEngine/scripts/socket_worker.py): one JSON request line,
+one JSON response line.
+
+Stdlib only, so the watcher scripts can import it without FastAPI installed.
+"""
+import json
+import socket
+from pathlib import Path
+
+CONNECT_TIMEOUT_SECONDS = 2.0
+
+
+class WorkerUnavailable(RuntimeError):
+    """
+    The worker isn't running (no socket, or nothing answering on it).
+    """
+
+
+def request(socket_path: Path, payload: dict, timeout: float) -> dict:
+    """
+    Send one request and return the worker's response. Raises
+    WorkerUnavailable if the worker can't be reached; a worker that
+    accepts but then times out raises OSError.
+    """
+    if not socket_path.exists():
+        raise WorkerUnavailable(f"no worker socket at {socket_path}")
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+        try:
+            sock.connect(str(socket_path))
+        except OSError as e:
+            raise WorkerUnavailable(f"worker not answering on {socket_path}: {e}") from e
+
+        sock.settimeout(timeout)
+        sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    finally:
+        sock.close()
+
+    if not line:
+        raise WorkerUnavailable(f"worker on {socket_path} closed the connection without replying")
+    return json.loads(line)
@@ -0,0 +1,19 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+# media_api is imported from the repo root, as the scripts do with BASE;
+# the engine scripts import each other as top-level modules
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(1, str(REPO_ROOT / "linux" / "HexForgeEngine" / "scripts"))
+
+from media_api import metrics  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_metrics(monkeypatch):
+    # Keep tests from writing to the real state/metrics.sqlite3
+    monkeypatch.setattr(metrics, "ENABLED", False)
@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+from media_api import blog_store
+from media_api.blog_store import INDEX_FILE, PARTS_FILE, BlogStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlogStore(tmp_path / "incoming-blogs")
+
+
+def test_append_many_offsets_are_contiguous(store):
+    first = store.append_many("p", [{"part": "part-1", "text": "one"}, {"part": "part-2", "text": "two"}])
+    second = store.append_many("p", [{"part": "part-3", "text": "three"}])
+
+    entries = first + second
+    assert entries[0]["offset"] == 0
+    for prev, entry in zip(entries, entries[1:]):
+        assert entry["offset"] == prev["offset"] + prev["length"]
+
+    parts_size = (store.project_dir("p") / PARTS_FILE).stat().st_size
+    assert entries[-1]["offset"] + entries[-1]["length"] == parts_size
+    assert store.index("p") == entries
+
+
+def test_read_returns_the_indexed_record(store):
+    entries = store.append_many("p", [{"part": "part-1", "text": "one"}, {"part": "part-2", "text": "two"}])
+
+    record = store.read("p", entries[1])
+    assert record["part"] == "part-2"
+    assert record["text"] == "two"
+    assert record["project"] == "p"
+    assert record["received_at"] == entries[1]["received_at"]
+
+
+def test_get_returns_newest_record_of_a_part(store):
+    store.append_many("p", [{"part": "part-1", "text": "draft"}])
+    store.append_many("p", [{"part": "part-1", "text": "final"}, {"part": "part-2", "text": "two"}])
+
+    assert store.get("p", "part-1")["text"] == "final"
+    assert sorted(store.latest("p")) == ["part-1", "part-2"]
+    assert store.get("p", "part-9") is None
+    assert store.get("other", "part-1") is None
+
+
+def test_projects_are_kept_apart(store):
+    store.append_many("a", [{"part": "part-1", "text": "a"}])
+    store.append_many("b", [{"part": "part-1", "text": "b"}])
+
+    assert store.projects() == ["a", "b"]
+    assert store.get("a", "part-1")["text"] == "a"
+    assert store.index("b")[0]["offset"] == 0
+
+
+def test_torn_index_line_is_skipped(store):
+    entries = store.append_many("p", [{"part": "part-1", "text": "one"}])
+    with (store.project_dir("p") / INDEX_FILE).open("a", encoding="utf-8") as f:
+        f.write(json.dumps({"offset": 99})[:5])
+
+    assert store.index("p") == entries
+
+
+@pytest.mark.parametrize("name", ["", ".", "..", "a/b", "../p", "a\\b"])
+def test_invalid_project_names_are_rejected(store, name):
+    with pytest.raises(ValueError):
+        store.project_dir(name)
+    with pytest.raises(ValueError):
+        store.append_many(name, [{"part": "part-1", "text": "x"}])
+
+
+def test_projects_lists_only_indexed_dirs(store):
+    assert store.projects() == []
+    store.append_many("beta", [{"part": "part-1", "text": "b"}])
+    store.append_many("alpha", [{"part": "part-1", "text": "a"}])
+    (store.root / "stray").mkdir()
+    assert store.projects() == ["alpha", "beta"]
+
+
+def test_cli_get_and_list(store, monkeypatch, capsys):
+    monkeypatch.setattr(blog_store, "_store", store)
+    store.append_many("p", [{"part": "part-1", "text": "hello"}])
+
+    assert blog_store.main(["get", "p", "part-1", "--text"]) == 0
+    assert capsys.readouterr().out == "hello\n"
+
+    assert blog_store.main(["list"]) == 0
+    assert json.loads(capsys.readouterr().out) == ["p"]
+
+    assert blog_store.main(["get", "p", "part-9"]) == 1
+    assert "No part 'part-9'" in capsys.readouterr().err
@@ -0,0 +1,110 @@
+from early_stopping import StoppingPolicy
+
+
+def policy(**kwargs):
+    defaults = dict(stop_probability=0.1, min_improvement=0.05, confidence_z=1.28,
+                    min_rounds=2, max_empty_rounds=2, max_stagnant_rounds=0)
+    return StoppingPolicy(4, **{**defaults, **kwargs})
+
+
+def test_no_scores_yet_continues():
+    p = policy()
+    assert p.decide(-1.0, 10.0)["stop"] is False
+
+
+def test_empty_rounds_stop():
+    p = policy(max_empty_rounds=2)
+    p.observe_round([])
+    assert p.decide(-1.0, 10.0)["stop"] is False
+    p.observe_round([])
+    decision = p.decide(-1.0, 10.0)
+    assert decision["stop"] is True
+    assert "no scored renders" in decision["reason"]
+
+
+def test_a_scored_round_resets_empty_count():
+    p = policy(max_empty_rounds=2)
+    p.observe_round([])
+    p.observe_round([5.0])
+    p.observe_round([])
+    assert p.empty_rounds == 1
+
+
+def test_target_reached_stops():
+    p = policy()
+    p.observe_round([7.0, 8.0])
+    decision = p.decide(8.0, 7.5)
+    assert decision["stop"] is True
+    assert "target score reached" in decision["reason"]
+
+
+def test_min_rounds_before_statistics():
+    p = policy(min_rounds=2)
+    p.observe_round([5.0, 5.0, 5.0, 5.0])
+    decision = p.decide(9.0, 10.0)
+    assert decision["stop"] is False
+    assert decision["p_improve"] is not None
+
+
+def test_stops_when_improvement_is_unlikely():
+    p = policy()
+    # Tight scores far below the incumbent
+    p.observe_round([5.0, 5.01, 4.99, 5.0])
+    p.observe_round([5.0, 5.02, 4.98, 5.0])
+    decision = p.decide(7.0, 10.0)
+    assert decision["stop"] is True
+    assert decision["p_improve"] < 0.1
+
+
+def test_continues_while_scores_are_close_and_noisy():
+    p = policy()
+    p.observe_round([6.0, 7.0, 5.5, 6.8])
+    p.observe_round([6.5, 7.1, 6.0, 6.9])
+    decision = p.decide(7.1, 10.0)
+    assert decision["stop"] is False
+    assert decision["p_improve"] >= 0.1
+
+
+def test_p_improve_grows_with_spread():
+    tight, noisy = policy(), policy()
+    tight.observe_round([6.0, 6.01, 5.99, 6.0])
+    noisy.observe_round([5.0, 7.0, 5.5, 6.5])
+    assert noisy.p_improve(6.5) > tight.p_improve(6.5)
+
+
+def test_pooled_stddev_uses_within_round_spread():
+    p = policy()
+    p.observe_round([1.0, 3.0])
+    p.observe_round([10.0, 12.0])
+    # Each round has sd sqrt(2); the gap between rounds doesn't count
+    assert abs(p.pooled_stddev() - 2 ** 0.5) < 1e-9
+
+
+def test_stagnant_rounds_off_by_default():
+    p = policy(stop_probability=0.0)
+    for _ in range(5):
+        p.observe_round([5.0, 6.0])
+        assert p.decide(6.0, 10.0)["stop"] is False
+
+
+def test_stagnant_rounds_stop_when_set():
+    p = policy(stop_probability=0.0, max_stagnant_rounds=2)
+    p.observe_round([5.0, 6.0])
+    assert p.decide(6.0, 10.0)["stop"] is False
+    p.observe_round([5.0, 5.5])
+    assert p.decide(6.0, 10.0)["stop"] is False
+    p.observe_round([5.0, 5.5])
+    decision = p.decide(6.0, 10.0)
+    assert decision["stop"] is True
+    assert "no new best for 2" in decision["reason"]
+
+
+def test_new_best_resets_stagnant_count():
+    p = policy(stop_probability=0.0, max_stagnant_rounds=2)
+    p.observe_round([6.0])
+    p.decide(6.0, 10.0)
+    p.observe_round([5.0])
+    p.decide(6.0, 10.0)
+    p.observe_round([6.5])
+    p.decide(6.5, 10.0)
+    assert p.stagnant_rounds == 0
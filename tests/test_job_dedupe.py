@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+from media_api import job_queue
+from media_api.job_queue import JobQueue, asset_records
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite3")
+
+
+def image_payload(project="p", part="part-1", prompt="a castle", **extra):
+    return {"project": project, "part": part, "prompt": prompt, **extra}
+
+
+def finish(queue, job, assets):
+    queue.claim("image", "w1")
+    queue.complete(job["id"], "w1", {"assets": asset_records(assets)})
+
+
+def test_idempotency_key_fills_defaults():
+    explicit = image_payload(engine="simple", num_images=4, workflow="hexforge-default")
+    assert job_queue.idempotency_key("image", image_payload()) == job_queue.idempotency_key("image", explicit)
+    assert job_queue.idempotency_key("image", image_payload()) != job_queue.idempotency_key(
+        "image", image_payload(prompt="a different castle")
+    )
+    # Fields outside IDEMPOTENCY_FIELDS don't matter
+    assert job_queue.idempotency_key("image", image_payload()) == job_queue.idempotency_key(
+        "image", image_payload(priority=5)
+    )
+
+
+def test_identical_submission_attaches_to_in_flight_job(queue):
+    first = queue.enqueue("image", image_payload())
+    second = queue.enqueue("image", image_payload(), priority=3)
+
+    assert first["deduplicated"] is None
+    assert second["id"] == first["id"]
+    assert second["deduplicated"] == "in_flight"
+    assert queue.get(first["id"])["priority"] == 3
+    assert len(queue.list_jobs()) == 1
+
+
+def test_done_job_is_reused_while_assets_are_intact(queue, tmp_path):
+    asset = tmp_path / "simple.png"
+    asset.write_bytes(b"png")
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1")
+    queue.complete(job["id"], "w1", {"assets": asset_records([asset])})
+
+    again = queue.enqueue("image", image_payload())
+    assert again["id"] == job["id"]
+    assert again["deduplicated"] == "cached"
+
+    # A later render overwrote the asset: render again
+    asset.write_bytes(b"other png")
+    fresh = queue.enqueue("image", image_payload())
+    assert fresh["id"] != job["id"]
+    assert fresh["deduplicated"] is None
+
+
+def test_dedupe_can_be_disabled(queue):
+    first = queue.enqueue("image", image_payload())
+    second = queue.enqueue("image", image_payload(), dedupe=False)
+    assert second["id"] != first["id"]
+
+
+def test_assets_are_hashed_outside_the_write_transaction(queue, tmp_path, monkeypatch):
+    asset = tmp_path / "simple.png"
+    asset.write_bytes(b"png")
+    job = queue.enqueue("image", image_payload())
+    finish(queue, job, [asset])
+
+    def assert_unlocked(result):
+        # Another writer must still be able to take the lock while we hash
+        conn = sqlite3.connect(str(queue.db_path), timeout=0, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("ROLLBACK")
+        finally:
+            conn.close()
+        return True
+
+    monkeypatch.setattr(job_queue, "assets_still_valid", assert_unlocked)
+    assert queue.enqueue("image", image_payload())["deduplicated"] == "cached"
+
+
+def test_cached_job_changed_after_hashing_is_not_reused(queue, tmp_path, monkeypatch):
+    asset = tmp_path / "simple.png"
+    asset.write_bytes(b"png")
+    job = queue.enqueue("image", image_payload())
+    finish(queue, job, [asset])
+
+    find_cached = queue._find_cached
+
+    def then_requeued(idem_key):
+        cached = find_cached(idem_key)
+        # Someone re-ran the job between the hash and the transaction
+        with queue._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', updated_at = updated_at + 1 WHERE id = ?",
+                (cached["id"],),
+            )
+        return cached
+
+    monkeypatch.setattr(queue, "_find_cached", then_requeued)
+    fresh = queue.enqueue("image", image_payload())
+    assert fresh["id"] != job["id"]
+    assert fresh["deduplicated"] is None
@@ -0,0 +1,57 @@
+from media_api.job_logs import JobLog, _file_tail, job_log_path, read_tail
+
+
+def test_job_log_path(tmp_path):
+    assert job_log_path(7, tmp_path) == tmp_path / "job-7.log"
+
+
+def test_write_keeps_a_bounded_tail(tmp_path):
+    with JobLog(tmp_path / "job-1.log", tail_lines=3) as log:
+        for i in range(5):
+            log.write(f"line {i}\n")
+        assert log.tail() == ["line 2", "line 3", "line 4"]
+        assert log.tail(1) == ["line 4"]
+    assert (tmp_path / "job-1.log").read_text().splitlines()[0] == "line 0"
+
+
+def test_rotation_shifts_backups_and_drops_the_oldest(tmp_path):
+    path = tmp_path / "job-1.log"
+    # Every line is 7 bytes, so each write past the first rotates
+    with JobLog(path, max_bytes=7, backups=2) as log:
+        for i in range(4):
+            log.write(f"line {i}")
+
+    assert path.read_text() == "line 3\n"
+    assert (tmp_path / "job-1.log.1").read_text() == "line 2\n"
+    assert (tmp_path / "job-1.log.2").read_text() == "line 1\n"
+    assert not (tmp_path / "job-1.log.3").exists()
+
+
+def test_rotation_without_backups_truncates(tmp_path):
+    path = tmp_path / "job-1.log"
+    with JobLog(path, max_bytes=7, backups=0) as log:
+        log.write("line 0")
+        log.write("line 1")
+    assert path.read_text() == "line 1\n"
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_file_tail_reads_across_blocks(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_text("".join(f"line {i}\n" for i in range(1000)))
+    assert _file_tail(path, 3, block_size=16) == ["line 997", "line 998", "line 999"]
+
+
+def test_read_tail_reaches_into_the_rotated_file(tmp_path):
+    path = tmp_path / "job-1.log"
+    with JobLog(path, max_bytes=14, backups=2) as log:
+        for i in range(3):
+            log.write(f"line {i}")
+
+    assert path.read_text() == "line 2\n"
+    assert read_tail(path, 3) == ["line 0", "line 1", "line 2"]
+    assert read_tail(path, 1) == ["line 2"]
+
+
+def test_read_tail_missing_log(tmp_path):
+    assert read_tail(tmp_path / "job-404.log") == []
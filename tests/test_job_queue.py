@@ -0,0 +1,152 @@
+import json
+import time
+
+import pytest
+
+from media_api import job_queue
+from media_api.job_queue import JobQueue, import_job_file
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite3")
+
+
+def make_available(queue, job_id):
+    """
+    Skip a job's backoff.
+    """
+    with queue._connect() as conn:
+        conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+
+
+def image_payload(project="p", part="part-1", prompt="a castle", **extra):
+    return {"project": project, "part": part, "prompt": prompt, **extra}
+
+
+# -----------------------
+#  Claim / lease / fail
+# -----------------------
+def test_claim_leases_job_to_one_worker(queue):
+    job = queue.enqueue("image", image_payload())
+
+    claimed = queue.claim("image", "w1")
+    assert claimed["id"] == job["id"]
+    assert claimed["status"] == "running"
+    assert claimed["lease_owner"] == "w1"
+    assert claimed["attempts"] == 1
+    assert queue.claim("image", "w2") is None
+
+
+def test_complete_only_by_lease_owner(queue):
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1")
+
+    assert queue.complete(job["id"], "w2", {"x": 1}) is False
+    assert queue.get(job["id"])["status"] == "running"
+
+    assert queue.complete(job["id"], "w1", {"x": 1}) is True
+    done = queue.get(job["id"])
+    assert done["status"] == "done"
+    assert done["result"] == {"x": 1}
+    assert done["lease_owner"] is None
+
+
+def test_fail_backs_off_exponentially_then_gives_up(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "BACKOFF_BASE_SECONDS", 30.0)
+    job = queue.enqueue("image", image_payload(), max_attempts=3)
+
+    for attempt, delay in ((1, 30), (2, 60)):
+        make_available(queue, job["id"])
+        assert queue.claim("image", "w1")["attempts"] == attempt
+        before = time.time()
+        assert queue.fail(job["id"], "w1", "boom") == "queued"
+        retried = queue.get(job["id"])
+        assert retried["last_error"] == "boom"
+        assert before + delay <= retried["available_at"] <= time.time() + delay
+        # Backing off: not claimable yet
+        assert queue.claim("image", "w1") is None
+
+    make_available(queue, job["id"])
+    queue.claim("image", "w1")
+    assert queue.fail(job["id"], "w1", "boom") == "failed"
+    assert queue.get(job["id"])["finished_at"] is not None
+
+
+def test_fail_without_retry_fails_at_once(queue):
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1")
+    assert queue.fail(job["id"], "w1", "bad payload", retry=False) == "failed"
+
+
+def test_fail_by_lost_worker_is_ignored(queue):
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1", lease_seconds=-1)
+    assert queue.requeue_expired() == [job["id"]]
+    make_available(queue, job["id"])
+    queue.claim("image", "w2")
+
+    assert queue.fail(job["id"], "w1", "late failure") == "lost"
+    assert queue.complete(job["id"], "w1") is False
+    job = queue.get(job["id"])
+    assert job["status"] == "running"
+    assert job["lease_owner"] == "w2"
+
+
+def test_requeue_expired_retries_with_backoff(queue):
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1", lease_seconds=-1)
+
+    assert queue.requeue_expired() == [job["id"]]
+    requeued = queue.get(job["id"])
+    assert requeued["status"] == "queued"
+    assert "lease expired" in requeued["last_error"]
+    assert requeued["available_at"] > time.time()
+
+
+def test_requeue_expired_leaves_live_and_finished_jobs(queue):
+    live = queue.enqueue("image", image_payload(part="live"))
+    done = queue.enqueue("image", image_payload(part="done"))
+    queue.claim("image", "w1")
+    queue.claim("image", "w2", lease_seconds=-1)
+    queue.complete(done["id"], "w2")
+
+    assert queue.requeue_expired() == []
+    assert queue.get(live["id"])["status"] == "running"
+    assert queue.get(done["id"])["status"] == "done"
+
+
+def test_renew_lease_requires_owner(queue):
+    job = queue.enqueue("image", image_payload())
+    queue.claim("image", "w1", lease_seconds=-1)
+    assert queue.renew_lease(job["id"], "w2") is False
+    assert queue.renew_lease(job["id"], "w1") is True
+    assert queue.requeue_expired() == []
+
+
+def test_enqueue_available_at_delays_claim(queue):
+    queue.enqueue("image", image_payload(), available_at=time.time() + 3600)
+    assert queue.claim("image", "w1") is None
+
+
+def test_claim_filters_by_kind_and_pool(queue):
+    queue.enqueue("image", image_payload(), pool="render")
+    queue.enqueue("voice", {"project": "p", "part": "v", "text": "hi"}, pool="cpu")
+
+    assert queue.claim("image", "w1", pool="cpu") is None
+    assert queue.claim("voice", "w1", pool="cpu")["part"] == "v"
+    assert queue.claim("image", "w1", pool="render")["part"] == "part-1"
+
+
+# -----------------------
+#  JSON-drop import
+# -----------------------
+def test_import_job_file_requires_text_for_voice(queue, tmp_path):
+    drop = tmp_path / "job-1.json"
+    drop.write_text(json.dumps({"project": "p", "part": "part-1"}), encoding="utf-8")
+    with pytest.raises(ValueError, match="missing 'text'"):
+        import_job_file(queue, drop, kind="voice", pool="cpu")
+    assert queue.list_jobs() == []
+
+    drop.write_text(json.dumps({"project": "p", "part": "part-1", "text": "hi"}), encoding="utf-8")
+    assert import_job_file(queue, drop, kind="voice", pool="cpu")["kind"] == "voice"
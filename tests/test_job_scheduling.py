@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from media_api.job_queue import JobQueue, import_job_file, job_cost
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(tmp_path / "jobs.sqlite3")
+
+
+def image_payload(project="p", part="part-1", prompt="a castle", **extra):
+    return {"project": project, "part": part, "prompt": prompt, **extra}
+
+
+def claim_order(queue, n):
+    return [queue.claim("image", f"w{i}")["part"] for i in range(n)]
+
+
+def test_claim_prefers_priority_then_cost_then_age(queue):
+    queue.enqueue("image", image_payload(part="old-optimizer", engine="optimizer"))
+    queue.enqueue("image", image_payload(part="old-simple"))
+    queue.enqueue("image", image_payload(part="new-simple"))
+    queue.enqueue("image", image_payload(part="urgent-optimizer", engine="optimizer"), priority=5)
+
+    assert claim_order(queue, 4) == ["urgent-optimizer", "old-simple", "new-simple", "old-optimizer"]
+
+
+def test_claim_shares_pool_fairly_between_projects(queue):
+    for i in range(3):
+        queue.enqueue("image", image_payload(project="busy", part=f"busy-{i}"))
+    queue.enqueue("image", image_payload(project="quiet", part="quiet-0"))
+
+    # busy-0 is oldest; once it runs, the quiet project goes ahead of busy-1
+    assert claim_order(queue, 3) == ["busy-0", "quiet-0", "busy-1"]
+
+
+
+def test_job_cost_by_engine():
+    assert job_cost("image", image_payload()) == 1
+    assert job_cost("image", image_payload(engine="optimizer")) == 10
+    assert job_cost("voice", {"text": "hi"}) == 1
+
+
+def test_import_job_file_reads_priority(queue, tmp_path):
+    drop = tmp_path / "job-1.json"
+    drop.write_text(json.dumps(image_payload(priority=7)), encoding="utf-8")
+    job = import_job_file(queue, drop, kind="image", pool="render")
+    assert job["priority"] == 7
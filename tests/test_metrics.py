@@ -0,0 +1,75 @@
+import math
+
+import pytest
+
+from media_api import metrics
+from media_api.metrics import MetricsStore, label_key, queue_gauges
+
+BUCKETS = (0.5, 1, math.inf)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MetricsStore(tmp_path / "metrics.sqlite3")
+
+
+def test_counter_render(store):
+    store.inc("hexforge_jobs_total", labels={"kind": "image", "status": "done"})
+    store.inc("hexforge_jobs_total", 2, labels={"kind": "image", "status": "done"})
+
+    assert store.render(buckets=BUCKETS).splitlines() == [
+        "# HELP hexforge_jobs_total Queue jobs finished, by kind, engine and status",
+        "# TYPE hexforge_jobs_total counter",
+        'hexforge_jobs_total{kind="image",status="done"} 3',
+    ]
+
+
+def test_histogram_buckets_are_cumulative(store):
+    for seconds in (0.2, 0.7, 0.9, 5.0):
+        store.observe("hexforge_stage_seconds", seconds, labels={"stage": "score"}, buckets=BUCKETS)
+
+    lines = store.render(buckets=BUCKETS).splitlines()
+    assert lines[1] == "# TYPE hexforge_stage_seconds histogram"
+    assert lines[2:] == [
+        'hexforge_stage_seconds_bucket{stage="score",le="0.5"} 1',
+        'hexforge_stage_seconds_bucket{stage="score",le="1.0"} 3',
+        'hexforge_stage_seconds_bucket{stage="score",le="+Inf"} 4',
+        'hexforge_stage_seconds_sum{stage="score"} 6.8',
+        'hexforge_stage_seconds_count{stage="score"} 4',
+    ]
+
+
+def test_gauges_and_untyped_names(store):
+    store.inc("custom_total", labels={"note": 'say "hi"\n'})
+    text = store.render(gauges=queue_gauges({"image": {"queued": 2}}), buckets=BUCKETS)
+
+    assert "# TYPE custom_total untyped" in text
+    assert 'custom_total{note="say \\"hi\\"\\n"} 1' in text
+    assert "# TYPE hexforge_queue_jobs gauge" in text
+    assert 'hexforge_queue_jobs{kind="image",status="queued"} 2' in text
+    assert text.endswith("\n")
+
+
+def test_label_key_drops_none_and_sorts():
+    assert label_key({"b": 1, "a": "x", "c": None}) == '{"a": "x", "b": "1"}'
+
+
+def test_stage_timer_counts_failures(store, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_store", store)
+
+    @metrics.stage_timer("score", failed=lambda r: r is None)
+    def score(ok):
+        return 1.0 if ok else None
+
+    score(True)
+    score(False)
+    text = store.render(buckets=BUCKETS)
+    assert 'hexforge_stage_seconds_count{stage="score"} 2' in text
+    assert 'hexforge_stage_failures_total{stage="score"} 1' in text
+
+
+def test_disabled_recording_is_a_no_op(store, monkeypatch):
+    monkeypatch.setattr(metrics, "_store", store)
+    metrics.inc("hexforge_jobs_total")
+    assert store.render() == "\n"
@@ -0,0 +1,98 @@
+import csv
+import json
+
+from loop_prompt_generator import SCORE_COLUMNS, log_score
+from prompt_history import PromptHistoryIndex, warm_start_pairs
+
+HEADER = ["round", "variant", "filename", "prompt", "negative_prompt",
+          "score", "clip", "aesthetic", "timestamp"]
+
+
+def write_scores(path, rows, header=SCORE_COLUMNS):
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def score_row(prompt, score, target, negative="blurry"):
+    return [1, 1, "img.png", prompt, negative, score, 0.3, 5.0, "2026-01-01T00:00:00", target]
+
+
+def test_query_matches_on_target_prompt():
+    index = PromptHistoryIndex()
+    # Rendered prompt looks related, but the score was measured against
+    # an unrelated target
+    index.add("neon server racks glowing", "", 9.0, "a.csv", target="watercolor cat in a garden")
+    index.add("dark server room", "", 6.0, "b.csv", target="neon server racks glowing")
+
+    hits = index.query("neon server racks glowing", k=5, min_similarity=0.5)
+    assert [h["prompt"] for h in hits] == ["dark server room"]
+    assert hits[0]["target_prompt"] == "neon server racks glowing"
+
+
+def test_add_keeps_best_score_per_target():
+    index = PromptHistoryIndex()
+    index.add("red fox", "", 4.0, "a.csv", target="fox in snow")
+    index.add("red fox", "", 6.0, "b.csv", target="fox in snow")
+    index.add("red fox", "", 2.0, "c.csv", target="fox in forest")
+
+    assert len(index.entries) == 2
+    assert index.entries[("fox in snow", "red fox", "")]["score"] == 6.0
+    assert index.entries[("fox in snow", "red fox", "")]["source"] == "b.csv"
+
+
+def test_query_fills_missing_negative():
+    index = PromptHistoryIndex()
+    index.add("red fox", "", 4.0, "a.csv")
+    hits = index.query("red fox", fallback_negative="lowres")
+    assert hits[0]["negative_prompt"] == "lowres"
+
+
+def test_build_reads_target_column_and_legacy_rows(tmp_path):
+    write_scores(tmp_path / "p_1_optimizer_scores.csv", [
+        score_row("glowing racks, cinematic", 7.0, "glowing racks"),
+        [1, 2, "img.png", "failed", "", 0.0, 0.0, 0.0, "t", "glowing racks"],
+    ])
+    # Written before target_prompt existed: rows target their own prompt
+    with (tmp_path / "p_2_optimizer_scores.csv").open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerow([1, 1, "img.png", "old prompt", "", 5.0, 0.3, 5.0, "t"])
+    (tmp_path / "p_3_optimizer_summary.json").write_text(json.dumps({
+        "best_score": 8.0,
+        "best_prompt": "glowing racks, refined",
+        "best_negative_prompt": "blurry",
+        "target_prompt": "glowing racks",
+    }))
+
+    index = PromptHistoryIndex.build(tmp_path)
+    assert set(index.entries) == {
+        ("glowing racks", "glowing racks, cinematic", "blurry"),
+        ("old prompt", "old prompt", ""),
+        ("glowing racks", "glowing racks, refined", "blurry"),
+    }
+
+
+def test_warm_start_pairs_skips_the_job_pair(tmp_path):
+    write_scores(tmp_path / "p_1_optimizer_scores.csv", [
+        score_row("glowing racks", 6.0, "glowing racks"),
+        score_row("glowing racks, volumetric light", 8.0, "glowing racks"),
+    ])
+    pairs = warm_start_pairs("glowing racks", "blurry", k=2, logs_dir=tmp_path)
+    assert pairs == [("glowing racks, volumetric light", "blurry")]
+
+
+def test_log_score_migrates_legacy_csv(tmp_path):
+    path = tmp_path / "p_1_optimizer_scores.csv"
+    with path.open("w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerow([1, 1, "img.png", "old prompt", "", 5.0, 0.3, 5.0, "t"])
+
+    log_score(path, score_row("new prompt", 6.0, "job prompt"))
+
+    with path.open(newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["target_prompt"] for r in rows] == ["old prompt", "job prompt"]
+    assert rows[0]["score"] == "5.0"
@@ -0,0 +1,45 @@
+from prompt_memory import PromptMemory, normalize_prompt
+
+
+def test_normalize_ignores_case_and_punctuation():
+    assert normalize_prompt("Neon, Server  RACKS!") == normalize_prompt("neon server racks")
+
+
+def test_record_merges_normalized_repeats():
+    memory = PromptMemory()
+    memory.record("Neon server racks.", "blurry", 4.0)
+    memory.record("neon server racks", "Blurry", 6.0)
+    assert len(memory.entries) == 1
+    assert memory.recorded_score(memory.entries[0]) == 5.0
+
+
+def test_find_duplicate_exact_match():
+    memory = PromptMemory()
+    memory.record("neon server racks", "blurry", 4.0)
+    dup = memory.find_duplicate("NEON server racks!", "blurry")
+    assert dup is memory.entries[0]
+
+
+def test_find_duplicate_within_threshold():
+    memory = PromptMemory(threshold=0.8)
+    memory.record("neon server racks glowing in a dark homelab", "blurry", 4.0)
+    assert memory.find_duplicate("neon server racks glowing in dark homelab", "blurry") is not None
+
+
+def test_find_duplicate_new_prompt():
+    memory = PromptMemory()
+    memory.record("neon server racks", "blurry", 4.0)
+    assert memory.find_duplicate("watercolor cat in a garden", "blurry") is None
+
+
+def test_negative_prompt_is_part_of_the_key():
+    memory = PromptMemory(threshold=1.01)
+    memory.record("neon server racks", "blurry", 4.0)
+    assert memory.find_duplicate("neon server racks", "lowres") is None
+
+
+def test_rendered_prompts_keeps_the_latest():
+    memory = PromptMemory()
+    for i in range(7):
+        memory.record(f"prompt number {i}", "", 1.0)
+    assert memory.rendered_prompts(limit=3) == ["prompt number 4", "prompt number 5", "prompt number 6"]
@@ -0,0 +1,78 @@
+import pytest
+
+from prompt_surrogate import PromptSurrogate, aggregate_samples
+
+
+def sample(prompt, score, count=1, target=None, negative=""):
+    return {"target_prompt": target or prompt, "prompt": prompt,
+            "negative_prompt": negative, "score": score, "count": count}
+
+
+def test_predict_follows_the_nearest_prompt():
+    model = PromptSurrogate([
+        sample("neon server racks glowing", 8.0),
+        sample("watercolor cat in a garden", 2.0),
+    ])
+    pred, conf = model.predict("neon server racks glowing")
+    assert conf == pytest.approx(1.0)
+    assert pred > 7.0
+
+
+def test_predict_without_neighbours_returns_the_mean():
+    model = PromptSurrogate([sample("red fox", 4.0, count=3), sample("blue whale", 8.0)])
+    pred, conf = model.predict("abstract geometry")
+    assert conf == 0.0
+    assert pred == pytest.approx(5.0)
+
+
+def test_predict_discounts_samples_scored_against_another_target():
+    model = PromptSurrogate([sample("neon server racks", 9.0, target="watercolor cat")])
+    _, own = model.predict("neon server racks")
+    _, other = model.predict("neon server racks", target="watercolor cat")
+    assert own < other == pytest.approx(1.0)
+
+
+def test_rank_candidates_best_first():
+    model = PromptSurrogate([
+        sample("glowing racks cinematic", 8.0),
+        sample("glowing racks flat", 3.0),
+    ])
+    ranked = model.rank_candidates([("glowing racks flat", ""), ("glowing racks cinematic", "")])
+    assert [pair[0] for _, _, pair in ranked] == ["glowing racks cinematic", "glowing racks flat"]
+
+
+def test_add_observation_averages_repeats():
+    model = PromptSurrogate([])
+    model.add_observation("red fox", "", 4.0, target="fox")
+    model.add_observation("red fox", "", 6.0, target="fox")
+    model.add_observation("red fox", "", 1.0)
+    assert len(model.samples) == 2
+    assert model.samples[0]["score"] == 5.0
+    assert model.samples[0]["count"] == 2
+
+
+def test_leave_one_out_prior_excludes_the_held_out_sample():
+    # No neighbours clear the similarity floor, so each held-out sample is
+    # predicted by the prior alone: the other sample's score, not the mean
+    # of both
+    model = PromptSurrogate([sample("red fox", 2.0), sample("blue whale", 8.0)])
+    error = model.leave_one_out_error()
+    assert error["mae"] == pytest.approx(6.0)
+    assert error["n"] == 2
+
+
+def test_leave_one_out_needs_two_samples():
+    assert PromptSurrogate([sample("red fox", 2.0)]).leave_one_out_error()["mae"] == 0.0
+
+
+def test_aggregate_samples_groups_by_target():
+    rows = [
+        {"prompt": "red fox", "negative_prompt": "", "score": "4", "target_prompt": "fox"},
+        {"prompt": "red fox", "negative_prompt": "", "score": "6", "target_prompt": "fox"},
+        {"prompt": "red fox", "negative_prompt": "", "score": "1"},
+    ]
+    samples = sorted(aggregate_samples(rows), key=lambda s: s["target_prompt"])
+    assert [(s["target_prompt"], s["score"], s["count"]) for s in samples] == [
+        ("fox", 5.0, 2),
+        ("red fox", 1.0, 1),
+    ]
@@ -0,0 +1,144 @@
+import os
+import uuid
+
+import pytest
+
+from media_api import result_cache, speech
+from media_api.result_cache import ResultCache, audio_digest, known_digest, stt_key, tts_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(tmp_path / "cache" / "tts", max_bytes=10**9)
+
+
+def put_entry(cache, tmp_path, key, size=1000, mtime=None):
+    artifact = tmp_path / f"{key}.wav"
+    artifact.write_bytes(b"x" * size)
+    meta = cache.put(key, artifact, {"engine": "test"})
+    if mtime is not None:
+        for p in (cache.meta_path(key), meta["path"]):
+            os.utime(p, (mtime, mtime))
+    return meta
+
+
+def entry_bytes(cache, key):
+    return sum(p.stat().st_size for p in cache.meta_path(key).parent.glob(f"{key}*"))
+
+
+def test_keys_depend_on_every_input():
+    assert tts_key("hello", None) == tts_key("hello", "default")
+    assert tts_key("hello", "a") != tts_key("hello", "b")
+    assert tts_key("hello", None, version="v1") != tts_key("hello", None, version="v2")
+    assert stt_key("abc", "base", "en") != stt_key("abc", "small", "en")
+    assert stt_key("abc", "base", "en") != stt_key("abc", "base", "en", long_form=True)
+
+
+def test_put_then_get(cache, tmp_path):
+    key = "a" * 64
+    put_entry(cache, tmp_path, key)
+
+    meta = cache.get(key)
+    assert meta["engine"] == "test"
+    assert meta["key"] == key
+    assert open(meta["path"], "rb").read() == b"x" * 1000
+    assert cache.get("b" * 64) is None
+
+
+def test_entry_survives_source_removal(cache, tmp_path):
+    key = "a" * 64
+    put_entry(cache, tmp_path, key)
+    (tmp_path / f"{key}.wav").unlink()
+    assert cache.get(key) is not None
+
+
+def test_missing_artifact_is_a_miss(cache, tmp_path):
+    key = "a" * 64
+    meta = put_entry(cache, tmp_path, key)
+    os.unlink(meta["path"])
+    assert cache.get(key) is None
+    assert not cache.meta_path(key).exists()
+
+
+def test_evict_removes_least_recently_used(cache, tmp_path):
+    keys = ["a" * 64, "b" * 64, "c" * 64]
+    for i, key in enumerate(keys):
+        put_entry(cache, tmp_path, key, mtime=1000 + i)
+    # A hit makes the oldest entry the most recently used
+    assert cache.get(keys[0]) is not None
+
+    # Room for a bit over two entries: one has to go
+    one = entry_bytes(cache, keys[0])
+    cache.max_bytes = int(one * 2.3)
+    assert cache.evict() == 1
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[2]) is not None
+
+
+def test_evict_trims_below_budget(cache, tmp_path):
+    keys = [c * 64 for c in "abcde"]
+    for i, key in enumerate(keys):
+        put_entry(cache, tmp_path, key, mtime=1000 + i)
+
+    one = entry_bytes(cache, keys[0])
+    cache.max_bytes = int(one * 4.2)
+    # Over budget by less than one entry, but eviction trims down to
+    # EVICT_TO_FRACTION of it (~3.8 entries), so the two oldest go
+    assert cache.evict() == 2
+    assert [cache.get(k) is not None for k in keys] == [False, False, True, True, True]
+
+
+def test_under_budget_evicts_nothing(cache, tmp_path):
+    put_entry(cache, tmp_path, "a" * 64)
+    assert cache.evict() == 0
+
+
+def test_known_digest_only_after_hashing(tmp_path):
+    audio = tmp_path / "a.wav"
+    audio.write_bytes(b"abc")
+    assert known_digest(audio) is None
+
+    digest = audio_digest(audio)
+    assert known_digest(audio) == digest
+
+    # Changed file: the remembered digest no longer applies
+    audio.write_bytes(b"abcd")
+    assert known_digest(audio) is None
+    assert known_digest(tmp_path / "missing.wav") is None
+
+
+@pytest.fixture
+def speech_dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(speech, "CONTENT_ROOT", tmp_path / "content")
+    monkeypatch.setattr(result_cache, "_tts_cache", ResultCache(tmp_path / "cache" / "tts", 10**9))
+    monkeypatch.setattr(result_cache, "_stt_cache", ResultCache(tmp_path / "cache" / "stt", 10**9))
+    return tmp_path
+
+
+def test_tts_hit_is_linked_into_the_requested_assets_dir(speech_dirs):
+    wav = speech_dirs / "fresh.wav"
+    wav.write_bytes(b"RIFF")
+    result_cache.get_tts_cache().put(tts_key("hello", None), wav, {"engine": "test"})
+
+    hit = speech.cached_tts("hello", None, "proj", "part-2")
+    audio_dir = speech_dirs / "content" / "assets" / "proj" / "part-2" / "audio"
+    assert hit["cached"] is True
+    assert os.path.dirname(hit["path"]) == str(audio_dir)
+    assert open(hit["path"], "rb").read() == b"RIFF"
+
+    # Each hit gets its own file, so one project can't clobber another's
+    assert speech.cached_tts("hello", None, "proj", "part-2")["path"] != hit["path"]
+
+
+def test_stt_cache_distinguishes_long_form(speech_dirs):
+    transcript = speech_dirs / f"transcript-{uuid.uuid4().hex}.txt"
+    transcript.write_text("hello there")
+    sha = "f" * 64
+    result_cache.get_stt_cache().put(stt_key(sha), transcript, {"engine": "worker:whisper"})
+
+    assert speech.cached_stt(sha, long_form=True) is None
+    hit = speech.cached_stt(sha, project="proj", part="part-1")
+    assert hit["transcript"] == "hello there"
+    assert "/assets/proj/part-1/transcripts/" in hit["path"]
@@ -0,0 +1,60 @@
+import pytest
+
+from retry_failed_jobs import classify_db_job, classify_text, payload_problem
+
+
+@pytest.mark.parametrize(
+    "text, cause",
+    [
+        ("[loop] All ComfyUI attempts failed for prefix p_1", "comfy_unreachable"),
+        ("requests: Max retries exceeded with url: /prompt", "comfy_unreachable"),
+        ("[watcher] Timed out waiting for image", "timeout"),
+        ("job killed by supervisor after 900s", "timeout"),
+        ("[score] Error scoring image /tmp/a.png", "scoring_error"),
+        ("json.decoder.JSONDecodeError: Expecting value", "bad_payload"),
+        ("something else entirely", "unknown"),
+    ],
+)
+def test_classify_text(text, cause):
+    assert classify_text(text)[0] == cause
+
+
+def test_classify_text_returns_the_matching_line():
+    text = "starting\n[loop] ComfyUI HTTP 500: boom\ncleanup"
+    assert classify_text(text) == ("comfy_unreachable", "[loop] ComfyUI HTTP 500: boom")
+
+
+def test_classify_text_earlier_class_wins():
+    # A timeout message that also mentions a refused connection
+    assert classify_text("Timed out\nConnection refused")[0] == "comfy_unreachable"
+
+
+def test_classify_text_no_match():
+    assert classify_text("") == ("unknown", None)
+
+
+def test_payload_problem():
+    assert payload_problem({"project": "p", "part": "1", "prompt": "castle"}) is None
+    assert payload_problem({"project": "p", "prompt": ""}) == "payload is missing part, prompt"
+
+
+def test_classify_db_job_reads_the_run_log(tmp_path):
+    log = tmp_path / "job-3.log"
+    log.write_text("rendering\n[loop] All ComfyUI attempts failed\n")
+    job = {
+        "id": 3,
+        "project": "p",
+        "part": "1",
+        "payload": {"project": "p", "part": "1", "prompt": "castle"},
+        "last_error": "runner exited with code 1",
+        "log_path": str(log),
+    }
+    entry = classify_db_job(job)
+    assert entry["cause"] == "comfy_unreachable"
+    assert entry["evidence"] == "[loop] All ComfyUI attempts failed"
+
+
+def test_classify_db_job_bad_payload_skips_logs():
+    job = {"id": 4, "project": "p", "part": "1", "payload": {"project": "p"},
+           "last_error": "Connection refused", "log_path": None}
+    assert classify_db_job(job)["cause"] == "bad_payload"
@@ -0,0 +1,43 @@
+import socketserver
+import threading
+
+import pytest
+
+from media_api.worker_socket import WorkerUnavailable, request
+from socket_worker import WorkerServer
+
+
+@pytest.fixture
+def worker(tmp_path):
+    def handler(req):
+        if req.get("op") == "fail":
+            raise ValueError("bad request")
+        return {"ok": True, "echo": req}
+
+    path = tmp_path / "worker.sock"
+    server = WorkerServer(str(path), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, path
+    server.shutdown()
+    server.server_close()
+
+
+def test_round_trip(worker):
+    _, path = worker
+    assert request(path, {"op": "ping"}, timeout=5) == {"ok": True, "echo": {"op": "ping"}}
+
+
+def test_handler_errors_become_responses(worker):
+    _, path = worker
+    assert request(path, {"op": "fail"}, timeout=5) == {"ok": False, "error": "ValueError: bad request"}
+
+
+def test_server_keeps_its_own_handle_request(worker):
+    server, _ = worker
+    assert server.handle_request.__func__ is socketserver.BaseServer.handle_request
+
+
+def test_missing_socket(tmp_path):
+    with pytest.raises(WorkerUnavailable):
+        request(tmp_path / "none.sock", {}, timeout=1)
@@ -0,0 +1,69 @@
+import threading
+
+import pytest
+
+from media_api.tasks import TaskRegistry
+
+
+@pytest.fixture
+def registry():
+    reg = TaskRegistry(max_workers=2, max_finished=2, kind_workers={"slow": 1})
+    yield reg
+    reg.executor.shutdown(wait=True)
+    for executor in reg.kind_executors.values():
+        executor.shutdown(wait=True)
+
+
+def test_task_runs_to_done(registry):
+    task = registry.submit("tts", lambda a, b=0: a + b, 2, b=3)
+    assert task["status"] in ("queued", "running", "done")
+    assert task["id"].startswith("tts-")
+
+    done = registry.wait(task["id"], timeout=5)
+    assert done["status"] == "done"
+    assert done["result"] == 5
+    assert done["error"] is None
+    assert done["run_s"] is not None and done["wait_s"] >= 0
+
+
+def test_exception_marks_task_failed(registry):
+    def boom():
+        raise RuntimeError("model not loaded")
+
+    task = registry.wait(registry.submit("stt", boom)["id"], timeout=5)
+    assert task["status"] == "failed"
+    assert task["error"] == "model not loaded"
+
+
+def test_wait_times_out_on_a_running_task(registry):
+    release = threading.Event()
+    task = registry.submit("tts", release.wait)
+    try:
+        assert registry.wait(task["id"], timeout=0.05)["status"] in ("queued", "running")
+    finally:
+        release.set()
+    assert registry.wait(task["id"], timeout=5)["status"] == "done"
+
+
+def test_kind_with_its_own_pool_does_not_block_others(registry):
+    release = threading.Event()
+    slow = registry.submit("slow", release.wait)
+    try:
+        quick = registry.wait(registry.submit("tts", lambda: "ok")["id"], timeout=5)
+        assert quick["status"] == "done"
+        assert registry.get(slow["id"])["finished_at"] is None
+    finally:
+        release.set()
+
+
+def test_only_recent_finished_tasks_are_kept(registry):
+    ids = [registry.submit("tts", lambda: None)["id"] for _ in range(4)]
+    # Let every task (and its prune) finish
+    registry.executor.shutdown(wait=True)
+    kept = [task_id for task_id in ids if registry.get(task_id) is not None]
+    assert len(kept) == 2
+
+
+def test_unknown_task(registry):
+    assert registry.get("tts-missing") is None
+    assert registry.wait("tts-missing") is None
@@ -0,0 +1,92 @@
+import wave
+
+import pytest
+
+from media_api import speech, tts_client, tts_stream
+from media_api.tts_stream import split_long, split_sentences, stream_sentences
+
+
+def test_split_sentences_on_punctuation_and_paragraphs():
+    text = "The homelab rack is finally wired up. Next we flash the firmware!\n\nThen we test every port on it?"
+    assert split_sentences(text) == [
+        "The homelab rack is finally wired up.",
+        "Next we flash the firmware!",
+        "Then we test every port on it?",
+    ]
+
+
+def test_split_sentences_merges_short_fragments_forward():
+    assert split_sentences("Hi. Ok. This sentence is long enough to stand.") == [
+        "Hi. Ok. This sentence is long enough to stand."
+    ]
+
+
+def test_split_sentences_short_tail_joins_the_last_sentence():
+    assert split_sentences("This sentence is long enough to stand. Bye.") == [
+        "This sentence is long enough to stand. Bye."
+    ]
+
+
+def test_split_sentences_normalizes_whitespace_and_skips_blanks():
+    assert split_sentences("  \n\n  ") == []
+    assert split_sentences("A   sentence\twith  odd spacing inside.") == ["A sentence with odd spacing inside."]
+
+
+def test_split_long_breaks_at_word_boundaries():
+    pieces = split_long("alpha, beta gamma delta", max_chars=11)
+    assert pieces == ["alpha, beta", "gamma delta"]
+    assert all(len(p) <= 11 for p in pieces)
+
+
+def write_wav(path, frames=b"\x01\x00" * 4, rate=8000):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(frames)
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    failing = set()
+
+    def synthesize(text, out_path, voice=None):
+        if text in failing:
+            raise speech.SpeechError(f"could not say {text!r}")
+        write_wav(out_path)
+        return {"ok": True}
+
+    monkeypatch.setattr(tts_client, "live_sockets", lambda: [])
+    monkeypatch.setattr(speech, "synthesize_subprocess", synthesize)
+    monkeypatch.setattr(tts_stream, "SENTENCE_GAP_SECONDS", 0)
+    return failing
+
+
+def test_stream_sentences_saves_a_complete_wav(tmp_path, fake_tts):
+    out = tmp_path / "tts.wav"
+    body = b"".join(stream_sentences(["one", "two"], out))
+
+    assert body[:4] == b"RIFF"
+    with wave.open(str(out), "rb") as w:
+        assert w.getnframes() == 8
+    # Streamed copy differs only in its "unknown length" header
+    assert body[44:] == out.read_bytes()[44:]
+
+
+def test_first_sentence_failure_raises_before_any_bytes(tmp_path, fake_tts):
+    fake_tts.add("one")
+    out = tmp_path / "tts.wav"
+    with pytest.raises(speech.SpeechError):
+        next(stream_sentences(["one", "two"], out))
+    assert not out.exists()
+
+
+def test_later_failure_removes_the_saved_copy(tmp_path, fake_tts):
+    fake_tts.add("two")
+    out = tmp_path / "tts.wav"
+    chunks = stream_sentences(["one", "two"], out)
+    assert next(chunks)[:4] == b"RIFF"
+    assert next(chunks) == b"\x01\x00" * 4
+    with pytest.raises(speech.SpeechError):
+        next(chunks)
+    assert not out.exists()